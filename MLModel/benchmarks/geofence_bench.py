@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Benchmarks run the API without touching the on-disk fence database
+os.environ.setdefault('GEOFENCE_DB_PATH', '')
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from MLModel.geofence_validator import GeoFenceValidator, GeoFenceZone, LocationPoint
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEG_LAT = np.pi / 180 * EARTH_RADIUS_M
+
+# Campus clusters are scattered around these city centers (lat, lon)
+CITY_CENTERS = np.array([
+    (18.5204, 73.8567), (19.0760, 72.8777), (28.6139, 77.2090),
+    (12.9716, 77.5946), (13.0827, 80.2707), (22.5726, 88.3639),
+])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the geo-fence validator and API')
+    parser.add_argument('--sizes', type=str, default='100,1000,10000,100000,1000000',
+                        help='Comma-separated fence counts to benchmark')
+    parser.add_argument('--scalar-points', type=int, default=2000, help='Points timed one at a time per size')
+    parser.add_argument('--batch-points', type=int, default=100000, help='Points timed through the batch path per size')
+    parser.add_argument('--legacy-points', type=int, default=50,
+                        help='Points timed through the legacy linear validate_multiple_fences scan per size')
+    parser.add_argument('--max-legacy', type=int, default=100000,
+                        help='Largest size for which the legacy linear scan is timed')
+    parser.add_argument('--max-incremental', type=int, default=100000,
+                        help='Largest size for which per-fence add_fence is timed')
+    parser.add_argument('--api-fences', type=int, default=10000, help='Fences loaded for the API load test')
+    parser.add_argument('--api-requests', type=int, default=2000, help='Requests per API scenario')
+    parser.add_argument('--skip-api', action='store_true', help='Only run the validator benchmarks')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--output', type=str, default=None,
+                        help='JSON output path (default benchmarks/results/geofence_<timestamp>.json)')
+    parser.add_argument('--compare', type=str, default=None, help='Earlier results JSON to compare against')
+    return parser.parse_args()
+
+def make_fences(count, rng, polygon_fraction=0.05):
+    """Synthetic fences clustered into campuses of ~50 rooms around a few cities"""
+    campuses = max(1, count // 50)
+    campus_centers = CITY_CENTERS[rng.integers(0, len(CITY_CENTERS), campuses)] + \
+        rng.normal(0, 0.15, (campuses, 2))
+    campus = rng.integers(0, campuses, count)
+    # Rooms within a few hundred meters of their campus center
+    offsets = rng.normal(0, 300, (count, 2))
+    latitudes = campus_centers[campus, 0] + offsets[:, 0] / METERS_PER_DEG_LAT
+    longitudes = campus_centers[campus, 1] + offsets[:, 1] / (METERS_PER_DEG_LAT * np.cos(np.radians(latitudes)))
+    radii = rng.integers(30, 150, count)
+    polygons = rng.random(count) < polygon_fraction
+    
+    fences = []
+    for i in range(count):
+        polygon = None
+        if polygons[i]:
+            # Rectangular building footprint about the size of the circle
+            half_lat = radii[i] / METERS_PER_DEG_LAT
+            half_lon = half_lat / np.cos(np.radians(latitudes[i]))
+            polygon = [(latitudes[i] - half_lat, longitudes[i] - half_lon),
+                       (latitudes[i] - half_lat, longitudes[i] + half_lon),
+                       (latitudes[i] + half_lat, longitudes[i] + half_lon),
+                       (latitudes[i] + half_lat, longitudes[i] - half_lon)]
+        fences.append(GeoFenceZone(
+            id=f'bench_{i}',
+            session_id=f'session_{campus[i]}_{i % 8}',
+            location_name=f'Room {i}',
+            latitude=float(latitudes[i]),
+            longitude=float(longitudes[i]),
+            radius_meters=int(radii[i]),
+            college_name=f'College {campus[i]}',
+            polygon=polygon
+        ))
+    return fences
+
+def make_points(fences, count, rng, inside_fraction=0.7):
+    """GPS fixes: most near a fence (with GPS-like scatter), the rest anywhere on campus"""
+    picks = rng.integers(0, len(fences), count)
+    latitudes = np.array([fences[i].latitude for i in picks])
+    longitudes = np.array([fences[i].longitude for i in picks])
+    radii = np.array([fences[i].radius_meters for i in picks], dtype=np.float64)
+    near = rng.random(count) < inside_fraction
+    spread = np.where(near, radii * rng.uniform(0, 1.2, count), rng.uniform(100, 2000, count))
+    bearing = rng.uniform(0, 2 * np.pi, count)
+    latitudes = latitudes + spread * np.cos(bearing) / METERS_PER_DEG_LAT
+    longitudes = longitudes + spread * np.sin(bearing) / (METERS_PER_DEG_LAT * np.cos(np.radians(latitudes)))
+    return [LocationPoint(latitude=float(lat), longitude=float(lon)) for lat, lon in zip(latitudes, longitudes)]
+
+def timed(func, repeat=1):
+    """Best wall-clock time (seconds) of repeat runs, plus the last return value"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def latency_summary(latencies):
+    latencies_ms = np.asarray(latencies) * 1000
+    total = latencies_ms.sum() / 1000
+    return {
+        'requests': len(latencies_ms),
+        'requests_per_second': round(len(latencies_ms) / total, 1) if total else None,
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 4),
+        'max_ms': round(float(latencies_ms.max()), 4),
+    }
+
+def bench_validator(size, args, rng):
+    print(f'[INFO] Validator benchmark with {size} fences...')
+    fences = make_fences(size, rng)
+    result = {'fences': size}
+    
+    validator = GeoFenceValidator()
+    result['bulk_load_seconds'], _ = timed(lambda: validator.load_fences(fences))
+    
+    if size <= args.max_incremental:
+        incremental = GeoFenceValidator()
+        
+        def add_all():
+            for fence in fences:
+                incremental.add_fence(fence)
+        result['incremental_build_seconds'], _ = timed(add_all)
+    
+    points = make_points(fences, args.scalar_points, rng)
+    seconds, results = timed(lambda: [validator.validate_point(p) for p in points])
+    result['scalar_us_per_point'] = seconds / len(points) * 1e6
+    result['mean_candidates_per_point'] = float(np.mean([r['total_fences_checked'] for r in results]))
+    result['inside_fraction'] = float(np.mean([r['is_within_any_fence'] for r in results]))
+    seconds, _ = timed(lambda: [validator.validate_point(p, compact=True) for p in points])
+    result['scalar_compact_us_per_point'] = seconds / len(points) * 1e6
+    
+    # Pre-index baseline: the linear scan over every fence, one point at a time
+    if size <= args.max_legacy:
+        legacy_points = points[:args.legacy_points]
+        seconds, legacy = timed(lambda: [validator.validate_multiple_fences(p, fences) for p in legacy_points])
+        result['legacy_scan_us_per_point'] = seconds / len(legacy_points) * 1e6
+        result['scalar_speedup_vs_legacy'] = result['legacy_scan_us_per_point'] / result['scalar_us_per_point']
+        indexed = [r['is_within_any_fence'] for r in results[:len(legacy_points)]]
+        assert indexed == [r['is_within_any_fence'] for r in legacy], 'indexed and legacy results differ'
+    
+    # Batch path in the API's chunk size
+    points = make_points(fences, args.batch_points, rng)
+    chunk = 512
+    
+    def batch_all():
+        for start in range(0, len(points), chunk):
+            validator.validate_points_batch(points[start:start + chunk])
+    seconds, _ = timed(batch_all)
+    result['batch_points_per_second'] = len(points) / seconds
+    result['batch_us_per_point'] = seconds / len(points) * 1e6
+    return result
+
+def bench_api(args, rng):
+    print(f'[INFO] API load test with {args.api_fences} fences...')
+    from MLModel import geofence_api
+    
+    fences = make_fences(args.api_fences, rng)
+    for fence in fences:
+        geofence_api.fence_store.add(fence)
+    client = geofence_api.app.test_client()
+    
+    def point_body(point):
+        return {'latitude': point.latitude, 'longitude': point.longitude, 'user_id': 'bench_user'}
+    
+    scenarios = {}
+    points = make_points(fences, args.api_requests, rng)
+    for name, path in (('validate', '/api/geofence/validate'),
+                       ('validate_compact', '/api/geofence/validate?compact=true')):
+        latencies = []
+        for point in points:
+            start = time.perf_counter()
+            response = client.post(path, json=point_body(point))
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.data
+        scenarios[name] = latency_summary(latencies)
+    
+    batch_size = 500
+    batches = max(1, args.api_requests // 20)
+    latencies = []
+    for _ in range(batches):
+        body = ''.join(json.dumps(point_body(p)) + '\n' for p in make_points(fences, batch_size, rng))
+        start = time.perf_counter()
+        response = client.post('/api/geofence/validate-batch', data=body, content_type='application/x-ndjson')
+        response.get_data()
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    scenarios['validate_batch_500'] = latency_summary(latencies)
+    scenarios['validate_batch_500']['points_per_second'] = round(batches * batch_size / sum(latencies), 1)
+    
+    latencies = []
+    for _ in range(max(1, args.api_requests // 10)):
+        start = time.perf_counter()
+        response = client.get('/api/geofence/list?session_id=session_0_0')
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    scenarios['list_by_session'] = latency_summary(latencies)
+    return {'fences': args.api_fences, 'scenarios': scenarios}
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=Path(__file__).parent, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    """Print the ratio of each numeric metric to the same metric in a baseline file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f'\n[INFO] Comparison with {baseline_path} (new / old):')
+    
+    old_by_size = {entry['fences']: entry for entry in baseline.get('validator', [])}
+    for entry in results['validator']:
+        old = old_by_size.get(entry['fences'])
+        if old is None:
+            continue
+        for key, value in entry.items():
+            if key != 'fences' and isinstance(old.get(key), (int, float)) and old[key]:
+                print(f"  validator[{entry['fences']}].{key}: {value / old[key]:.2f}x")
+    
+    old_scenarios = (baseline.get('api') or {}).get('scenarios', {})
+    for name, metrics in ((results.get('api') or {}).get('scenarios') or {}).items():
+        for key, value in metrics.items():
+            old = old_scenarios.get(name, {}).get(key)
+            if isinstance(old, (int, float)) and old and key != 'requests':
+                print(f'  api.{name}.{key}: {value / old:.2f}x')
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+    
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'args': vars(args),
+        },
+        'validator': [bench_validator(int(size), args, rng) for size in args.sizes.split(',')],
+        'api': None if args.skip_api else bench_api(args, rng),
+    }
+    
+    output = Path(args.output) if args.output else \
+        Path(__file__).parent / 'results' / f'geofence_{datetime.now():%Y%m%d_%H%M%S}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    
+    for entry in results['validator']:
+        legacy = entry.get('legacy_scan_us_per_point')
+        print(f"[RESULT] {entry['fences']:>8} fences: load {entry['bulk_load_seconds']:.3f}s, "
+              f"scalar {entry['scalar_us_per_point']:.1f}us/pt, batch {entry['batch_us_per_point']:.2f}us/pt, "
+              f"legacy scan {'-' if legacy is None else f'{legacy:.1f}'}us/pt")
+    if results['api']:
+        for name, metrics in results['api']['scenarios'].items():
+            print(f"[RESULT] api {name}: {metrics['requests_per_second']} req/s, "
+                  f"p50 {metrics['p50_ms']}ms p95 {metrics['p95_ms']}ms p99 {metrics['p99_ms']}ms")
+    print(f'[INFO] Results written to {output}')
+    
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
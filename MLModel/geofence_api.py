@@ -1,25 +1,162 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import sys
 import os
 import json
+import functools
+import threading
+from dataclasses import asdict
 from datetime import datetime
+
+import numpy as np
 from typing import Dict, List
 
 # Add parent directory to path to import the geofence validator
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from MLModel.geofence_validator import GeoFenceValidator, GeoFenceZone, LocationPoint, create_fence_from_dict, create_location_from_dict
+from MLModel.geofence_validator import DistanceHistogramSketch, GeoFenceValidator, GeoFenceZone, LocationPoint, OnlineSpeedAnomalyDetector, PreparedPolygon, create_fence_from_dict, create_location_from_dict, location_columns_from_dicts
+from MLModel.geofence_store import FenceStore
+from MLModel.geofence_shards import ShardedGeoFenceValidator, ShardedLocationHistoryStore
+from MLModel.geofence_coverage import CoverageAreaCache
+from MLModel.geofence_events import FenceEventBroker, FenceMembershipTracker, format_sse
+
+try:
+    import orjson
+except ImportError:  # optional: responses fall back to the stdlib json module
+    orjson = None
+
+class GeoFenceJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that serializes with orjson when it is installed
+    
+    Fences embedded in validation results are written from the fence
+    table's pre-encoded JSON (FenceTable.fence_json) when orjson supports
+    raw fragments, instead of being converted field by field per response.
+    """
+    
+    def _fence_default(self, obj):
+        if isinstance(obj, GeoFenceZone):
+            located = validator.fence_row(obj)
+            if hasattr(orjson, 'Fragment') and located is not None:
+                return orjson.Fragment(located[0].fence_json(located[1]))
+            return asdict(obj)
+        if isinstance(obj, (np.generic, np.ndarray)):
+            return obj.tolist()
+        return self.default(obj)
+    
+    def _orjson_options(self) -> int:
+        option = (orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_DATETIME |
+                  orjson.OPT_NON_STR_KEYS)
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            option |= orjson.OPT_INDENT_2
+        return option
+    
+    def dumps(self, obj, **kwargs) -> str:
+        if orjson is None or kwargs:
+            kwargs.setdefault('default', self._fence_default)
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self._fence_default, option=self._orjson_options()).decode()
+    
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self._fence_default, option=self._orjson_options())
+        return self._app.response_class(body, mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = GeoFenceJSONProvider(app)
 CORS(app)
 
-# Initialize the geo-fence validator
-validator = GeoFenceValidator()
+# Initialize the geo-fence validator. GEOFENCE_SHARD_MODE=college keeps one
+# fence index per college, =process runs each college's index in its own
+# worker process; the default ("none") keeps a single index.
+GEOFENCE_SHARD_MODE = os.environ.get('GEOFENCE_SHARD_MODE', 'none').strip().lower()
+if GEOFENCE_SHARD_MODE in ('college', 'process'):
+    validator = ShardedGeoFenceValidator(use_processes=GEOFENCE_SHARD_MODE == 'process')
+else:
+    validator = GeoFenceValidator()
+
+# Fences persist in SQLite (WAL) and are loaded from a binary snapshot at
+# startup; set GEOFENCE_DB_PATH to an empty string for an in-memory store
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+GEOFENCE_DB_PATH = os.environ.get('GEOFENCE_DB_PATH', os.path.join(DATA_DIR, 'geofences.db'))
+GEOFENCE_SNAPSHOT_PATH = os.environ.get('GEOFENCE_SNAPSHOT_PATH', os.path.join(DATA_DIR, 'geofences.snapshot.npy'))
+
+if GEOFENCE_DB_PATH:
+    fence_store = FenceStore.open(validator, GEOFENCE_DB_PATH, GEOFENCE_SNAPSHOT_PATH or None)
+else:
+    fence_store = FenceStore(validator)
+
+# Union coverage areas, cached per session and per group of overlapping fences
+coverage_cache = CoverageAreaCache(validator)
+
+# Per-user location history, bounded by point count and age and kept per college
+LOCATION_HISTORY_MAX_POINTS = 1000
+LOCATION_HISTORY_MAX_AGE_SECONDS = 24 * 3600
+location_history_store = ShardedLocationHistoryStore(
+    max_points=LOCATION_HISTORY_MAX_POINTS,
+    max_age_seconds=LOCATION_HISTORY_MAX_AGE_SECONDS
+)
+
+# Running per-user speed statistics for inline anomaly flags
+speed_detector = OnlineSpeedAnomalyDetector(validator, max_idle_seconds=LOCATION_HISTORY_MAX_AGE_SECONDS)
+
+# Per-user fence membership; enter/exit transitions are pushed to
+# /api/geofence/events subscribers. Events live in this process only.
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('GEOFENCE_SSE_MAX_SUBSCRIBERS', 256))
+SSE_HEARTBEAT_SECONDS = 15
+event_broker = FenceEventBroker(max_subscribers=SSE_MAX_SUBSCRIBERS)
+presence_tracker = FenceMembershipTracker(validator, event_broker,
+                                          max_idle_seconds=LOCATION_HISTORY_MAX_AGE_SECONDS)
+
+# The validator, fence store, location histories and speed detector are not
+# thread-safe; handlers that touch them hold this lock, so threaded servers
+# (Flask's threaded dev server, the ASGI worker pool) never interleave them
+state_lock = threading.RLock()
+
+def _holds_state_lock(view):
+    """Run a view while holding state_lock"""
+    @functools.wraps(view)
+    def locked_view(*args, **kwargs):
+        with state_lock:
+            return view(*args, **kwargs)
+    return locked_view
+
+# Points validated per vectorized call in /api/geofence/validate-batch
+BATCH_CHUNK_SIZE = 512
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonlines', 'application/jsonl')
+
+def _is_true(value) -> bool:
+    """Interpret a query string or JSON flag such as compact=true"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
 
-# Mock data storage (in production, use a database)
-geo_fences_db = []
-location_history_db = []
+def _history_college(data: Dict):
+    """College whose history shard records a fix: its college_name, else its session's only college"""
+    return data.get('college_name') or fence_store.college_of_session(data.get('session_id'))
+
+def _college_for(data: Dict):
+    """
+    College a request's validation is filtered to
+    
+    Its college_name if given. With a sharded index, a session whose fences
+    all belong to one college is routed to that college; otherwise (and
+    always when unsharded) None, so the request is only filtered by session.
+    """
+    if isinstance(validator, ShardedGeoFenceValidator):
+        return _history_college(data)
+    return data.get('college_name') or None
+
+@app.before_request
+def sync_fence_store():
+    """Pick up fence changes made by other worker processes"""
+    with state_lock:
+        fence_store.sync()
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -31,6 +168,7 @@ def health_check():
     })
 
 @app.route('/api/geofence/validate', methods=['POST'])
+@_holds_state_lock
 def validate_location():
     """
     Validate if a location point is within any geo-fence zones
@@ -40,8 +178,14 @@ def validate_location():
         "latitude": 18.5204,
         "longitude": 73.8567,
         "user_id": "user123",
-        "session_id": "session456"  # Optional - filter by session
+        "session_id": "session456",  # Optional - filter by session
+        "college_name": "Test College"  # Optional - sharded: defaults to the session's college if it has one
     }
+    
+    Query parameters:
+    - compact: If true, the result only carries is_within_any_fence and the
+      best match's fence_id, distance_meters and accuracy_score (optional;
+      may also be sent as "compact" in the body)
     """
     try:
         data = request.get_json()
@@ -59,29 +203,153 @@ def validate_location():
             'timestamp': datetime.now().isoformat()
         })
         
-        # Filter fences by session if provided
-        fences_to_check = geo_fences_db
-        if 'session_id' in data:
-            fences_to_check = [f for f in geo_fences_db if f.session_id == data['session_id']]
-        
-        # Validate against all active fences
-        result = validator.validate_multiple_fences(location, fences_to_check)
+        # Validate against active fences near the point (filtered by session if provided)
+        compact = _is_true(request.args.get('compact', data.get('compact', False)))
+        college_name = _college_for(data)
+        result = validator.validate_point(location, data.get('session_id'), compact=compact,
+                                          college_name=college_name)
         
         # Store in location history
-        location_history_db.append(location)
+        location_history_store.record(location, _history_college(data))
+        presence_tracker.update(location, college_name)
+        anomaly = speed_detector.update(location)
         
         return jsonify({
             'success': True,
-            'result': result
+            'result': result,
+            'anomaly': anomaly
         })
-        
+    
     except Exception as e:
         return jsonify({
             'error': str(e),
             'success': False
         }), 500
 
+def _iter_batch_points():
+    """Yield point dicts from a JSON array/object or NDJSON request body"""
+    if request.mimetype in NDJSON_MIMETYPES:
+        for line in request.stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield {'_error': f'Invalid JSON line: {e}'}
+        return
+    
+    data = request.get_json()
+    points = data.get('points', []) if isinstance(data, dict) else data
+    for point_data in points or []:
+        yield point_data
+
+@_holds_state_lock
+def _validate_batch_chunk(chunk, compact=False):
+    """Validate one chunk of (index, point_data) pairs and return NDJSON lines in input order"""
+    lines = [None] * len(chunk)
+    locations = []
+    session_ids = []
+    college_names = []
+    history_colleges = []
+    positions = []
+    for position, (index, point_data) in enumerate(chunk):
+        try:
+            if not isinstance(point_data, dict) or '_error' in point_data:
+                raise ValueError(point_data.get('_error') if isinstance(point_data, dict)
+                                 else 'Point must be a JSON object')
+            if 'latitude' not in point_data or 'longitude' not in point_data:
+                raise ValueError('Missing required fields: latitude, longitude')
+            location = create_location_from_dict({
+                'latitude': point_data['latitude'],
+                'longitude': point_data['longitude'],
+                'user_id': point_data.get('user_id'),
+                'timestamp': point_data.get('timestamp') or datetime.now().isoformat()
+            })
+        except (TypeError, ValueError) as e:
+            lines[position] = app.json.dumps({'index': index, 'success': False, 'error': str(e)}) + '\n'
+            continue
+        locations.append(location)
+        session_ids.append(point_data.get('session_id'))
+        college_names.append(_college_for(point_data))
+        history_colleges.append(_history_college(point_data))
+        positions.append(position)
+    
+    if locations:
+        results = validator.validate_points_batch(locations, session_ids, compact=compact,
+                                                  college_names=college_names)
+        presence_tracker.update_batch(locations, college_names)
+        for position, location, college_name, result in zip(positions, locations, history_colleges, results):
+            location_history_store.record(location, college_name)
+            lines[position] = app.json.dumps({
+                'index': chunk[position][0],
+                'user_id': location.user_id,
+                'success': True,
+                'result': result,
+                'anomaly': speed_detector.update(location)
+            }) + '\n'
+    
+    return lines
+
+@app.route('/api/geofence/validate-batch', methods=['POST'])
+def validate_location_batch():
+    """
+    Validate many location points in one request
+    
+    The body is either a JSON array of points, a JSON object
+    {"session_id": ..., "points": [...]}, or an NDJSON stream of points
+    (Content-Type: application/x-ndjson). Each point accepts the same
+    fields as /api/geofence/validate plus an optional timestamp.
+    
+    Results are streamed back as NDJSON, one line per point in input order:
+    {"index": 0, "user_id": "user123", "success": true, "result": {...}}
+    Invalid points produce {"index": i, "success": false, "error": "..."}.
+    
+    Query parameters:
+    - session_id: Default session filter for points without one (optional)
+    - compact: If true, results use the compact form of /api/geofence/validate (optional)
+    """
+    try:
+        default_session_id = request.args.get('session_id')
+        compact = _is_true(request.args.get('compact', False))
+        if request.mimetype not in NDJSON_MIMETYPES:
+            data = request.get_json(silent=True)
+            if not isinstance(data, (list, dict)):
+                return jsonify({
+                    'error': 'Body must be a JSON array of points, an object with "points", or NDJSON'
+                }), 400
+            if isinstance(data, dict):
+                default_session_id = data.get('session_id', default_session_id)
+        
+        def generate():
+            chunk = []
+            for index, point_data in enumerate(_iter_batch_points()):
+                if isinstance(point_data, dict) and default_session_id is not None:
+                    point_data.setdefault('session_id', default_session_id)
+                chunk.append((index, point_data))
+                if len(chunk) >= BATCH_CHUNK_SIZE:
+                    yield from _validate_batch_chunk(chunk, compact)
+                    chunk = []
+            if chunk:
+                yield from _validate_batch_chunk(chunk, compact)
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
+
+def _parse_polygon(value):
+    """Parse [[lat, lon], ...] into polygon vertices and their PreparedPolygon"""
+    try:
+        polygon = [(float(lat), float(lon)) for lat, lon in value]
+    except (TypeError, ValueError):
+        raise ValueError('polygon must be a list of [latitude, longitude] pairs')
+    return polygon, PreparedPolygon(polygon, validator.earth_radius_km)
+
 @app.route('/api/geofence/create', methods=['POST'])
+@_holds_state_lock
 def create_geofence():
     """
     Create a new geo-fence zone
@@ -96,32 +364,54 @@ def create_geofence():
         "college_name": "Test College",
         "batch_id": "batch123"  # Optional
     }
+    
+    Polygon fences send "polygon": [[lat, lon], ...] instead of latitude,
+    longitude and radius_meters, which are then set to the polygon's
+    bounding circle.
     """
     try:
         data = request.get_json()
         
-        required_fields = ['session_id', 'location_name', 'latitude', 'longitude', 'radius_meters', 'college_name']
+        if data and data.get('polygon') is not None:
+            required_fields = ['session_id', 'location_name', 'polygon', 'college_name']
+        else:
+            required_fields = ['session_id', 'location_name', 'latitude', 'longitude', 'radius_meters', 'college_name']
         for field in required_fields:
             if field not in data:
                 return jsonify({
                     'error': f'Missing required field: {field}'
                 }), 400
         
+        polygon = None
+        if 'polygon' in required_fields:
+            try:
+                polygon, bounds = _parse_polygon(data['polygon'])
+            except ValueError as e:
+                return jsonify({
+                    'error': str(e),
+                    'success': False
+                }), 400
+            latitude, longitude, radius_meters = bounds.center_lat, bounds.center_lon, bounds.radius_meters
+        else:
+            latitude, longitude = float(data['latitude']), float(data['longitude'])
+            radius_meters = int(data['radius_meters'])
+        
         # Create new fence
         new_fence = GeoFenceZone(
-            id=f"fence_{len(geo_fences_db) + 1}_{int(datetime.now().timestamp())}",
+            id=fence_store.next_id(),
             session_id=data['session_id'],
             location_name=data['location_name'],
-            latitude=float(data['latitude']),
-            longitude=float(data['longitude']),
-            radius_meters=int(data['radius_meters']),
+            latitude=latitude,
+            longitude=longitude,
+            radius_meters=radius_meters,
             college_name=data['college_name'],
             batch_id=data.get('batch_id'),
             is_active=True,
-            created_date=datetime.now().isoformat()
+            created_date=datetime.now().isoformat(),
+            polygon=polygon
         )
         
-        geo_fences_db.append(new_fence)
+        fence_store.add(new_fence)
         
         return jsonify({
             'success': True,
@@ -135,10 +425,11 @@ def create_geofence():
                 'college_name': new_fence.college_name,
                 'batch_id': new_fence.batch_id,
                 'is_active': new_fence.is_active,
-                'created_date': new_fence.created_date
+                'created_date': new_fence.created_date,
+                'polygon': new_fence.polygon
             }
         })
-        
+    
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -146,6 +437,7 @@ def create_geofence():
         }), 500
 
 @app.route('/api/geofence/list', methods=['GET'])
+@_holds_state_lock
 def list_geofences():
     """
     List all geo-fence zones
@@ -160,15 +452,12 @@ def list_geofences():
         college_name = request.args.get('college_name')
         is_active = request.args.get('is_active')
         
-        fences = geo_fences_db
-        
-        # Apply filters
-        if session_id:
-            fences = [f for f in fences if f.session_id == session_id]
-        if college_name:
-            fences = [f for f in fences if f.college_name == college_name]
-        if is_active is not None:
-            fences = [f for f in fences if f.is_active == (is_active.lower() == 'true')]
+        # Apply filters through the store's secondary indexes
+        fences = fence_store.query(
+            session_id=session_id or None,
+            college_name=college_name or None,
+            is_active=(is_active.lower() == 'true') if is_active is not None else None
+        )
         
         # Convert to dict format
         fence_list = []
@@ -183,7 +472,8 @@ def list_geofences():
                 'college_name': fence.college_name,
                 'batch_id': fence.batch_id,
                 'is_active': fence.is_active,
-                'created_date': fence.created_date
+                'created_date': fence.created_date,
+                'polygon': fence.polygon
             })
         
         return jsonify({
@@ -191,7 +481,7 @@ def list_geofences():
             'fences': fence_list,
             'total_count': len(fence_list)
         })
-        
+    
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -199,6 +489,7 @@ def list_geofences():
         }), 500
 
 @app.route('/api/geofence/<fence_id>', methods=['PUT'])
+@_holds_state_lock
 def update_geofence(fence_id):
     """
     Update an existing geo-fence zone
@@ -208,38 +499,46 @@ def update_geofence(fence_id):
     try:
         data = request.get_json()
         
-        # Find the fence
-        fence_index = -1
-        for i, fence in enumerate(geo_fences_db):
-            if fence.id == fence_id:
-                fence_index = i
-                break
-        
-        if fence_index == -1:
+        if fence_id not in fence_store:
             return jsonify({
                 'error': 'Geo-fence not found',
                 'success': False
             }), 404
         
         # Update fence
-        fence = geo_fences_db[fence_index]
-        
+        changes = {}
         if 'session_id' in data:
-            fence.session_id = data['session_id']
+            changes['session_id'] = data['session_id']
         if 'location_name' in data:
-            fence.location_name = data['location_name']
+            changes['location_name'] = data['location_name']
         if 'latitude' in data:
-            fence.latitude = float(data['latitude'])
+            changes['latitude'] = float(data['latitude'])
         if 'longitude' in data:
-            fence.longitude = float(data['longitude'])
+            changes['longitude'] = float(data['longitude'])
         if 'radius_meters' in data:
-            fence.radius_meters = int(data['radius_meters'])
+            changes['radius_meters'] = int(data['radius_meters'])
         if 'college_name' in data:
-            fence.college_name = data['college_name']
+            changes['college_name'] = data['college_name']
         if 'batch_id' in data:
-            fence.batch_id = data['batch_id']
+            changes['batch_id'] = data['batch_id']
         if 'is_active' in data:
-            fence.is_active = bool(data['is_active'])
+            changes['is_active'] = bool(data['is_active'])
+        if 'polygon' in data:
+            changes['polygon'] = None
+            if data['polygon'] is not None:
+                try:
+                    polygon, bounds = _parse_polygon(data['polygon'])
+                except ValueError as e:
+                    return jsonify({
+                        'error': str(e),
+                        'success': False
+                    }), 400
+                changes.update(polygon=polygon, latitude=bounds.center_lat,
+                               longitude=bounds.center_lon, radius_meters=bounds.radius_meters)
+        
+        fence = fence_store.update(fence_id, changes)
+        # Members of a moved, reshaped or deactivated fence are re-checked now
+        presence_tracker.refresh_fence(fence)
         
         return jsonify({
             'success': True,
@@ -253,10 +552,11 @@ def update_geofence(fence_id):
                 'college_name': fence.college_name,
                 'batch_id': fence.batch_id,
                 'is_active': fence.is_active,
-                'created_date': fence.created_date
+                'created_date': fence.created_date,
+                'polygon': fence.polygon
             }
         })
-        
+    
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -264,26 +564,23 @@ def update_geofence(fence_id):
         }), 500
 
 @app.route('/api/geofence/<fence_id>', methods=['DELETE'])
+@_holds_state_lock
 def delete_geofence(fence_id):
     """Delete a geo-fence zone"""
     try:
-        global geo_fences_db
-        
         # Find and remove the fence
-        original_count = len(geo_fences_db)
-        geo_fences_db = [f for f in geo_fences_db if f.id != fence_id]
-        
-        if len(geo_fences_db) == original_count:
+        if fence_store.remove(fence_id) is None:
             return jsonify({
                 'error': 'Geo-fence not found',
                 'success': False
             }), 404
+        presence_tracker.remove_fence(fence_id)
         
         return jsonify({
             'success': True,
             'message': 'Geo-fence deleted successfully'
         })
-        
+    
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -291,6 +588,7 @@ def delete_geofence(fence_id):
         }), 500
 
 @app.route('/api/geofence/optimize-radius', methods=['POST'])
+@_holds_state_lock
 def optimize_fence_radius():
     """
     ML-based optimization for fence radius
@@ -303,8 +601,18 @@ def optimize_fence_radius():
             {"latitude": 18.5205, "longitude": 73.8568},
             ...
         ],
-        "desired_coverage": 0.95  # Optional, default 0.95
+        "desired_coverage": 0.95,  # Optional, default 0.95
+        "sketches": [...],         # Optional - partial sketches from other shards
+        "return_sketch": true      # Optional - include this request's merged sketch
     }
+    
+    Without sketches the coverage percentile is selected exactly. Sketches
+    (as returned with return_sketch) let radii be calibrated from point sets
+    that are too large for one request: each shard posts its points with
+    return_sketch, and a final call merges the shards' sketches.
+    
+    Test points without valid coordinates are skipped and listed in
+    invalid_points as {"index": i, "error": "..."}.
     """
     try:
         data = request.get_json()
@@ -314,26 +622,41 @@ def optimize_fence_radius():
                 'error': 'Missing required fields: center_latitude, center_longitude'
             }), 400
         
-        # Create test points
-        test_points = []
-        for point_data in data.get('test_points', []):
-            test_points.append(create_location_from_dict(point_data))
-        
-        # Optimize radius
-        optimal_radius = validator.optimize_fence_radius(
-            float(data['center_latitude']),
-            float(data['center_longitude']),
-            test_points,
-            data.get('desired_coverage', 0.95)
-        )
+        center_latitude = float(data['center_latitude'])
+        center_longitude = float(data['center_longitude'])
+        desired_coverage = data.get('desired_coverage', 0.95)
         
-        return jsonify({
-            'success': True,
-            'optimal_radius_meters': optimal_radius,
-            'test_points_count': len(test_points),
-            'desired_coverage': data.get('desired_coverage', 0.95)
-        })
+        # Test point coordinates as arrays
+        points = location_columns_from_dicts(data.get('test_points', []))
+        latitudes, longitudes = points.latitudes, points.longitudes
         
+        response = {
+            'success': True,
+            'test_points_count': len(points),
+            'invalid_points': points.errors,
+            'desired_coverage': desired_coverage
+        }
+        
+        if data.get('sketches') or data.get('return_sketch'):
+            sketch = DistanceHistogramSketch(center_latitude, center_longitude,
+                                             max_distance=validator.max_fence_radius_meters)
+            sketch.add_distances(validator.haversine_distance_batch(
+                center_latitude, center_longitude, latitudes, longitudes))
+            for sketch_data in data.get('sketches') or []:
+                sketch.merge(DistanceHistogramSketch.from_dict(sketch_data))
+            
+            optimal_radius = validator.optimize_fence_radius_from_sketch(sketch, desired_coverage)
+            response['sketch_points_count'] = sketch.count
+            if data.get('return_sketch'):
+                response['sketch'] = sketch.to_dict()
+        else:
+            optimal_radius = validator.optimize_fence_radius_arrays(
+                center_latitude, center_longitude, latitudes, longitudes, desired_coverage
+            )
+        
+        response['optimal_radius_meters'] = optimal_radius
+        return jsonify(response)
+    
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -341,6 +664,7 @@ def optimize_fence_radius():
         }), 500
 
 @app.route('/api/geofence/detect-anomalies', methods=['POST'])
+@_holds_state_lock
 def detect_location_anomalies():
     """
     Detect anomalous location patterns for a user
@@ -348,33 +672,108 @@ def detect_location_anomalies():
     Request body:
     {
         "user_id": "user123",
-        "location_history": [
+        "location_history": [  # Optional - defaults to the server-side history
             {"latitude": 18.5204, "longitude": 73.8567, "timestamp": "2024-01-15T09:00:00"},
             ...
         ]
     }
+    
+    Request points that fail to parse are skipped and listed in
+    invalid_points as {"index": i, "error": "..."}.
     """
     try:
         data = request.get_json()
         
-        if not data or 'user_id' not in data or 'location_history' not in data:
+        if not data or 'user_id' not in data:
             return jsonify({
-                'error': 'Missing required fields: user_id, location_history'
+                'error': 'Missing required field: user_id'
             }), 400
         
-        # Create location history
-        location_history = []
-        for point_data in data['location_history']:
-            location_history.append(create_location_from_dict(point_data))
-        
-        # Detect anomalies
-        result = validator.detect_location_anomalies(data['user_id'], location_history)
+        invalid_points = []
+        if 'location_history' in data:
+            # Parse the request's location history straight into arrays
+            history = location_columns_from_dicts(data['location_history'])
+            invalid_points = history.errors
+            result = validator.detect_location_anomalies_arrays(
+                data['user_id'], history.latitudes, history.longitudes, history.timestamps
+            )
+        else:
+            # Use the locations recorded by /validate and /validate-batch
+            latitudes, longitudes, timestamps = location_history_store.history(data['user_id'])
+            result = validator.detect_location_anomalies_arrays(
+                data['user_id'], latitudes, longitudes, timestamps
+            )
+        result['history_source'] = 'request' if 'location_history' in data else 'server'
         
         return jsonify({
             'success': True,
-            'anomaly_detection': result
+            'anomaly_detection': result,
+            'invalid_points': invalid_points
         })
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
+
+@app.route('/api/geofence/audit-anomalies', methods=['POST'])
+@_holds_state_lock
+def audit_location_anomalies():
+    """
+    Scan many users' location histories for anomalies in one vectorized pass
+    
+    Request body (optional - defaults to every user's server-side history):
+    {
+        "user_ids": ["user123", "user123", "user456", ...],
+        "latitudes": [18.5204, ...],
+        "longitudes": [73.8567, ...],
+        "timestamps": [1705309200.0, ...]  # Epoch seconds
+    }
+    
+    Query parameters:
+    - flagged_only: Only include users with anomalies in results (optional)
+    - college_name: Only scan server-side histories recorded for this
+      college (optional; may also be sent in the body)
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        columns = ['user_ids', 'latitudes', 'longitudes', 'timestamps']
+        if any(column in data for column in columns):
+            missing = [column for column in columns if column not in data]
+            if missing:
+                return jsonify({
+                    'error': f'Missing required fields: {", ".join(missing)}'
+                }), 400
+            if len({len(data[column]) for column in columns}) != 1:
+                return jsonify({
+                    'error': 'Columns must all have the same length'
+                }), 400
+            
+            results = validator.detect_anomalies_batch(
+                [str(user_id) for user_id in data['user_ids']],
+                data['latitudes'],
+                data['longitudes'],
+                [float('nan') if t is None else t for t in data['timestamps']]
+            )
+        else:
+            college_name = request.args.get('college_name') or data.get('college_name')
+            user_ids, user_codes, latitudes, longitudes, timestamps = location_history_store.columns(college_name)
+            coded_results = validator.detect_anomalies_batch(user_codes, latitudes, longitudes, timestamps)
+            results = {user_ids[code]: result for code, result in coded_results.items()}
+        
+        flagged_users = [user_id for user_id, result in results.items() if result['has_anomalies']]
+        if request.args.get('flagged_only', '').lower() == 'true':
+            results = {user_id: results[user_id] for user_id in flagged_users}
         
+        return jsonify({
+            'success': True,
+            'user_count': len(results),
+            'flagged_users': flagged_users,
+            'results': results
+        })
+    
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -382,21 +781,24 @@ def detect_location_anomalies():
         }), 500
 
 @app.route('/api/geofence/coverage-area', methods=['GET'])
+@_holds_state_lock
 def get_coverage_area():
     """
     Get coverage area statistics for all fences
     
+    The total is the area of the union of the fences, so ground covered by
+    several overlapping fences is counted once; the plain per-fence sum is
+    returned alongside it.
+    
     Query parameters:
     - session_id: Filter by session ID (optional)
     """
     try:
         session_id = request.args.get('session_id')
         
-        fences = geo_fences_db
-        if session_id:
-            fences = [f for f in fences if f.session_id == session_id]
+        fences = fence_store.query(session_id=session_id or None)
+        coverage = coverage_cache.coverage(fences, session_id or None)
         
-        total_area = 0
         fence_areas = []
         
         for fence in fences:
@@ -407,15 +809,116 @@ def get_coverage_area():
                 'area_meters_squared': area,
                 'radius_meters': fence.radius_meters
             })
-            total_area += area
         
         return jsonify({
             'success': True,
-            'total_coverage_area_meters_squared': total_area,
+            'total_coverage_area_meters_squared': coverage['union_area_m2'],
+            'summed_fence_area_meters_squared': coverage['summed_area_m2'],
+            'overlap_area_meters_squared': max(0.0, coverage['summed_area_m2'] - coverage['union_area_m2']),
+            'overlap_group_count': coverage['component_count'],
             'fence_count': len(fences),
             'individual_fence_areas': fence_areas
         })
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
+
+@app.route('/api/geofence/presence', methods=['GET'])
+@_holds_state_lock
+def get_presence():
+    """
+    Users currently inside each fence, from their last known location
+    
+    Query parameters:
+    - session_id: Filter by session ID (optional)
+    
+    The returned last_event_id can be sent as Last-Event-ID to
+    /api/geofence/events to continue from this state without gaps.
+    """
+    try:
+        session_id = request.args.get('session_id')
+        fences, last_event_id = presence_tracker.presence(session_id or None)
+        return jsonify({
+            'success': True,
+            'fences': fences,
+            'user_count': len({user for users in fences.values() for user in users}),
+            'last_event_id': last_event_id
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
+
+@app.route('/api/geofence/events', methods=['GET'])
+def stream_fence_events():
+    """
+    Server-sent event stream of fence enter/exit transitions
+    
+    Each event is named after its type (enter, exit or resync) and carries
+    JSON data with user_id, session_id, fence_id, location_name, latitude,
+    longitude and timestamp. A resync event means events were lost and the
+    client should reload /api/geofence/presence. Reconnecting clients that
+    send Last-Event-ID receive the recent events they missed.
+    
+    Query parameters:
+    - session_id: Only stream events of this session (optional)
+    - last_event_id: Same as the Last-Event-ID header (optional)
+    """
+    session_id = request.args.get('session_id') or None
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    subscription = event_broker.subscribe(session_id, last_event_id)
+    if subscription is None:
+        return jsonify({
+            'error': 'Too many event stream subscribers, retry later',
+            'success': False
+        }), 503
+    
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                events = subscription.get(SSE_HEARTBEAT_SECONDS)
+                yield ''.join(map(format_sse, events)) if events else ': keep-alive\n\n'
+        finally:
+            event_broker.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/geofence/shards', methods=['GET'])
+@_holds_state_lock
+def list_fence_shards():
+    """Fence count of each college shard (empty unless GEOFENCE_SHARD_MODE shards the index)"""
+    shards = validator.shard_stats() if isinstance(validator, ShardedGeoFenceValidator) else {}
+    return jsonify({
+        'success': True,
+        'shard_mode': GEOFENCE_SHARD_MODE,
+        'shards': shards
+    })
+
+@app.route('/api/geofence/shards/<college_name>/rebuild', methods=['POST'])
+@_holds_state_lock
+def rebuild_fence_shard(college_name):
+    """Rebuild one college's fence index from the fence store, leaving other colleges untouched"""
+    try:
+        if not isinstance(validator, ShardedGeoFenceValidator):
+            return jsonify({
+                'error': 'Fence indexes are not sharded (set GEOFENCE_SHARD_MODE)',
+                'success': False
+            }), 400
         
+        fence_count = validator.rebuild_shard(college_name, fence_store.query(college_name=college_name))
+        return jsonify({
+            'success': True,
+            'college_name': college_name,
+            'fence_count': fence_count
+        })
+    
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -427,12 +930,18 @@ if __name__ == '__main__':
     print("Available endpoints:")
     print("  GET  /health")
     print("  POST /api/geofence/validate")
+    print("  POST /api/geofence/validate-batch")
     print("  POST /api/geofence/create")
     print("  GET  /api/geofence/list")
     print("  PUT  /api/geofence/<fence_id>")
     print("  DELETE /api/geofence/<fence_id>")
     print("  POST /api/geofence/optimize-radius")
     print("  POST /api/geofence/detect-anomalies")
+    print("  POST /api/geofence/audit-anomalies")
     print("  GET  /api/geofence/coverage-area")
+    print("  GET  /api/geofence/presence")
+    print("  GET  /api/geofence/events (server-sent events)")
+    print("  GET  /api/geofence/shards")
+    print("  POST /api/geofence/shards/<college_name>/rebuild")
     
     app.run(host='0.0.0.0', port=5001, debug=True)
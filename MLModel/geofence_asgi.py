@@ -0,0 +1,357 @@
+import sys
+import os
+import json
+import asyncio
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+# Add parent directory to path to import the geofence API
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MLModel.geofence_api import SSE_HEARTBEAT_SECONDS, app, event_broker
+from MLModel.geofence_events import FenceEventBroker, format_sse
+
+logger = logging.getLogger(__name__)
+
+# Threads running Flask handlers; CPU-bound (batch) validation runs here, off the event loop
+ASGI_MAX_WORKERS = int(os.environ.get('GEOFENCE_ASGI_WORKERS', 8))
+# Requests allowed to wait for a free worker before new ones are turned away with 503
+ASGI_MAX_QUEUED = int(os.environ.get('GEOFENCE_ASGI_MAX_QUEUED', 2048))
+ASGI_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('GEOFENCE_ASGI_QUEUE_TIMEOUT', 10))
+# Larger request bodies are answered with 413
+ASGI_MAX_BODY_BYTES = int(os.environ.get('GEOFENCE_ASGI_MAX_BODY_BYTES', 64 * 1024 * 1024))
+# Bodies are received on the event loop and kept in memory up to this size, then spooled to a temp file
+ASGI_SPOOL_BYTES = int(os.environ.get('GEOFENCE_ASGI_SPOOL_BYTES', 1024 * 1024))
+# Longest wait for the next piece of a request body before the request is answered with 408
+ASGI_BODY_TIMEOUT_SECONDS = float(os.environ.get('GEOFENCE_ASGI_BODY_TIMEOUT', 30))
+
+def _content_length(scope: Dict) -> Optional[int]:
+    """Declared Content-Length of an ASGI HTTP request, or None if absent or invalid"""
+    for name, value in scope.get('headers', []):
+        if name.lower() == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+class BoundedWSGIApp:
+    """
+    ASGI application that serves a WSGI app from a bounded thread pool
+    
+    Connections are held by the event loop, so thousands of concurrent
+    check-ins cost no threads while they are read or wait. At most
+    max_workers requests run the WSGI app at once; up to max_queued more
+    wait (for at most queue_timeout seconds) for a free worker, and anything
+    beyond that is answered immediately with 503 and a Retry-After header.
+    Request bodies are received in full on the event loop before a worker
+    is taken, so slow uploads never hold one; they are kept in memory up to
+    spool_bytes and in a temporary file beyond that, up to max_body_bytes
+    (413 otherwise). Response bodies are passed on chunk by chunk, so
+    streamed NDJSON batch results keep flowing while the batch is validated.
+    
+    Requests for event_path are served from event_broker directly on the
+    event loop, so open server-sent event streams never hold a worker.
+    """
+    
+    def __init__(self, wsgi_app, max_workers: int = 8, max_queued: int = 2048,
+                 queue_timeout: float = 10.0, max_body_bytes: int = 64 * 1024 * 1024,
+                 spool_bytes: int = 1024 * 1024, body_timeout: float = 30.0, retry_after_seconds: int = 1,
+                 event_broker: Optional[FenceEventBroker] = None,
+                 event_path: str = '/api/geofence/events', heartbeat_seconds: float = 15.0):
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.max_body_bytes = max_body_bytes
+        self.spool_bytes = spool_bytes
+        self.body_timeout = body_timeout
+        self.retry_after_seconds = retry_after_seconds
+        self.event_broker = event_broker
+        self.event_path = event_path
+        self.heartbeat_seconds = heartbeat_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='geofence-asgi')
+        self.queued = 0
+        self.rejected = 0
+        # Created on first use so it binds to the server's event loop
+        self._slots: Optional[asyncio.Semaphore] = None
+    
+    async def __call__(self, scope: Dict, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            await send({'type': 'websocket.close', 'code': 1000})
+    
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Let running requests finish before the process exits
+                await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown, True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    async def _http(self, scope: Dict, receive, send):
+        if self.event_broker is not None and scope['method'] == 'GET' and scope['path'] == self.event_path:
+            await self._event_stream(scope, receive, send)
+            return
+        content_length = _content_length(scope)
+        if content_length is not None and content_length > self.max_body_bytes:
+            await self._send_error(send, 413, 'Request body too large')
+            return
+        request_body = await self._read_body(receive, send)
+        if request_body is None:
+            return
+        
+        body, size = request_body
+        try:
+            if not await self._acquire_slot():
+                self.rejected += 1
+                await self._send_error(send, 503, 'Server busy, retry later',
+                                       [(b'retry-after', str(self.retry_after_seconds).encode())])
+                return
+            try:
+                await self._run_wsgi(scope, body, size, send)
+            finally:
+                self._slots.release()
+        finally:
+            body.close()
+    
+    async def _read_body(self, receive, send) -> Optional[Tuple[IO[bytes], int]]:
+        """
+        Receive the whole request body without holding a worker
+        
+        Returns:
+            (body file positioned at its start, size), or None if the request
+            was already answered (413, 408) or the client disconnected
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        size = 0
+        error = None
+        while True:
+            try:
+                message = await asyncio.wait_for(receive(), self.body_timeout)
+            except asyncio.TimeoutError:
+                error = (408, 'Timed out reading request body')
+                break
+            if message['type'] == 'http.disconnect':
+                break
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                error = (413, 'Request body too large')
+                break
+            body.write(chunk)
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body, size
+        
+        body.close()
+        if error is not None:
+            await self._send_error(send, *error)
+        return None
+    
+    async def _acquire_slot(self) -> bool:
+        """Wait for a free worker; False if the queue is full or the wait timed out"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return True
+        if self.queued >= self.max_queued:
+            return False
+        
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.queued -= 1
+    
+    async def _event_stream(self, scope: Dict, receive, send):
+        """Relay fence events as text/event-stream until the client disconnects"""
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        headers = dict(scope.get('headers', []))
+        session_id = query.get('session_id', [None])[0] or None
+        last_event_id = headers.get(b'last-event-id', b'').decode('latin-1') or query.get('last_event_id', [None])[0]
+        subscription = self.event_broker.subscribe(session_id, last_event_id,
+                                                   notify=lambda: loop.call_soon_threadsafe(wake.set))
+        if subscription is None:
+            await self._send_error(send, 503, 'Too many event stream subscribers, retry later',
+                                   [(b'retry-after', str(self.retry_after_seconds).encode())])
+            return
+        
+        async def wait_for_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+        
+        disconnected = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                            (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]
+            })
+            await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+            wake.set()  # Deliver replayed events right away
+            while True:
+                woken = asyncio.ensure_future(wake.wait())
+                done, _ = await asyncio.wait({woken, disconnected}, timeout=self.heartbeat_seconds,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                woken.cancel()
+                if disconnected in done:
+                    break
+                wake.clear()
+                events = subscription.drain()
+                body = ''.join(map(format_sse, events)) if events else ': keep-alive\n\n'
+                await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+        except OSError:
+            pass
+        finally:
+            disconnected.cancel()
+            self.event_broker.unsubscribe(subscription)
+    
+    async def _send_error(self, send, status: int, message: str, headers: List[Tuple[bytes, bytes]] = ()):
+        body = json.dumps({'error': message, 'success': False}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode()), *headers]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+    
+    def _environ(self, scope: Dict, body: IO[bytes], size: int) -> Dict:
+        """Build a PEP 3333 environ from an ASGI HTTP scope and its received body"""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': str(client[0]),
+            'REMOTE_PORT': str(client[1]),
+            'CONTENT_LENGTH': str(size),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            # The body is complete, so chunked uploads can be read to EOF
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_LENGTH':
+                continue
+            key = 'CONTENT_TYPE' if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+    
+    async def _run_wsgi(self, scope: Dict, body: IO[bytes], size: int, send):
+        """Run the WSGI app in the executor and relay its response as it is produced"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        disconnected = threading.Event()
+        environ = self._environ(scope, body, size)
+        
+        def emit(item):
+            if disconnected.is_set():
+                raise ConnectionAbortedError('Client disconnected')
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        
+        def worker():
+            response_start = []
+            
+            def start_response(status, headers, exc_info=None):
+                response_start[:] = [int(status.split(' ', 1)[0]),
+                                     [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]]
+                return lambda data: emit(('body', data))
+            
+            try:
+                result = self.wsgi_app(environ, start_response)
+                try:
+                    started = False
+                    for chunk in result:
+                        if not started:
+                            emit(('start', *response_start))
+                            started = True
+                        if chunk:
+                            emit(('body', chunk))
+                    if not started:
+                        emit(('start', *response_start))
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+                emit(('end',))
+            except ConnectionAbortedError:
+                pass
+            except BaseException as e:
+                logger.exception("Unhandled error in WSGI app")
+                emit(('error', e))
+        
+        future = loop.run_in_executor(self.executor, worker)
+        started = False
+        try:
+            while True:
+                item = await queue.get()
+                if item[0] == 'start':
+                    started = True
+                    await send({'type': 'http.response.start', 'status': item[1], 'headers': item[2]})
+                elif item[0] == 'body':
+                    await send({'type': 'http.response.body', 'body': item[1], 'more_body': True})
+                elif item[0] == 'end':
+                    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+                    break
+                else:
+                    if not started:
+                        await self._send_error(send, 500, str(item[1]))
+                    break
+        except OSError:
+            # The client went away; stop the worker at its next chunk
+            disconnected.set()
+        finally:
+            await future
+
+# ASGI entry point: uvicorn MLModel.geofence_asgi:asgi_app
+asgi_app = BoundedWSGIApp(
+    app,
+    max_workers=ASGI_MAX_WORKERS,
+    max_queued=ASGI_MAX_QUEUED,
+    queue_timeout=ASGI_QUEUE_TIMEOUT_SECONDS,
+    max_body_bytes=ASGI_MAX_BODY_BYTES,
+    spool_bytes=ASGI_SPOOL_BYTES,
+    body_timeout=ASGI_BODY_TIMEOUT_SECONDS,
+    event_broker=event_broker,
+    heartbeat_seconds=SSE_HEARTBEAT_SECONDS
+)
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        print("uvicorn is required for the ASGI server: pip install uvicorn")
+        sys.exit(1)
+    
+    uvicorn.run(asgi_app, host=os.environ.get('GEOFENCE_HOST', '0.0.0.0'),
+                port=int(os.environ.get('GEOFENCE_PORT', 5001)), backlog=4096)
@@ -0,0 +1,402 @@
+import sys
+import os
+import math
+import logging
+import threading
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Add parent directory to path to import the geofence validator
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MLModel.geofence_validator import (GeoFenceValidator, GeoFenceZone, PreparedPolygon,
+                                        bounding_extents_deg)
+
+logger = logging.getLogger(__name__)
+
+# Distance (meters) under which a point counts as lying on a polygon edge
+ON_EDGE_TOLERANCE_METERS = 1e-6
+
+def _polygon_edges(vertices) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """Counter-clockwise edge arrays (x1, y1, x2, y2) of a planar polygon, None if degenerate"""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    if len(vertices) > 1 and np.array_equal(vertices[0], vertices[-1]):
+        vertices = vertices[:-1]
+    x, y = vertices[:, 0], vertices[:, 1]
+    signed_area = (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+    if len(vertices) < 3 or signed_area == 0:
+        return None
+    if signed_area < 0:
+        x, y = x[::-1], y[::-1]
+    return x, y, np.roll(x, -1), np.roll(y, -1)
+
+def _polygon_cover(px: np.ndarray, py: np.ndarray, edges, direction: Optional[Tuple[float, float]] = None,
+                   shared_edge_covers: bool = False) -> np.ndarray:
+    """
+    Which points are covered by a polygon
+    
+    Points strictly inside are covered. A point on an edge is covered only
+    when it belongs to a boundary piece (running along direction) that
+    another polygon's edge duplicates: always if the edges run opposite
+    ways (the pieces separate two covered regions), and only when
+    shared_edge_covers if they run the same way (so one copy survives).
+    """
+    x1, y1, x2, y2 = edges
+    px, py = px[:, None], py[:, None]
+    ex, ey = x2 - x1, y2 - y1
+    length_sq = ex * ex + ey * ey
+    cross = (px - x1) * ey - (py - y1) * ex
+    along = ((px - x1) * ex + (py - y1) * ey) / length_sq
+    on_edge = ((np.abs(cross) <= ON_EDGE_TOLERANCE_METERS * np.sqrt(length_sq)) &
+               (along >= 0) & (along <= 1))
+    on_boundary = on_edge.any(axis=1)
+    
+    straddles = (y1 > py) != (y2 > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x1 + (py - y1) * ex / (y2 - y1)
+    inside = (np.count_nonzero(straddles & (px < x_cross), axis=1) % 2 == 1) & ~on_boundary
+    if direction is None or not on_boundary.any():
+        return inside
+    
+    same_way = ((on_edge * (direction[0] * ex + direction[1] * ey)).sum(axis=1)) > 0
+    return inside | (on_boundary & (~same_way | shared_edge_covers))
+
+def _segment_circle_params(px: float, py: float, dx: float, dy: float,
+                           cx: np.ndarray, cy: np.ndarray, r: np.ndarray) -> np.ndarray:
+    """Parameters t in (0, 1) where segment p + t*d crosses the given circles"""
+    a = dx * dx + dy * dy
+    b = dx * (px - cx) + dy * (py - cy)
+    c = (px - cx) ** 2 + (py - cy) ** 2 - r * r
+    disc = b * b - a * c
+    hit = disc > 0
+    root = np.sqrt(disc[hit])
+    t = np.concatenate(((-b[hit] - root) / a, (-b[hit] + root) / a))
+    return t[(t > 0) & (t < 1)]
+
+def _segment_polygon_params(px: float, py: float, dx: float, dy: float, edges) -> np.ndarray:
+    """Parameters t in (0, 1) where segment p + t*d meets a polygon's edges (including collinear overlaps)"""
+    x1, y1, x2, y2 = edges
+    ex, ey = x2 - x1, y2 - y1
+    qx, qy = x1 - px, y1 - py
+    denom = dx * ey - dy * ex
+    length_sq = dx * dx + dy * dy
+    crossing = np.abs(denom) > 1e-12 * length_sq
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (qx * ey - qy * ex) / denom
+        u = (qx * dy - qy * dx) / denom
+    params = [t[crossing & (t > 0) & (t < 1) & (u >= 0) & (u <= 1)]]
+    
+    # Collinear overlapping edges split the segment at the other edge's end points
+    collinear = ~crossing & (np.abs(qx * dy - qy * dx) <= ON_EDGE_TOLERANCE_METERS * np.sqrt(length_sq))
+    if collinear.any():
+        for ox, oy in ((x1[collinear], y1[collinear]), (x2[collinear], y2[collinear])):
+            t_end = ((ox - px) * dx + (oy - py) * dy) / length_sq
+            params.append(t_end[(t_end > 0) & (t_end < 1)])
+    return np.concatenate(params)
+
+def union_area_planar(circles, polygons: Sequence = ()) -> float:
+    """
+    Exact area of a union of circles and simple polygons in the plane
+    
+    By Green's theorem the area is the integral of (x dy - y dx) / 2 along
+    the union's outline, which consists of the pieces of every shape's
+    boundary that lie outside all other shapes. Each circle and polygon
+    edge is split where it meets the other shapes, and every piece whose
+    midpoint is uncovered contributes its closed-form term, so overlaps are
+    never counted twice. Identical circles count once; an edge shared by
+    two polygons counts once if both run the same way and not at all if
+    they run opposite ways (adjacent rooms).
+    
+    Args:
+        circles: (k, 3) array of center x, center y and radius in meters
+        polygons: Vertex arrays (m, 2) in meters of simple polygons
+    
+    Returns:
+        Area in square meters
+    """
+    circles = np.asarray(circles, dtype=np.float64).reshape(-1, 3)
+    circles = np.unique(circles[circles[:, 2] > 0], axis=0)
+    cx, cy, cr = circles[:, 0], circles[:, 1], circles[:, 2]
+    edges = [e for e in (_polygon_edges(vertices) for vertices in polygons) if e is not None]
+    boxes = np.array([(x1.min(), x1.max(), y1.min(), y1.max()) for x1, y1, _, _ in edges]).reshape(-1, 4)
+    
+    def polygons_near(min_x, max_x, min_y, max_y, skip=-1) -> List[int]:
+        near = (boxes[:, 0] <= max_x) & (boxes[:, 1] >= min_x) & (boxes[:, 2] <= max_y) & (boxes[:, 3] >= min_y)
+        return [q for q in np.flatnonzero(near).tolist() if q != skip]
+    
+    total = 0.0
+    for i in range(len(cr)):
+        x0, y0, r = cx[i], cy[i], cr[i]
+        d = np.hypot(cx - x0, cy - y0)
+        others = d < cr + r
+        others[i] = False
+        if (others & (d + r <= cr)).any():
+            continue  # Inside another circle
+        
+        crossing = np.flatnonzero(others & (d > np.abs(cr - r)))
+        base = np.arctan2(cy[crossing] - y0, cx[crossing] - x0)
+        half = np.arccos(np.clip((r * r + d[crossing] ** 2 - cr[crossing] ** 2) / (2 * r * d[crossing]), -1, 1))
+        angles = [base - half, base + half]
+        near = polygons_near(x0 - r, x0 + r, y0 - r, y0 + r)
+        for q in near:
+            x1, y1, x2, y2 = edges[q]
+            for e in range(len(x1)):
+                t = _segment_circle_params(x1[e], y1[e], x2[e] - x1[e], y2[e] - y1[e],
+                                           np.array([x0]), np.array([y0]), np.array([r]))
+                angles.append(np.arctan2(y1[e] + t * (y2[e] - y1[e]) - y0, x1[e] + t * (x2[e] - x1[e]) - x0))
+        
+        angles = np.unique(np.concatenate(angles) % (2 * math.pi))
+        if len(angles) == 0:
+            start, end = np.array([0.0]), np.array([2 * math.pi])
+        else:
+            start, end = angles, np.append(angles[1:], angles[0] + 2 * math.pi)
+        middle = (start + end) / 2
+        mx, my = x0 + r * np.cos(middle), y0 + r * np.sin(middle)
+        covered = np.zeros(len(middle), dtype=bool)
+        js = np.flatnonzero(others)
+        if len(js):
+            covered |= (np.hypot(mx[:, None] - cx[js], my[:, None] - cy[js]) < cr[js]).any(axis=1)
+        for q in near:
+            covered |= _polygon_cover(mx, my, edges[q])
+        
+        start, end = start[~covered], end[~covered]
+        total += 0.5 * float(np.sum(r * r * (end - start) + x0 * r * (np.sin(end) - np.sin(start)) -
+                                    y0 * r * (np.cos(end) - np.cos(start))))
+    
+    for q, (x1, y1, x2, y2) in enumerate(edges):
+        near = polygons_near(*boxes[q], skip=q)
+        near_circles = np.flatnonzero((cx + cr >= boxes[q, 0]) & (cx - cr <= boxes[q, 1]) &
+                                      (cy + cr >= boxes[q, 2]) & (cy - cr <= boxes[q, 3]))
+        for e in range(len(x1)):
+            px, py, dx, dy = x1[e], y1[e], x2[e] - x1[e], y2[e] - y1[e]
+            params = [np.array([0.0, 1.0]),
+                      _segment_circle_params(px, py, dx, dy, cx[near_circles], cy[near_circles], cr[near_circles])]
+            params.extend(_segment_polygon_params(px, py, dx, dy, edges[other]) for other in near)
+            t = np.unique(np.concatenate(params))
+            start, end = t[:-1], t[1:]
+            middle = (start + end) / 2
+            mx, my = px + middle * dx, py + middle * dy
+            covered = np.zeros(len(middle), dtype=bool)
+            if len(near_circles):
+                covered |= (np.hypot(mx[:, None] - cx[near_circles],
+                                     my[:, None] - cy[near_circles]) < cr[near_circles]).any(axis=1)
+            for other in near:
+                covered |= _polygon_cover(mx, my, edges[other], (dx, dy), shared_edge_covers=other < q)
+            
+            start, end = start[~covered], end[~covered]
+            # (x_a * y_b - x_b * y_a) / 2 for each uncovered piece a -> b
+            total += 0.5 * float(np.sum((px + start * dx) * (py + end * dy) - (px + end * dx) * (py + start * dy)))
+    return total
+
+class CoverageAreaCache:
+    """
+    Union coverage area of fence sets, cached per session
+    
+    Fences are grouped into components whose bounding circles overlap; the
+    union area of a component is computed once with union_area_planar in a
+    local metric frame and cached under the geometry of its fences. When a
+    fence is created, moved, resized or deleted only the components it
+    leaves or joins are recomputed; an unchanged session is answered from
+    its cached result without regrouping.
+    """
+    
+    def __init__(self, validator: GeoFenceValidator):
+        self.validator = validator
+        # session key -> (fence signatures, result)
+        self._results: Dict[Optional[str], Tuple[FrozenSet, Dict]] = {}
+        # session key -> {component signatures: union area}
+        self._components: Dict[Optional[str], Dict[FrozenSet, float]] = {}
+        self._lock = threading.Lock()
+    
+    # Candidate pairs examined per vectorized step of the component sweep
+    MAX_PAIRS_PER_CHUNK = 1 << 20
+    
+    @staticmethod
+    def _signature(fence: GeoFenceZone) -> Tuple:
+        polygon = None if fence.polygon is None else tuple(map(tuple, fence.polygon))
+        return fence.id, fence.latitude, fence.longitude, fence.radius_meters, polygon
+    
+    def _prepared_polygon(self, fence: GeoFenceZone) -> PreparedPolygon:
+        located = self.validator.fence_row(fence)
+        if located is not None and located[1] in located[0].polygons:
+            return located[0].polygons[located[1]]
+        return PreparedPolygon(fence.polygon, self.validator.earth_radius_km)
+    
+    def _components_of(self, latitudes: np.ndarray, longitudes: np.ndarray, radii: np.ndarray) -> List[np.ndarray]:
+        """Group bounding circles that overlap, directly or through other circles"""
+        count = len(latitudes)
+        lat_extents, lon_extents = bounding_extents_deg(latitudes, radii, self.validator.earth_radius_km)
+        # Sweep by latitude: only circles whose latitude ranges overlap are compared
+        order = np.argsort(latitudes - lat_extents, kind='stable')
+        low = (latitudes - lat_extents)[order]
+        stops = np.searchsorted(low, (latitudes + lat_extents)[order], side='right')
+        counts = np.maximum(stops - np.arange(1, count + 1), 0)
+        ends = np.cumsum(counts)
+        
+        firsts, seconds = [], []
+        start = 0
+        while start < count:
+            # Blocks of sweep positions with at most MAX_PAIRS_PER_CHUNK candidate pairs
+            stop = max(start + 1, int(np.searchsorted(ends, ends[start] - counts[start] + self.MAX_PAIRS_PER_CHUNK,
+                                                      side='right')))
+            block = np.arange(start, min(stop, count))
+            block_counts = counts[block]
+            offsets = np.arange(block_counts.sum()) - np.repeat(np.cumsum(block_counts) - block_counts, block_counts)
+            first = order[np.repeat(block, block_counts)]
+            second = order[np.repeat(block + 1, block_counts) + offsets]
+            dlon = np.abs((longitudes[second] - longitudes[first] + 180.0) % 360.0 - 180.0)
+            near = dlon <= lon_extents[first] + lon_extents[second]
+            first, second = first[near], second[near]
+            distances = self.validator.haversine_distance_batch(latitudes[first], longitudes[first],
+                                                                latitudes[second], longitudes[second])
+            overlap = distances < radii[first] + radii[second]
+            firsts.append(first[overlap])
+            seconds.append(second[overlap])
+            start = stop
+        
+        # Label propagation: hook each pair to its lower label, then jump to the label's label
+        first = np.concatenate(firsts) if firsts else np.empty(0, dtype=np.int64)
+        second = np.concatenate(seconds) if seconds else np.empty(0, dtype=np.int64)
+        labels = np.arange(count)
+        while True:
+            hooked = labels.copy()
+            lowest = np.minimum(labels[first], labels[second])
+            np.minimum.at(hooked, first, lowest)
+            np.minimum.at(hooked, second, lowest)
+            hooked = hooked[hooked]
+            if np.array_equal(hooked, labels):
+                break
+            labels = hooked
+        
+        members = np.argsort(labels, kind='stable')
+        boundaries = np.flatnonzero(np.diff(labels[members])) + 1
+        return np.split(members, boundaries) if count else []
+    
+    def _component_area(self, fences: List[GeoFenceZone], members: np.ndarray,
+                        latitudes: np.ndarray, longitudes: np.ndarray,
+                        polygons: Dict[int, PreparedPolygon]) -> float:
+        """Union area of one component, projected to meters around its mean center"""
+        if len(members) == 1:
+            i = members[0]
+            return polygons[i].area_m2 if i in polygons else math.pi * fences[i].radius_meters ** 2
+        
+        meters_per_deg_lat = math.radians(1) * self.validator.earth_radius_km * 1000
+        center_lat = float(np.mean(latitudes[members]))
+        center_lon = longitudes[members[0]]
+        meters_per_deg_lon = meters_per_deg_lat * math.cos(math.radians(center_lat))
+        
+        def project(lats, lons):
+            dlon = (np.asarray(lons, dtype=np.float64) - center_lon + 180.0) % 360.0 - 180.0
+            return np.column_stack((dlon * meters_per_deg_lon,
+                                    (np.asarray(lats, dtype=np.float64) - center_lat) * meters_per_deg_lat))
+        
+        members = members.tolist()
+        circles = [i for i in members if i not in polygons]
+        centers = project(latitudes[circles], longitudes[circles])
+        radii = np.array([fences[i].radius_meters for i in circles], dtype=np.float64)
+        shapes = []
+        for i in members:
+            if i in polygons:
+                vertices = np.asarray(fences[i].polygon, dtype=np.float64)
+                shapes.append(project(vertices[:, 0], vertices[:, 1]))
+        return union_area_planar(np.column_stack((centers, radii)), shapes)
+    
+    def coverage(self, fences: List[GeoFenceZone], session_id: Optional[str] = None) -> Dict:
+        """
+        Union coverage area of fences, reusing this session's cached components
+        
+        Args:
+            fences: Fences of the session (all fences when session_id is None)
+            session_id: Cache key for the fence set
+        
+        Returns:
+            Dictionary with union_area_m2, summed_area_m2 (overlaps counted
+            once per fence), component_count and recomputed_components
+        """
+        signatures = [self._signature(fence) for fence in fences]
+        signature_set = frozenset(signatures)
+        with self._lock:
+            cached = self._results.get(session_id)
+            if cached is not None and cached[0] == signature_set:
+                return dict(cached[1], recomputed_components=0)
+            
+            polygons = {i: self._prepared_polygon(fence) for i, fence in enumerate(fences)
+                        if fence.polygon is not None}
+            count = len(fences)
+            # Bounding circle columns; polygons use their prepared circles
+            latitudes = np.fromiter((f.latitude for f in fences), np.float64, count)
+            longitudes = np.fromiter((f.longitude for f in fences), np.float64, count)
+            radii = np.fromiter((f.radius_meters for f in fences), np.float64, count)
+            for i, polygon in polygons.items():
+                latitudes[i], longitudes[i], radii[i] = polygon.center_lat, polygon.center_lon, polygon.radius_meters
+            
+            previous = self._components.get(session_id, {})
+            components = {}
+            recomputed = 0
+            for members in self._components_of(latitudes, longitudes, radii):
+                key = frozenset(signatures[i] for i in members)
+                area = previous.get(key)
+                if area is None:
+                    area = self._component_area(fences, members, latitudes, longitudes, polygons)
+                    recomputed += 1
+                components[key] = area
+            
+            result = {
+                'union_area_m2': float(sum(components.values())),
+                'summed_area_m2': float(np.pi * np.sum(np.delete(radii, list(polygons)) ** 2) +
+                                        sum(polygon.area_m2 for polygon in polygons.values())),
+                'component_count': len(components),
+            }
+            if fences:
+                self._components[session_id] = components
+                self._results[session_id] = (signature_set, result)
+            else:
+                self._components.pop(session_id, None)
+                self._results.pop(session_id, None)
+            return dict(result, recomputed_components=recomputed)
+
+if __name__ == "__main__":
+    # Two circles of radius 1 whose centers are 1 apart: lens area 2*pi/3 - sqrt(3)/2
+    union = union_area_planar([(0, 0, 1), (1, 0, 1)])
+    assert abs(union - (2 * math.pi - (2 * math.pi / 3 - math.sqrt(3) / 2))) < 1e-9, union
+    # Adjacent rooms sharing a wall, the same room listed twice, and a circle inside a room
+    room = [(0, 0), (10, 0), (10, 10), (0, 10)]
+    assert abs(union_area_planar(np.empty((0, 3)), [room, [(10, 0), (20, 0), (20, 10), (10, 10)]]) - 200) < 1e-9
+    assert abs(union_area_planar([(5, 5, 2)], [room, room[::-1]]) - 100) < 1e-9
+    
+    # Random overlapping circles and rectangles against a fine raster
+    rng = np.random.default_rng(7)
+    circles = np.column_stack((rng.uniform(0, 60, (12, 2)), rng.uniform(5, 20, 12)))
+    rectangles = []
+    for x, y, w, h in np.column_stack((rng.uniform(0, 60, (6, 2)), rng.uniform(5, 25, (6, 2)))):
+        rectangles.append([(x, y), (x + w, y), (x + w, y + h), (x, y + h)])
+    exact = union_area_planar(circles, rectangles)
+    step = 0.05
+    gx, gy = np.meshgrid(np.arange(-25, 110, step) + step / 2, np.arange(-25, 110, step) + step / 2)
+    gx, gy = gx.ravel(), gy.ravel()
+    covered = (np.hypot(gx[:, None] - circles[:, 0], gy[:, None] - circles[:, 1]) < circles[:, 2]).any(axis=1)
+    for vertices in rectangles:
+        (x0, y0), (x1, _), (_, y1) = vertices[0], vertices[1], vertices[2]
+        covered |= (gx > x0) & (gx < x1) & (gy > y0) & (gy < y1)
+    raster = covered.sum() * step * step
+    assert abs(exact - raster) / exact < 1e-3, (exact, raster)
+    print(f"Union area: exact {exact:.2f} m^2, raster {raster:.2f} m^2, summed "
+          f"{math.pi * (circles[:, 2] ** 2).sum() + sum((v[1][0] - v[0][0]) * (v[2][1] - v[1][1]) for v in rectangles):.2f} m^2")
+    
+    # Cached per session; moving one fence recomputes only its components
+    validator = GeoFenceValidator()
+    fences = [GeoFenceZone(f"room_{i}", "s1", f"Room {i}", 18.52 + (i % 10) * 0.0006,
+                           73.85 + (i // 10) * 0.01, 50, "College") for i in range(40)]
+    validator.load_fences(fences)
+    cache = CoverageAreaCache(validator)
+    first = cache.coverage(fences, "s1")
+    assert first['component_count'] == 4 and first['recomputed_components'] == 4
+    assert first['union_area_m2'] < first['summed_area_m2']
+    assert cache.coverage(fences, "s1")['recomputed_components'] == 0
+    fences[0].latitude -= 0.01
+    validator.update_fence(fences[0])
+    moved = cache.coverage(fences, "s1")
+    assert moved['component_count'] == 5 and moved['recomputed_components'] == 2, moved
+    print(f"Session union {moved['union_area_m2']:.0f} m^2 of {moved['summed_area_m2']:.0f} m^2 summed, "
+          f"{moved['recomputed_components']} of {moved['component_count']} components recomputed after a move")
@@ -0,0 +1,417 @@
+import sys
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# Add parent directory to path to import the geofence validator
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MLModel.geofence_validator import GeoFenceValidator, GeoFenceZone, LocationPoint
+
+logger = logging.getLogger(__name__)
+
+def format_sse(event: Dict) -> str:
+    """Encode an event as one text/event-stream message"""
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+class FenceEventSubscription:
+    """
+    One subscriber's queue of fence events
+    
+    Events for other sessions are never queued. If the subscriber falls so
+    far behind that its queue fills up, further events are dropped and the
+    next read returns a single resync event instead, telling the client to
+    reload /api/geofence/presence.
+    """
+    
+    __slots__ = ('session_id', 'events', 'notify', 'resync_reason')
+    
+    def __init__(self, session_id: Optional[str], max_queued: int,
+                 notify: Optional[Callable[[], None]] = None):
+        self.session_id = session_id
+        self.events: queue.Queue = queue.Queue(maxsize=max_queued)
+        self.notify = notify
+        # Set when queued events were lost; the next read returns a resync event
+        self.resync_reason: Optional[str] = None
+    
+    def wants(self, event: Dict) -> bool:
+        return self.session_id is None or event.get('session_id') == self.session_id
+    
+    def put(self, event: Dict):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.resync_reason = 'overflow'
+        if self.notify is not None:
+            self.notify()
+    
+    def drain(self) -> List[Dict]:
+        """Return queued events without waiting"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        if self.resync_reason is not None:
+            reason, self.resync_reason = self.resync_reason, None
+            return [{'type': 'resync', 'reason': reason, 'session_id': self.session_id}]
+        return events
+    
+    def get(self, timeout: float) -> List[Dict]:
+        """Wait up to timeout seconds for events; empty list if none arrived"""
+        try:
+            first = self.events.get(timeout=timeout)
+        except queue.Empty:
+            return self.drain()
+        events = [first] + self.drain()
+        if events[-1]['type'] == 'resync':
+            return events[-1:]
+        return events
+
+class FenceEventBroker:
+    """
+    Fan-out of fence enter/exit events to per-session subscribers
+    
+    Every event gets an increasing id. The last history_size events are
+    kept, so a reconnecting SSE client that sends Last-Event-ID gets what it
+    missed; if its id is older than the buffer it is told to resync.
+    """
+    
+    def __init__(self, history_size: int = 1000, max_queued: int = 1000, max_subscribers: int = 256):
+        self.max_queued = max_queued
+        self.max_subscribers = max_subscribers
+        self.last_id = 0
+        self._history: Deque[Dict] = deque(maxlen=history_size)
+        self._subscriptions: List[FenceEventSubscription] = []
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+    
+    def publish(self, events: List[Dict]):
+        """Number the events and hand them to every interested subscriber"""
+        if not events:
+            return
+        with self._lock:
+            for event in events:
+                self.last_id += 1
+                event['id'] = self.last_id
+                self._history.append(event)
+                for subscription in self._subscriptions:
+                    if subscription.wants(event):
+                        subscription.put(event)
+    
+    def subscribe(self, session_id: Optional[str] = None, last_event_id=None,
+                  notify: Optional[Callable[[], None]] = None) -> Optional[FenceEventSubscription]:
+        """
+        Register a subscriber
+        
+        Args:
+            session_id: Only receive events of this session (None for all)
+            last_event_id: Id of the last event the client saw; newer
+                buffered events are queued right away (optional)
+            notify: Called (from the publishing thread) after each queued
+                event, for subscribers that do not block in get() (optional)
+        
+        Returns:
+            The subscription, or None if max_subscribers are connected
+        """
+        subscription = FenceEventSubscription(session_id, self.max_queued, notify)
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                return None
+            try:
+                last_event_id = int(last_event_id) if last_event_id not in (None, '') else None
+            except (TypeError, ValueError):
+                last_event_id = None
+            if last_event_id is not None:
+                oldest = self._history[0]['id'] if self._history else self.last_id + 1
+                if last_event_id < oldest - 1:
+                    subscription.resync_reason = 'history_expired'
+                else:
+                    for event in self._history:
+                        if event['id'] > last_event_id and subscription.wants(event):
+                            subscription.put(event)
+            self._subscriptions.append(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: FenceEventSubscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+class FenceMembershipTracker:
+    """
+    Per-user last-known fence membership
+    
+    Each location fix is matched against the active fences (in every
+    session) and compared with the user's previous membership; fences
+    entered or left become enter/exit events for the fence's session,
+    published through a FenceEventBroker. Fixes older than the user's
+    latest one are ignored, and users idle for max_idle_seconds leave
+    their fences with reason "expired". Deleting, deactivating or
+    reshaping a fence is applied to its current members right away
+    (remove_fence / refresh_fence) instead of at their next fix.
+    """
+    
+    def __init__(self, validator: GeoFenceValidator, broker: Optional[FenceEventBroker] = None,
+                 max_idle_seconds: float = 24 * 3600, sweep_interval: int = 10000):
+        self.validator = validator
+        self.broker = broker if broker is not None else FenceEventBroker()
+        self.max_idle_seconds = max_idle_seconds
+        self.sweep_interval = sweep_interval
+        # user_id -> {fence_id: (session_id, location_name, college_name)}
+        self._members: Dict[str, Dict[str, Tuple[str, str, str]]] = {}
+        # user_id -> (timestamp of latest fix, time it arrived)
+        self._last_fix: Dict[str, Tuple[float, float]] = {}
+        # user_id -> latest fix, to re-check members when a fence changes
+        self._positions: Dict[str, LocationPoint] = {}
+        self._updates_since_sweep = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._last_fix)
+    
+    @staticmethod
+    def _event(kind: str, user_id: str, fence_id: str, membership: Tuple[str, str, str],
+               point: Optional[LocationPoint], timestamp: float) -> Dict:
+        return {
+            'type': kind,
+            'user_id': user_id,
+            'session_id': membership[0],
+            'fence_id': fence_id,
+            'location_name': membership[1],
+            'latitude': point.latitude if point is not None else None,
+            'longitude': point.longitude if point is not None else None,
+            'timestamp': datetime.fromtimestamp(timestamp).isoformat()
+        }
+    
+    def update(self, point: LocationPoint, college_name: Optional[str] = None) -> List[Dict]:
+        """
+        Feed a new fix and publish the transitions it causes
+        
+        Args:
+            point: Location point with user_id (points without one are ignored)
+            college_name: Only match fences of this college (optional)
+        
+        Returns:
+            The enter/exit events, exits first
+        """
+        return self.update_batch([point], [college_name])
+    
+    def update_batch(self, points: List[LocationPoint],
+                     college_names: Optional[List[Optional[str]]] = None) -> List[Dict]:
+        """
+        Feed fixes in arrival order, matching all of them against the fences at once
+        
+        Args:
+            points: Location points (points without user_id are ignored)
+            college_names: Per-point college filter, aligned with points
+                (optional); a fix with a college leaves the user's membership
+                in other colleges' fences as it was
+        
+        Returns:
+            The enter/exit events of all points, in order
+        """
+        keep = [idx for idx, point in enumerate(points) if point.user_id is not None]
+        if not keep:
+            return []
+        points = [points[idx] for idx in keep]
+        if college_names is not None:
+            college_names = [college_names[idx] for idx in keep]
+        
+        containing = self.validator.fences_containing(points, college_names)
+        events = []
+        with self._lock:
+            for idx, (point, fences) in enumerate(zip(points, containing)):
+                timestamp = point.timestamp.timestamp() if point.timestamp else time.time()
+                last = self._last_fix.get(point.user_id)
+                if last is not None and timestamp < last[0]:
+                    continue
+                self._last_fix[point.user_id] = (timestamp, time.time())
+                self._positions[point.user_id] = point
+                previous = self._members.get(point.user_id, {})
+                inside = {fence.id: (fence.session_id, fence.location_name, fence.college_name) for fence in fences}
+                college_name = college_names[idx] if college_names else None
+                if college_name is not None:
+                    inside.update((fence_id, membership) for fence_id, membership in previous.items()
+                                  if membership[2] != college_name)
+                if inside.keys() == previous.keys():
+                    continue
+                events.extend(self._event('exit', point.user_id, fence_id, membership, point, timestamp)
+                              for fence_id, membership in previous.items() if fence_id not in inside)
+                events.extend(self._event('enter', point.user_id, fence_id, membership, point, timestamp)
+                              for fence_id, membership in inside.items() if fence_id not in previous)
+                if inside:
+                    self._members[point.user_id] = inside
+                else:
+                    self._members.pop(point.user_id, None)
+            self.broker.publish(events)
+            
+            self._updates_since_sweep += len(points)
+            if self._updates_since_sweep >= self.sweep_interval:
+                self._sweep()
+        return events
+    
+    def remove_fence(self, fence_id: str, reason: str = 'fence_removed') -> List[Dict]:
+        """
+        Move every member of a deleted or deactivated fence out of it
+        
+        Args:
+            fence_id: The fence that went away
+            reason: Reason attached to the exit events
+        
+        Returns:
+            The published exit events
+        """
+        events = []
+        with self._lock:
+            for user_id in [u for u, membership in self._members.items() if fence_id in membership]:
+                membership = self._members[user_id].pop(fence_id)
+                if not self._members[user_id]:
+                    del self._members[user_id]
+                event = self._event('exit', user_id, fence_id, membership, None, time.time())
+                event['reason'] = reason
+                events.append(event)
+            self.broker.publish(events)
+        return events
+    
+    def refresh_fence(self, fence: GeoFenceZone) -> List[Dict]:
+        """
+        Re-check a changed fence's members against its new geometry
+        
+        Call after the validator holds the new version of the fence. Members
+        whose latest fix is no longer inside get an exit event with reason
+        "fence_changed"; if the fence moved to another session or location
+        name, the members still inside exit the old one and enter the new
+        one. Users outside the fence are picked up at their next fix.
+        
+        Returns:
+            The published events
+        """
+        if not fence.is_active:
+            return self.remove_fence(fence.id, 'fence_deactivated')
+        with self._lock:
+            members = [u for u, membership in self._members.items() if fence.id in membership]
+            points = [self._positions[u] for u in members]
+        if not members:
+            return []
+        
+        containing = self.validator.fences_containing(points, [fence.college_name] * len(points))
+        current = (fence.session_id, fence.location_name, fence.college_name)
+        now = time.time()
+        events = []
+        with self._lock:
+            for user_id, point, fences in zip(members, points, containing):
+                membership = self._members.get(user_id, {}).get(fence.id)
+                if membership is None or (membership == current and any(f.id == fence.id for f in fences)):
+                    continue
+                exit_event = self._event('exit', user_id, fence.id, membership, None, now)
+                exit_event['reason'] = 'fence_changed'
+                events.append(exit_event)
+                if any(f.id == fence.id for f in fences):
+                    self._members[user_id][fence.id] = current
+                    enter_event = self._event('enter', user_id, fence.id, current, point, now)
+                    enter_event['reason'] = 'fence_changed'
+                    events.append(enter_event)
+                else:
+                    del self._members[user_id][fence.id]
+                    if not self._members[user_id]:
+                        del self._members[user_id]
+            self.broker.publish(events)
+        return events
+    
+    def presence(self, session_id: Optional[str] = None) -> Tuple[Dict[str, List[str]], int]:
+        """
+        Users currently inside each fence
+        
+        Returns:
+            ({fence_id: [user_id, ...]}, id of the last published event);
+            subscribing with that id as Last-Event-ID continues without gaps
+        """
+        with self._lock:
+            fences: Dict[str, List[str]] = {}
+            for user_id, membership in self._members.items():
+                for fence_id, (fence_session, _, _) in membership.items():
+                    if session_id is None or fence_session == session_id:
+                        fences.setdefault(fence_id, []).append(user_id)
+            return fences, self.broker.last_id
+    
+    def sweep(self):
+        """Expire users that have not sent a fix within max_idle_seconds"""
+        with self._lock:
+            self._sweep()
+    
+    def _sweep(self):
+        cutoff = time.time() - self.max_idle_seconds
+        events = []
+        for user_id in [u for u, (_, seen) in self._last_fix.items() if seen < cutoff]:
+            del self._last_fix[user_id]
+            self._positions.pop(user_id, None)
+            for fence_id, membership in self._members.pop(user_id, {}).items():
+                event = self._event('exit', user_id, fence_id, membership, None, time.time())
+                event['reason'] = 'expired'
+                events.append(event)
+        self.broker.publish(events)
+        self._updates_since_sweep = 0
+
+if __name__ == "__main__":
+    from MLModel.geofence_validator import GeoFenceZone
+    
+    validator = GeoFenceValidator()
+    validator.load_fences([
+        GeoFenceZone("room_a", "s1", "Room A", 18.5204, 73.8567, 50, "College"),
+        GeoFenceZone("room_b", "s2", "Room B", 18.5212, 73.8567, 50, "College"),
+    ])
+    tracker = FenceMembershipTracker(validator)
+    only_s1 = tracker.broker.subscribe("s1")
+    everything = tracker.broker.subscribe()
+    
+    def fix(latitude, seconds):
+        return LocationPoint(latitude, 73.8567, datetime.fromtimestamp(1_700_000_000 + seconds), "u1")
+    
+    kinds = [[(e['type'], e['fence_id']) for e in tracker.update(fix(lat, t))]
+             for t, lat in enumerate((18.5195, 18.5204, 18.5208, 18.5214, 18.5230))]
+    assert kinds == [[], [('enter', 'room_a')], [('enter', 'room_b')], [('exit', 'room_a')], [('exit', 'room_b')]], kinds
+    # An out-of-order fix changes nothing
+    assert tracker.update(fix(18.5204, 1)) == []
+    
+    assert [e['fence_id'] for e in only_s1.drain()] == ['room_a', 'room_a']
+    assert len(everything.drain()) == 4
+    replay = tracker.broker.subscribe("s2", last_event_id=1)
+    replayed = replay.drain()
+    assert [(e['type'], e['id']) for e in replayed] == [('enter', 2), ('exit', 4)]
+    assert tracker.broker.subscribe("s2", last_event_id=-5).drain()[0]['type'] == 'resync'
+    # A fix checked against another college's fences keeps room A's membership
+    assert [e['type'] for e in tracker.update(fix(18.5204, 10))] == ['enter']
+    assert tracker.update(fix(18.5230, 11), "Other College") == []
+    assert list(tracker.presence()[0]) == ['room_a']
+    
+    # Fence changes reach current members without waiting for their next fix
+    assert [e['type'] for e in tracker.update(fix(18.5208, 12))] == ['enter']
+    assert list(tracker.presence()[0]) == ['room_a', 'room_b']
+    moved_b = GeoFenceZone("room_b", "s2", "Room B", 18.5230, 73.8567, 50, "College")
+    validator.update_fence(moved_b)
+    changed = tracker.refresh_fence(moved_b)
+    assert [(e['type'], e['reason']) for e in changed] == [('exit', 'fence_changed')], changed
+    renamed_a = GeoFenceZone("room_a", "s3", "Room A", 18.5204, 73.8567, 60, "College")
+    validator.update_fence(renamed_a)
+    moved = tracker.refresh_fence(renamed_a)
+    assert [(e['type'], e['session_id']) for e in moved] == [('exit', 's1'), ('enter', 's3')], moved
+    removed = tracker.remove_fence("room_a")
+    assert [(e['type'], e['reason']) for e in removed] == [('exit', 'fence_removed')]
+    assert tracker.presence()[0] == {}
+    print(format_sse(replayed[-1]), end='')
+    print("Membership transitions: enter/exit events match the walk through both rooms")
@@ -0,0 +1,558 @@
+import sys
+import os
+import logging
+import socket
+import threading
+import subprocess
+from collections import Counter
+from multiprocessing.connection import Connection
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Add parent directory to path to import the geofence validator
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MLModel.geofence_validator import FenceTable, GeoFenceValidator, GeoFenceZone, LocationPoint
+from MLModel.geofence_store import LocationHistoryStore
+
+logger = logging.getLogger(__name__)
+
+# Directory containing the MLModel package, put on the workers' PYTHONPATH
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Methods a worker process answers; anything else is refused
+SHARD_WORKER_METHODS = ('add_fence', 'load_fences', 'update_fence', 'remove_fence',
+                        'validate_point', 'validate_points_batch', 'fences_containing')
+
+def _serve_shard(connection: Connection):
+    """Worker process loop: answer (method, args) messages until None or EOF"""
+    validator = GeoFenceValidator()
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        method, args = message
+        try:
+            if method not in SHARD_WORKER_METHODS:
+                raise AttributeError(f"Shard workers do not serve {method}")
+            connection.send((True, getattr(validator, method)(*args)))
+        except Exception as e:
+            connection.send((False, e))
+    connection.close()
+
+class ProcessValidatorShard:
+    """
+    GeoFenceValidator running in its own worker process
+    
+    Calls are pickled over a socket pair and answered one at a time, so
+    requests for a busy college queue behind each other but not behind
+    other colleges. Fences in returned results are copies of the stored
+    ones. The worker is started as "python -m MLModel.geofence_shards
+    --serve-shard FD" rather than through multiprocessing, which would
+    re-run the importing script (e.g. the API module) in the worker, and
+    exits when the socket closes.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        parent_socket, child_socket = socket.socketpair()
+        python_path = os.pathsep.join(filter(None, (PACKAGE_PARENT, os.environ.get('PYTHONPATH'))))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'MLModel.geofence_shards', '--serve-shard', str(child_socket.fileno())],
+            pass_fds=(child_socket.fileno(),), env=dict(os.environ, PYTHONPATH=python_path)
+        )
+        child_socket.close()
+        self._connection = Connection(parent_socket.detach())
+        self._lock = threading.Lock()
+    
+    def _call(self, method: str, *args):
+        with self._lock:
+            self._connection.send((method, args))
+            ok, value = self._connection.recv()
+        if not ok:
+            raise value
+        return value
+    
+    def add_fence(self, fence: GeoFenceZone):
+        self._call('add_fence', fence)
+    
+    def load_fences(self, fences: List[GeoFenceZone], latitudes=None, longitudes=None, radii=None):
+        self._call('load_fences', fences, latitudes, longitudes, radii)
+    
+    def update_fence(self, fence: GeoFenceZone):
+        self._call('update_fence', fence)
+    
+    def remove_fence(self, fence_id: str) -> Optional[GeoFenceZone]:
+        return self._call('remove_fence', fence_id)
+    
+    def validate_point(self, point: LocationPoint, session_id: Optional[str] = None,
+                       compact: bool = False) -> Dict:
+        return self._call('validate_point', point, session_id, compact)
+    
+    def validate_points_batch(self, points: List[LocationPoint],
+                              session_ids: Optional[List[Optional[str]]] = None,
+                              compact: bool = False) -> List[Dict]:
+        return self._call('validate_points_batch', points, session_ids, compact)
+    
+    def fences_containing(self, points: List[LocationPoint]) -> List[List[GeoFenceZone]]:
+        return self._call('fences_containing', points)
+    
+    def fence_row(self, fence: GeoFenceZone) -> Optional[Tuple[FenceTable, int]]:
+        # The fence table lives in the worker process
+        return None
+    
+    def close(self):
+        """Stop the worker process"""
+        with self._lock:
+            try:
+                self._connection.send(None)
+            except (OSError, ValueError):
+                pass
+            self._connection.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+Shard = Union[GeoFenceValidator, ProcessValidatorShard]
+
+class ShardedGeoFenceValidator(GeoFenceValidator):
+    """
+    Geo-fence validator with one fence table and spatial index per college
+    
+    Fences are routed to the shard of their college_name, so a query for
+    one college never walks another college's fences, and shards can be
+    rebuilt on their own. Queries name a college directly, or are routed
+    through the colleges of their session's fences; queries with neither
+    fan out to every shard and their results are merged. With
+    use_processes each shard runs in a worker process (see
+    ProcessValidatorShard).
+    
+    The inherited fence_table stays empty; the distance, radius and
+    anomaly helpers of GeoFenceValidator work unchanged.
+    """
+    
+    def __init__(self, use_processes: bool = False):
+        super().__init__()
+        self.use_processes = use_processes
+        self.shards: Dict[str, Shard] = {}
+        # fence_id -> (college_name, session_id) the fence was stored under
+        self._routes: Dict[str, Tuple[str, str]] = {}
+        self._college_sizes: Counter = Counter()
+        # session_id -> {college_name: fence count}
+        self._session_colleges: Dict[str, Counter] = {}
+        self._lock = threading.RLock()
+    
+    def _new_shard(self, college_name: str) -> Shard:
+        if self.use_processes:
+            return ProcessValidatorShard(college_name)
+        return GeoFenceValidator()
+    
+    def _shard_for(self, college_name: str) -> Shard:
+        shard = self.shards.get(college_name)
+        if shard is None:
+            shard = self.shards[college_name] = self._new_shard(college_name)
+            logger.info(f"Created geo-fence shard for college {college_name!r}")
+        return shard
+    
+    def _add_route(self, fence: GeoFenceZone):
+        self._routes[fence.id] = (fence.college_name, fence.session_id)
+        self._college_sizes[fence.college_name] += 1
+        self._session_colleges.setdefault(fence.session_id, Counter())[fence.college_name] += 1
+    
+    def _drop_route(self, fence_id: str) -> Optional[Tuple[str, str]]:
+        route = self._routes.pop(fence_id, None)
+        if route is None:
+            return None
+        college_name, session_id = route
+        self._college_sizes[college_name] -= 1
+        if not self._college_sizes[college_name]:
+            del self._college_sizes[college_name]
+        colleges = self._session_colleges[session_id]
+        colleges[college_name] -= 1
+        if not colleges[college_name]:
+            del colleges[college_name]
+            if not colleges:
+                del self._session_colleges[session_id]
+        return route
+    
+    def _close_if_empty(self, college_name: str):
+        if college_name not in self._college_sizes:
+            shard = self.shards.pop(college_name, None)
+            if isinstance(shard, ProcessValidatorShard):
+                shard.close()
+    
+    def add_fence(self, fence: GeoFenceZone):
+        """Store a fence in its college's shard, moving it if its college changed"""
+        with self._lock:
+            route = self._drop_route(fence.id)
+            if route is not None and route[0] != fence.college_name:
+                self.shards[route[0]].remove_fence(fence.id)
+                self._close_if_empty(route[0])
+            self._add_route(fence)
+            self._shard_for(fence.college_name).add_fence(fence)
+    
+    def load_fences(self, fences: List[GeoFenceZone], latitudes=None, longitudes=None, radii=None):
+        """Bulk-load new fences, one load_fences call per college"""
+        if not fences:
+            return
+        colleges = np.array([fence.college_name for fence in fences], dtype=object)
+        with self._lock:
+            for college_name in dict.fromkeys(colleges.tolist()):
+                members = np.flatnonzero(colleges == college_name)
+                college_fences = [fences[i] for i in members.tolist()]
+                for fence in college_fences:
+                    self._add_route(fence)
+                self._shard_for(college_name).load_fences(
+                    college_fences,
+                    None if latitudes is None else np.asarray(latitudes)[members],
+                    None if longitudes is None else np.asarray(longitudes)[members],
+                    None if radii is None else np.asarray(radii)[members]
+                )
+    
+    def remove_fence(self, fence_id: str) -> Optional[GeoFenceZone]:
+        """Remove a fence from its college's shard"""
+        with self._lock:
+            route = self._drop_route(fence_id)
+            if route is None:
+                return None
+            fence = self.shards[route[0]].remove_fence(fence_id)
+            self._close_if_empty(route[0])
+            return fence
+    
+    def rebuild_shard(self, college_name: str, fences: List[GeoFenceZone]) -> int:
+        """
+        Replace a college's shard with a freshly bulk-loaded one
+        
+        The new shard is built before it is swapped in, so queries keep
+        using the old one until then. Other colleges are not touched.
+        
+        Args:
+            college_name: College to rebuild
+            fences: Every fence of that college (e.g. FenceStore.query(college_name=...))
+        
+        Returns:
+            Number of fences in the new shard
+        """
+        fences = [fence for fence in fences if fence.college_name == college_name]
+        shard = self._new_shard(college_name)
+        if fences:
+            shard.load_fences(fences)
+        with self._lock:
+            for fence_id in [f for f, route in self._routes.items() if route[0] == college_name]:
+                self._drop_route(fence_id)
+            for fence in fences:
+                self._add_route(fence)
+            old = self.shards.pop(college_name, None)
+            if fences:
+                self.shards[college_name] = shard
+        for stale in (old, None if fences else shard):
+            if isinstance(stale, ProcessValidatorShard):
+                stale.close()
+        return len(fences)
+    
+    def shard_stats(self) -> Dict[str, int]:
+        """Number of fences per college shard"""
+        with self._lock:
+            return dict(self._college_sizes)
+    
+    def college_of_fence(self, fence_id: str) -> Optional[str]:
+        route = self._routes.get(fence_id)
+        return route[0] if route is not None else None
+    
+    def close(self):
+        """Stop every shard worker process"""
+        with self._lock:
+            shards, self.shards = list(self.shards.values()), {}
+        for shard in shards:
+            if isinstance(shard, ProcessValidatorShard):
+                shard.close()
+    
+    def fence_row(self, fence: GeoFenceZone) -> Optional[Tuple[FenceTable, int]]:
+        shard = self.shards.get(self.college_of_fence(fence.id))
+        return shard.fence_row(fence) if shard is not None else None
+    
+    def _route(self, session_id: Optional[str], college_name: Optional[str]) -> List[Shard]:
+        """Shards that can hold fences matching the filters (call with the lock held)"""
+        if college_name is not None:
+            shard = self.shards.get(college_name)
+            return [shard] if shard is not None else []
+        if session_id is not None:
+            return [self.shards[college] for college in self._session_colleges.get(session_id, ())]
+        return list(self.shards.values())
+    
+    @staticmethod
+    def _merge_results(results: List[Dict], compact: bool) -> Dict:
+        """Combine one point's results from several shards (highest score wins, first shard on ties)"""
+        if len(results) == 1:
+            return results[0]
+        if compact:
+            best = max(results, key=lambda r: -1.0 if r['accuracy_score'] is None else r['accuracy_score'])
+            return best if best['is_within_any_fence'] else results[0]
+        
+        merged = dict(results[0])
+        matches = [r['best_match'] for r in results if r['best_match'] is not None]
+        merged['best_match'] = max(matches, key=lambda m: m.get('accuracy_score', 0)) if matches else None
+        merged['is_within_any_fence'] = merged['best_match'] is not None
+        merged['total_fences_checked'] = sum(r['total_fences_checked'] for r in results)
+        merged['valid_fences_count'] = sum(r['valid_fences_count'] for r in results)
+        if 'all_results' in merged:
+            merged['all_results'] = [entry for r in results for entry in r['all_results']]
+        return merged
+    
+    def validate_point(self, point: LocationPoint, session_id: Optional[str] = None,
+                       compact: bool = False, college_name: Optional[str] = None) -> Dict:
+        """
+        Validate a location point against the shards its filters route to
+        
+        Args:
+            point: Location point to check
+            session_id: Only consider fences of this session (optional)
+            compact: Return a compact_result (optional)
+            college_name: Only consider this college's shard (optional)
+        
+        Returns:
+            The validate_point result of the routed shard, merged across
+            shards when the point fans out to several
+        """
+        with self._lock:
+            shards = self._route(session_id, college_name)
+        if not shards:
+            return super().validate_point(point, session_id, compact)
+        return self._merge_results(
+            [shard.validate_point(point, session_id, compact) for shard in shards], compact)
+    
+    def _group_by_shard(self, count: int, session_ids, college_names) -> Tuple[List[Shard], Dict[int, List[int]]]:
+        """Routed shards and, per shard position, the indices of the points routed to it"""
+        shards: List[Shard] = []
+        positions: Dict[int, int] = {}
+        groups: Dict[int, List[int]] = {}
+        with self._lock:
+            for idx in range(count):
+                for shard in self._route(session_ids[idx] if session_ids else None,
+                                         college_names[idx] if college_names else None):
+                    position = positions.get(id(shard))
+                    if position is None:
+                        position = positions[id(shard)] = len(shards)
+                        shards.append(shard)
+                    groups.setdefault(position, []).append(idx)
+        return shards, groups
+    
+    def validate_points_batch(self, points: List[LocationPoint],
+                              session_ids: Optional[List[Optional[str]]] = None,
+                              compact: bool = False,
+                              college_names: Optional[List[Optional[str]]] = None) -> List[Dict]:
+        """
+        Validate many location points, one validate_points_batch call per routed shard
+        
+        Args:
+            points: Location points to check
+            session_ids: Per-point session filter, aligned with points (optional)
+            compact: Return compact_result dicts instead of summaries
+            college_names: Per-point college routing, aligned with points (optional)
+        
+        Returns:
+            List of validation summaries, one per point, in input order
+        """
+        shards, groups = self._group_by_shard(len(points), session_ids, college_names)
+        partial: List[List[Dict]] = [[] for _ in points]
+        for position, indices in groups.items():
+            results = shards[position].validate_points_batch(
+                [points[i] for i in indices],
+                [session_ids[i] for i in indices] if session_ids else None,
+                compact
+            )
+            for idx, result in zip(indices, results):
+                partial[idx].append(result)
+        
+        unrouted = [idx for idx, results in enumerate(partial) if not results]
+        if unrouted:
+            empty = super().validate_points_batch([points[i] for i in unrouted], compact=compact)
+            for idx, result in zip(unrouted, empty):
+                partial[idx].append(result)
+        return [self._merge_results(results, compact) for results in partial]
+    
+    def fences_containing(self, points: List[LocationPoint],
+                          college_names: Optional[List[Optional[str]]] = None) -> List[List[GeoFenceZone]]:
+        """
+        Active fences that contain each point, from the shards each point routes to
+        
+        Args:
+            points: Location points to look up
+            college_names: Per-point college routing, aligned with points
+                (optional; points without one are looked up in every shard)
+        
+        Returns:
+            One list of geo-fence zones per point, in input order
+        """
+        shards, groups = self._group_by_shard(len(points), None, college_names)
+        containing: List[List[GeoFenceZone]] = [[] for _ in points]
+        for position, indices in groups.items():
+            found = shards[position].fences_containing([points[i] for i in indices])
+            for idx, fences in zip(indices, found):
+                containing[idx].extend(fences)
+        return containing
+
+class ShardedLocationHistoryStore:
+    """
+    Per-college LocationHistoryStore shards
+    
+    Each fix is recorded in the shard of the college it was validated for
+    (fixes without a college share one shard), so an audit of one college
+    only reads that college's users. A user seen under several colleges
+    has a bounded history in each, read back merged by timestamp.
+    """
+    
+    def __init__(self, max_points: int = 1000, max_age_seconds: float = 24 * 3600,
+                 sweep_interval: int = 10000):
+        self.max_points = max_points
+        self.max_age_seconds = max_age_seconds
+        self.sweep_interval = sweep_interval
+        self.shards: Dict[Optional[str], LocationHistoryStore] = {}
+    
+    def __len__(self) -> int:
+        return len({user_id for shard in self.shards.values() for user_id in shard.user_ids()})
+    
+    def __contains__(self, user_id: str) -> bool:
+        return any(user_id in shard for shard in self.shards.values())
+    
+    def shard(self, college_name: Optional[str]) -> LocationHistoryStore:
+        """The history shard of a college (None for fixes without one), created on first use"""
+        shard = self.shards.get(college_name)
+        if shard is None:
+            shard = self.shards[college_name] = LocationHistoryStore(
+                self.max_points, self.max_age_seconds, self.sweep_interval)
+        return shard
+    
+    def record(self, point: LocationPoint, college_name: Optional[str] = None):
+        """Append a location fix to its user's history in the college's shard"""
+        if point.user_id is not None:
+            self.shard(college_name).record(point)
+    
+    def history(self, user_id: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return a user's unexpired history as columnar arrays
+        
+        Returns:
+            (latitudes, longitudes, epoch_timestamps), oldest first; empty
+            arrays if the user has no history
+        """
+        parts = [shard.history(user_id) for shard in self.shards.values() if user_id in shard]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty.copy(), empty.copy()
+        
+        latitudes, longitudes, timestamps = (np.concatenate(column) for column in zip(*parts))
+        order = np.argsort(timestamps, kind='stable')
+        return latitudes[order], longitudes[order], timestamps[order]
+    
+    def columns(self, college_name: Optional[str] = None
+                ) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return unexpired histories as one columnar table
+        
+        Args:
+            college_name: Only this college's shard (optional; default all shards)
+        
+        Returns:
+            (user_ids, user_codes, latitudes, longitudes, epoch_timestamps),
+            where user_codes index into user_ids
+        """
+        if college_name is not None:
+            shard = self.shards.get(college_name)
+            return (shard or LocationHistoryStore()).columns()
+        
+        user_index: Dict[str, int] = {}
+        parts = []
+        for shard in self.shards.values():
+            user_ids, user_codes, latitudes, longitudes, timestamps = shard.columns()
+            remap = np.array([user_index.setdefault(user_id, len(user_index)) for user_id in user_ids],
+                             dtype=np.int64)
+            parts.append((remap[user_codes], latitudes, longitudes, timestamps))
+        if not parts:
+            return LocationHistoryStore().columns()
+        user_codes, latitudes, longitudes, timestamps = (np.concatenate(column) for column in zip(*parts))
+        return list(user_index), user_codes, latitudes, longitudes, timestamps
+    
+    def sweep(self):
+        """Expire old fixes in every shard"""
+        for shard in self.shards.values():
+            shard.sweep()
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--serve-shard':
+        _serve_shard(Connection(int(sys.argv[2])))
+        sys.exit(0)
+    
+    from datetime import datetime
+    
+    fences = [
+        GeoFenceZone("a1", "sa", "Hall A1", 18.5204, 73.8567, 50, "College A"),
+        GeoFenceZone("a2", "sa", "Hall A2", 18.5300, 73.8567, 50, "College A"),
+        GeoFenceZone("b1", "sb", "Hall B1", 18.5204, 73.8567, 80, "College B"),
+    ]
+    points = [LocationPoint(18.5204, 73.8568), LocationPoint(18.5300, 73.8567), LocationPoint(18.6, 73.9)]
+    
+    for use_processes in (False, True):
+        flat = GeoFenceValidator()
+        flat.load_fences(fences)
+        sharded = ShardedGeoFenceValidator(use_processes=use_processes)
+        sharded.load_fences(fences[:2])
+        sharded.add_fence(fences[2])
+        assert sharded.shard_stats() == {"College A": 2, "College B": 1}
+        
+        for session_id, college_name in ((None, None), ("sa", None), (None, "College B"), ("sb", "College A")):
+            for compact in (False, True):
+                for point in points:
+                    expected = flat.validate_point(point, session_id, compact, college_name)
+                    actual = sharded.validate_point(point, session_id, compact, college_name)
+                    for key in ('is_within_any_fence', 'total_fences_checked', 'valid_fences_count', 'fence_id'):
+                        assert expected.get(key) == actual.get(key), (session_id, college_name, key)
+                expected = flat.validate_points_batch(points, [session_id] * 3, compact, [college_name] * 3)
+                actual = sharded.validate_points_batch(points, [session_id] * 3, compact, [college_name] * 3)
+                assert [r['is_within_any_fence'] for r in expected] == [r['is_within_any_fence'] for r in actual]
+        assert [[f.id for f in found] for found in sharded.fences_containing(points)] == [["a1", "b1"], ["a2"], []]
+        
+        # Moving a fence to another college moves it between shards
+        fences[1].college_name = "College B"
+        sharded.update_fence(fences[1])
+        assert sharded.shard_stats() == {"College A": 1, "College B": 2}
+        assert sharded.validate_point(points[1], college_name="College B")['is_within_any_fence']
+        assert not sharded.validate_point(points[1], college_name="College A")['is_within_any_fence']
+        fences[1].college_name = "College A"
+        
+        assert sharded.rebuild_shard("College B", [fences[2]]) == 1
+        assert sharded.remove_fence("a1").id == "a1"
+        assert "College A" not in sharded.shards
+        sharded.close()
+    
+    history = ShardedLocationHistoryStore()
+    history.record(LocationPoint(18.52, 73.85, datetime.fromtimestamp(2e9), "u1"), "College A")
+    history.record(LocationPoint(18.53, 73.85, datetime.fromtimestamp(2e9 - 60), "u1"), "College B")
+    history.record(LocationPoint(18.54, 73.85, datetime.fromtimestamp(2e9), "u2"), "College B")
+    assert history.history("u1")[0].tolist() == [18.53, 18.52]
+    user_ids, user_codes, _, _, _ = history.columns()
+    assert user_ids == ["u1", "u2"] and user_codes.tolist() == [0, 0, 1]
+    assert history.columns("College A")[0] == ["u1"] and len(history) == 2
+    
+    # A session with fences in two colleges is not pinned to either college;
+    # validating by session alone fans out to both shards
+    from MLModel.geofence_store import FenceStore
+    
+    sharded = ShardedGeoFenceValidator()
+    store = FenceStore(sharded)
+    store.add(GeoFenceZone("s1", "split", "Hall 1", 18.5204, 73.8567, 50, "College A"))
+    store.add(GeoFenceZone("s2", "split", "Hall 2", 18.5300, 73.8567, 50, "College B"))
+    assert store.college_of_session("split") is None and store.college_of_session("sa") is None
+    assert store.college_of_session(None) is None
+    college = store.college_of_session("split")
+    assert sharded.validate_point(points[1], "split", college_name=college)['is_within_any_fence']
+    store.remove("s1")
+    assert store.college_of_session("split") == "College B"
+    print("Sharded validation matches the unsharded validator, in-process and in worker processes")
@@ -0,0 +1,766 @@
+import sys
+import os
+import json
+import time
+import dataclasses
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Add parent directory to path to import the geofence validator
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MLModel.geofence_validator import GeoFenceValidator, GeoFenceZone, LocationPoint
+
+# Fields that may be changed through FenceStore.update
+UPDATABLE_FIELDS = (
+    'session_id', 'location_name', 'latitude', 'longitude',
+    'radius_meters', 'college_name', 'batch_id', 'is_active', 'polygon'
+)
+
+# Column order of the geo_fences table and of snapshot rows
+FENCE_COLUMNS = (
+    'id', 'session_id', 'location_name', 'latitude', 'longitude',
+    'radius_meters', 'college_name', 'batch_id', 'is_active', 'created_date', 'polygon'
+)
+
+# Text columns of snapshot rows
+TEXT_FIELDS = ('id', 'session_id', 'location_name', 'college_name', 'batch_id', 'created_date')
+
+logger = logging.getLogger(__name__)
+
+def _radius_value(radius: float):
+    """Restore a stored radius as an int when it is integral"""
+    return int(radius) if float(radius).is_integer() else float(radius)
+
+def _encode_polygon(polygon) -> Optional[str]:
+    return None if polygon is None else json.dumps([list(vertex) for vertex in polygon])
+
+def _decode_polygon(text: Optional[str]) -> Optional[List[Tuple[float, float]]]:
+    return None if text is None else [tuple(vertex) for vertex in json.loads(text)]
+
+
+class SqliteFenceBackend:
+    """
+    Durable fence storage in a local SQLite database
+    
+    The database runs in WAL mode so several worker processes can read
+    while one writes. Every write takes the next value of a shared change
+    sequence and deletions leave tombstones, so each worker can pull the
+    changes made by the others with changes_since.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS geo_fences (
+                id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                location_name TEXT NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                radius_meters REAL NOT NULL,
+                college_name TEXT NOT NULL,
+                batch_id TEXT,
+                is_active INTEGER NOT NULL,
+                created_date TEXT,
+                polygon TEXT,
+                sort_order INTEGER NOT NULL,
+                change_seq INTEGER NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS geo_fences_change_seq ON geo_fences (change_seq);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO meta (key, value) VALUES ('sequence', 0);
+            -- Databases that predate the id counter continue it from the change sequence
+            INSERT OR IGNORE INTO meta (key, value) SELECT 'fence_id', value FROM meta WHERE key = 'sequence';
+        """)
+        # Databases created before polygon fences lack the polygon column
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(geo_fences)")]
+        if 'polygon' not in columns:
+            self._conn.execute("ALTER TABLE geo_fences ADD COLUMN polygon TEXT")
+        self._data_version = self._query_data_version()
+    
+    def _query_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def _bump(self, key: str) -> int:
+        # Caller holds the lock and an open write transaction
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (key,))
+        return self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+    
+    def _write(self, statement, params_fn, counter: str = 'sequence') -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = self._bump(counter)
+                if statement is not None:
+                    self._conn.execute(statement, params_fn(value))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return value
+    
+    def next_fence_number(self) -> int:
+        """Reserve the next fence id number, shared by every process using the database"""
+        return self._write(None, None, counter='fence_id')
+    
+    def save(self, fence: GeoFenceZone, new_order: bool = True) -> int:
+        """
+        Insert or update a fence
+        
+        Args:
+            fence: Fence to store
+            new_order: Move the fence to the end of the creation order
+                (as a fresh insert does); otherwise keep its position
+        
+        Returns:
+            The change sequence number of this write
+        """
+        values = (
+            fence.id, fence.session_id, fence.location_name, float(fence.latitude),
+            float(fence.longitude), float(fence.radius_meters), fence.college_name,
+            fence.batch_id, int(bool(fence.is_active)), fence.created_date,
+            _encode_polygon(fence.polygon)
+        )
+        order_update = "excluded.sort_order" if new_order else \
+            "CASE WHEN geo_fences.deleted THEN excluded.sort_order ELSE geo_fences.sort_order END"
+        statement = f"""
+            INSERT INTO geo_fences ({', '.join(FENCE_COLUMNS)}, sort_order, change_seq, deleted)
+            VALUES ({', '.join('?' * len(FENCE_COLUMNS))}, ?, ?, 0)
+            ON CONFLICT(id) DO UPDATE SET
+                {', '.join(f'{c} = excluded.{c}' for c in FENCE_COLUMNS[1:])},
+                sort_order = {order_update},
+                change_seq = excluded.change_seq,
+                deleted = 0
+        """
+        return self._write(statement, lambda sequence: values + (sequence, sequence))
+    
+    def delete(self, fence_id: str) -> int:
+        """Mark a fence deleted; returns the change sequence number"""
+        return self._write(
+            "UPDATE geo_fences SET deleted = 1, change_seq = ? WHERE id = ?",
+            lambda sequence: (sequence, fence_id)
+        )
+    
+    def changes_since(self, sequence: int) -> List[Tuple]:
+        """
+        Rows changed after the given sequence number, oldest change first
+        
+        Returns:
+            Tuples of the FENCE_COLUMNS values followed by sort_order,
+            change_seq and deleted
+        """
+        with self._lock:
+            self._data_version = self._query_data_version()
+            return self._conn.execute(
+                f"SELECT {', '.join(FENCE_COLUMNS)}, sort_order, change_seq, deleted "
+                "FROM geo_fences WHERE change_seq > ? ORDER BY change_seq",
+                (sequence,)
+            ).fetchall()
+    
+    def has_external_changes(self) -> bool:
+        """Whether another connection has committed since the last changes_since call"""
+        with self._lock:
+            return self._query_data_version() != self._data_version
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class FenceStore:
+    """
+    Geo-fence store keyed by fence id
+    
+    Keeps a primary dict by id plus secondary indexes by session, college
+    and active flag, so lookups and filtered listings are hash lookups
+    instead of scans. When a validator is given, its spatial index is kept
+    in sync with every change. When a backend is given, every change is
+    also written to it and sync() pulls in changes made by other processes.
+    """
+    
+    def __init__(self, validator: Optional[GeoFenceValidator] = None,
+                 backend: Optional[SqliteFenceBackend] = None):
+        self.validator = validator
+        self.backend = backend
+        self._fences: Dict[str, GeoFenceZone] = {}
+        self._order: Dict[str, int] = {}
+        self._by_session: Dict[str, Dict[str, None]] = {}
+        self._by_college: Dict[str, Dict[str, None]] = {}
+        self._by_active: Dict[bool, Dict[str, None]] = {True: {}, False: {}}
+        self._sequence = 0
+        # Backend change sequence this store has caught up to, and the
+        # sequence numbers of its own writes not yet seen by sync()
+        self._synced_sequence = 0
+        self._own_changes = set()
+    
+    @classmethod
+    def open(cls, validator: Optional[GeoFenceValidator], db_path: str,
+             snapshot_path: Optional[str] = None) -> 'FenceStore':
+        """
+        Open a SQLite-backed store, loading the snapshot first if there is one
+        
+        Only changes made after the snapshot was written are replayed from
+        the database. The snapshot is rewritten when it is missing or stale.
+        
+        Args:
+            validator: Validator whose spatial index should follow the store
+            db_path: SQLite database file
+            snapshot_path: Binary snapshot file (optional)
+        
+        Returns:
+            The loaded store
+        """
+        store = cls(validator, SqliteFenceBackend(db_path))
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                store.load_snapshot(snapshot_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable fence snapshot {snapshot_path}: {e}")
+                store = cls(validator, store.backend)
+        
+        applied = store.sync(force=True)
+        if snapshot_path and (applied or not os.path.exists(snapshot_path)):
+            store.write_snapshot(snapshot_path)
+        return store
+    
+    def __len__(self) -> int:
+        return len(self._fences)
+    
+    def __contains__(self, fence_id: str) -> bool:
+        return fence_id in self._fences
+    
+    def __iter__(self) -> Iterator[GeoFenceZone]:
+        return iter(list(self._fences.values()))
+    
+    def next_id(self) -> str:
+        """Generate a fence id that stays unique after deletions; reserves one number per call"""
+        if self.backend is not None:
+            number = self.backend.next_fence_number()
+        else:
+            number = self._sequence + 1
+        return f"fence_{number}_{int(datetime.now().timestamp())}"
+    
+    def _index(self, fence: GeoFenceZone):
+        self._by_session.setdefault(fence.session_id, {})[fence.id] = None
+        self._by_college.setdefault(fence.college_name, {})[fence.id] = None
+        self._by_active[bool(fence.is_active)][fence.id] = None
+    
+    def _unindex(self, fence: GeoFenceZone):
+        for index, key in ((self._by_session, fence.session_id),
+                           (self._by_college, fence.college_name)):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(fence.id, None)
+                if not bucket:
+                    del index[key]
+        self._by_active[bool(fence.is_active)].pop(fence.id, None)
+    
+    def _add_local(self, fence: GeoFenceZone, order: int):
+        if fence.id in self._fences:
+            self._remove_local(fence.id)
+        
+        self._sequence = max(self._sequence, order)
+        self._fences[fence.id] = fence
+        self._order[fence.id] = order
+        self._index(fence)
+        if self.validator is not None:
+            self.validator.add_fence(fence)
+    
+    def _remove_local(self, fence_id: str) -> Optional[GeoFenceZone]:
+        fence = self._fences.pop(fence_id, None)
+        if fence is None:
+            return None
+        
+        del self._order[fence_id]
+        self._unindex(fence)
+        if self.validator is not None:
+            self.validator.remove_fence(fence_id)
+        return fence
+    
+    def add(self, fence: GeoFenceZone) -> GeoFenceZone:
+        """Insert a fence, replacing any fence with the same id"""
+        if self.backend is not None:
+            order = self.backend.save(fence)
+            self._record_own_change(order)
+        else:
+            order = self._sequence + 1
+        self._add_local(fence, order)
+        return fence
+    
+    def get(self, fence_id: str) -> Optional[GeoFenceZone]:
+        """Return the fence with the given id, or None"""
+        return self._fences.get(fence_id)
+    
+    def update(self, fence_id: str, changes: Dict) -> Optional[GeoFenceZone]:
+        """
+        Replace a fence with a copy carrying the field changes
+        
+        The copy is saved to the backend before it replaces the stored
+        fence, so a failed save changes nothing.
+        
+        Args:
+            fence_id: Id of the fence to update
+            changes: Mapping of field name to new (already converted) value
+        
+        Returns:
+            The updated fence, or None if it does not exist
+        """
+        fence = self._fences.get(fence_id)
+        if fence is None:
+            return None
+        
+        unknown = set(changes) - set(UPDATABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Fields cannot be updated: {sorted(unknown)}")
+        
+        # Save a copy first so a failed write leaves the stored fence untouched
+        updated = dataclasses.replace(fence, **changes)
+        if self.backend is not None:
+            self._record_own_change(self.backend.save(updated, new_order=False))
+        
+        self._unindex(fence)
+        self._fences[fence_id] = updated
+        self._index(updated)
+        if self.validator is not None:
+            self.validator.update_fence(updated)
+        return updated
+    
+    def remove(self, fence_id: str) -> Optional[GeoFenceZone]:
+        """Delete a fence; returns it, or None if it does not exist"""
+        if fence_id not in self._fences:
+            return None
+        # Delete from the backend first so a failed write leaves the fence in place
+        if self.backend is not None:
+            self._record_own_change(self.backend.delete(fence_id))
+        return self._remove_local(fence_id)
+    
+    def query(self, session_id: Optional[str] = None, college_name: Optional[str] = None,
+              is_active: Optional[bool] = None) -> List[GeoFenceZone]:
+        """
+        Return fences matching every given filter, in creation order
+        
+        Only the smallest matching index bucket is walked; the others are
+        used as membership checks.
+        """
+        buckets = []
+        if session_id is not None:
+            buckets.append(self._by_session.get(session_id, {}))
+        if college_name is not None:
+            buckets.append(self._by_college.get(college_name, {}))
+        if is_active is not None:
+            buckets.append(self._by_active[bool(is_active)])
+        
+        if not buckets:
+            return list(self._fences.values())
+        
+        buckets.sort(key=len)
+        smallest, others = buckets[0], buckets[1:]
+        fence_ids = [fence_id for fence_id in smallest
+                     if all(fence_id in bucket for bucket in others)]
+        fence_ids.sort(key=self._order.__getitem__)
+        return [self._fences[fence_id] for fence_id in fence_ids]
+    
+    def college_of_session(self, session_id: Optional[str]) -> Optional[str]:
+        """
+        College of a session's fences
+        
+        Returns:
+            The college all of the session's fences belong to, or None if
+            the session has no fences or they span several colleges
+        """
+        colleges = {self._fences[fence_id].college_name for fence_id in self._by_session.get(session_id, ())}
+        return colleges.pop() if len(colleges) == 1 else None
+    
+    def _record_own_change(self, sequence: int):
+        # With no unseen change before it, a write moves the sync point
+        # forward directly; otherwise sync() skips it when it gets there
+        if sequence == self._synced_sequence + 1:
+            self._synced_sequence = sequence
+        else:
+            self._own_changes.add(sequence)
+    
+    def sync(self, force: bool = False) -> int:
+        """
+        Apply changes other processes wrote to the backend since the last sync
+        
+        Cheap when nothing changed: the database is only queried after
+        another connection has committed, unless force is set.
+        
+        Returns:
+            Number of changes applied
+        """
+        if self.backend is None or not (force or self.backend.has_external_changes()):
+            return 0
+        
+        applied = 0
+        for row in self.backend.changes_since(self._synced_sequence):
+            values, (order, change_seq, deleted) = row[:len(FENCE_COLUMNS)], row[len(FENCE_COLUMNS):]
+            self._synced_sequence = max(self._synced_sequence, change_seq)
+            if change_seq in self._own_changes:
+                self._own_changes.discard(change_seq)
+                continue
+            
+            applied += 1
+            if deleted:
+                self._remove_local(values[0])
+            else:
+                fence = GeoFenceZone(**dict(zip(FENCE_COLUMNS, values)))
+                fence.radius_meters = _radius_value(fence.radius_meters)
+                fence.is_active = bool(fence.is_active)
+                fence.polygon = _decode_polygon(fence.polygon)
+                self._add_local(fence, order)
+        
+        # Own writes at or below the sync point can no longer show up
+        self._own_changes = {s for s in self._own_changes if s > self._synced_sequence}
+        return applied
+    
+    def write_snapshot(self, path: str):
+        """
+        Write every fence to a binary snapshot file
+        
+        The snapshot is a single NumPy structured array (.npy). It is written
+        to a temporary file and renamed into place, so readers never see a
+        partial snapshot.
+        """
+        self.sync(force=True)
+        fences = list(self._fences.values())
+        # Text is stored as UTF-8 bytes ('S' fields, a quarter of the size of 'U' for
+        # ASCII); polygons as JSON text, empty meaning a circular fence
+        text = {field: [(getattr(f, field) or '').encode('utf-8') for f in fences] for field in TEXT_FIELDS}
+        text['polygon'] = [(_encode_polygon(f.polygon) or '').encode('utf-8') for f in fences]
+        
+        dtype = [(field, f'S{max([len(v) for v in values] + [1])}') for field, values in text.items()]
+        dtype += [('latitude', 'f8'), ('longitude', 'f8'), ('radius_meters', 'f8'),
+                  ('is_active', '?'), ('has_batch_id', '?'), ('has_created_date', '?'),
+                  ('sort_order', 'i8'), ('synced_sequence', 'i8')]
+        
+        snapshot = np.empty(len(fences), dtype=dtype)
+        for field, values in text.items():
+            snapshot[field] = values
+        for field in ('latitude', 'longitude', 'radius_meters', 'is_active'):
+            snapshot[field] = [getattr(f, field) for f in fences]
+        snapshot['has_batch_id'] = [f.batch_id is not None for f in fences]
+        snapshot['has_created_date'] = [f.created_date is not None for f in fences]
+        snapshot['sort_order'] = [self._order[f.id] for f in fences]
+        snapshot['synced_sequence'] = self._synced_sequence
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as f:
+            np.save(f, snapshot, allow_pickle=False)
+        os.replace(temp_path, path)
+    
+    def load_snapshot(self, path: str) -> int:
+        """
+        Bulk-load fences from a snapshot written by write_snapshot
+        
+        The columns are read in bulk and the coordinate columns go straight to
+        GeoFenceValidator.load_fences instead of one add_fence per fence.
+        Each process builds its own fences from the file; nothing stays
+        shared between processes once it is loaded.
+        
+        Returns:
+            Number of fences loaded
+        """
+        if self._fences:
+            raise ValueError("Snapshots can only be loaded into an empty store")
+        
+        snapshot = np.load(path, allow_pickle=False)
+        if len(snapshot) == 0:
+            return 0
+        
+        def text_column(field):
+            # Snapshots written before polygon fences have no polygon column;
+            # older ones store text as 'U' fields rather than UTF-8 bytes
+            if field not in snapshot.dtype.names:
+                return [''] * len(snapshot)
+            values = snapshot[field].tolist()
+            if snapshot.dtype[field].kind == 'S':
+                values = [v.decode('utf-8') for v in values]
+            return values
+        
+        columns = {field: text_column(field) for field in TEXT_FIELDS}
+        columns.update((field, snapshot[field].tolist()) for field in
+                       ('latitude', 'longitude', 'radius_meters', 'is_active', 'has_batch_id',
+                        'has_created_date', 'sort_order'))
+        polygons = text_column('polygon')
+        fences = []
+        for i, fence_id in enumerate(columns['id']):
+            fence = GeoFenceZone(
+                id=fence_id,
+                session_id=columns['session_id'][i],
+                location_name=columns['location_name'][i],
+                latitude=columns['latitude'][i],
+                longitude=columns['longitude'][i],
+                radius_meters=_radius_value(columns['radius_meters'][i]),
+                college_name=columns['college_name'][i],
+                batch_id=columns['batch_id'][i] if columns['has_batch_id'][i] else None,
+                is_active=columns['is_active'][i],
+                created_date=columns['created_date'][i] if columns['has_created_date'][i] else None,
+                polygon=_decode_polygon(polygons[i] or None)
+            )
+            self._fences[fence_id] = fence
+            self._order[fence_id] = columns['sort_order'][i]
+            self._index(fence)
+            fences.append(fence)
+        
+        self._sequence = max(columns['sort_order'])
+        self._synced_sequence = int(snapshot['synced_sequence'][0])
+        if self.validator is not None:
+            self.validator.load_fences(fences, snapshot['latitude'], snapshot['longitude'],
+                                       snapshot['radius_meters'])
+        return len(fences)
+
+
+class UserLocationBuffer:
+    """
+    Fixed-capacity ring buffer of one user's location fixes
+    
+    Latitude, longitude and epoch timestamp live in parallel NumPy arrays,
+    kept in timestamp order: a fix older than the newest stored one (a
+    late or backdated upload) is inserted where it belongs. Storage starts
+    small and doubles up to max_points; once full, the oldest fix is
+    dropped.
+    """
+    
+    __slots__ = ('max_points', 'latitudes', 'longitudes', 'timestamps', 'start', 'size')
+    
+    def __init__(self, max_points: int, initial_capacity: int = 16):
+        self.max_points = max_points
+        capacity = min(initial_capacity, max_points)
+        self.latitudes = np.empty(capacity, dtype=np.float64)
+        self.longitudes = np.empty(capacity, dtype=np.float64)
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.start = 0
+        self.size = 0
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def _grow(self):
+        capacity = min(len(self.latitudes) * 2, self.max_points)
+        latitudes, longitudes, timestamps = self.arrays()
+        for name, values in (('latitudes', latitudes), ('longitudes', longitudes),
+                             ('timestamps', timestamps)):
+            grown = np.empty(capacity, dtype=np.float64)
+            grown[:self.size] = values
+            setattr(self, name, grown)
+        self.start = 0
+    
+    def append(self, latitude: float, longitude: float, timestamp: float):
+        """Add a fix, overwriting the oldest one when the buffer is full"""
+        if self.size and timestamp < self.timestamps[(self.start + self.size - 1) % len(self.timestamps)]:
+            self._insert(latitude, longitude, timestamp)
+            return
+        
+        capacity = len(self.latitudes)
+        if self.size == capacity and capacity < self.max_points:
+            self._grow()
+            capacity = len(self.latitudes)
+        
+        position = (self.start + self.size) % capacity
+        self.latitudes[position] = latitude
+        self.longitudes[position] = longitude
+        self.timestamps[position] = timestamp
+        if self.size < capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % capacity
+    
+    def _insert(self, latitude: float, longitude: float, timestamp: float):
+        """Place a late fix in timestamp order (copies the buffer; late fixes are rare)"""
+        columns = list(self.arrays())
+        at = int(np.searchsorted(columns[2], timestamp, side='right'))
+        if self.size == self.max_points:
+            if at == 0:
+                # Older than every fix a full buffer keeps
+                return
+            columns = [column[1:] for column in columns]
+            at -= 1
+        
+        size = len(columns[0]) + 1
+        capacity = len(self.latitudes)
+        if size > capacity:
+            capacity = min(capacity * 2, self.max_points)
+        for name, column, value in (('latitudes', columns[0], latitude), ('longitudes', columns[1], longitude),
+                                    ('timestamps', columns[2], timestamp)):
+            stored = np.empty(capacity, dtype=np.float64)
+            stored[:at] = column[:at]
+            stored[at] = value
+            stored[at + 1:size] = column[at:]
+            setattr(self, name, stored)
+        self.start = 0
+        self.size = size
+    
+    def _positions(self) -> np.ndarray:
+        return (self.start + np.arange(self.size)) % len(self.latitudes)
+    
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (latitudes, longitudes, timestamps) copies, oldest first"""
+        positions = self._positions()
+        return self.latitudes[positions], self.longitudes[positions], self.timestamps[positions]
+    
+    def drop_before(self, min_timestamp: float):
+        """Drop fixes recorded before min_timestamp (fixes are in timestamp order)"""
+        if self.size == 0:
+            return
+        fresh = self.timestamps[self._positions()] >= min_timestamp
+        expired = int(np.argmax(fresh)) if fresh.any() else self.size
+        self.start = (self.start + expired) % len(self.latitudes)
+        self.size -= expired
+
+
+class LocationHistoryStore:
+    """
+    Bounded per-user location history
+    
+    Each user keeps at most max_points fixes, and fixes older than
+    max_age_seconds are dropped, so memory stays bounded no matter how
+    long the service runs. Users whose history has fully expired are
+    removed on periodic sweeps.
+    """
+    
+    def __init__(self, max_points: int = 1000, max_age_seconds: float = 24 * 3600,
+                 sweep_interval: int = 10000):
+        self.max_points = max_points
+        self.max_age_seconds = max_age_seconds
+        self.sweep_interval = sweep_interval
+        self._buffers: Dict[str, UserLocationBuffer] = {}
+        self._records_since_sweep = 0
+    
+    def __len__(self) -> int:
+        return len(self._buffers)
+    
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._buffers
+    
+    def user_ids(self) -> List[str]:
+        """Ids of users with a stored history"""
+        return list(self._buffers)
+    
+    def record(self, point: LocationPoint):
+        """Append a location fix to its user's history (points without user_id are ignored)"""
+        if point.user_id is None:
+            return
+        
+        buffer = self._buffers.get(point.user_id)
+        if buffer is None:
+            buffer = self._buffers[point.user_id] = UserLocationBuffer(self.max_points)
+        
+        timestamp = point.timestamp.timestamp() if point.timestamp else time.time()
+        buffer.append(point.latitude, point.longitude, timestamp)
+        
+        self._records_since_sweep += 1
+        if self._records_since_sweep >= self.sweep_interval:
+            self.sweep()
+    
+    def history(self, user_id: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return a user's unexpired history as columnar arrays
+        
+        Returns:
+            (latitudes, longitudes, epoch_timestamps), oldest first; empty
+            arrays if the user has no history
+        """
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty.copy(), empty.copy()
+        
+        buffer.drop_before(time.time() - self.max_age_seconds)
+        return buffer.arrays()
+    
+    def columns(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return every user's unexpired history as one columnar table
+        
+        Returns:
+            (user_ids, user_codes, latitudes, longitudes, epoch_timestamps),
+            where user_codes index into user_ids
+        """
+        user_ids = list(self._buffers)
+        parts = [self.history(user_id) for user_id in user_ids]
+        if not parts:
+            empty = np.empty(0, dtype=np.float64)
+            return [], np.empty(0, dtype=np.int64), empty, empty.copy(), empty.copy()
+        
+        user_codes = np.repeat(np.arange(len(user_ids), dtype=np.int64), [len(p[0]) for p in parts])
+        latitudes, longitudes, timestamps = (np.concatenate(column) for column in zip(*parts))
+        return user_ids, user_codes, latitudes, longitudes, timestamps
+    
+    def sweep(self):
+        """Expire old fixes for every user and forget users with no history left"""
+        min_timestamp = time.time() - self.max_age_seconds
+        for user_id in list(self._buffers):
+            buffer = self._buffers[user_id]
+            buffer.drop_before(min_timestamp)
+            if not len(buffer):
+                del self._buffers[user_id]
+        self._records_since_sweep = 0
+
+if __name__ == "__main__":
+    # Late fixes are kept in timestamp order, including after the ring wraps
+    buffer = UserLocationBuffer(max_points=4, initial_capacity=2)
+    for latitude, timestamp in ((1.0, 10.0), (2.0, 20.0), (3.0, 30.0), (0.5, 5.0), (2.5, 25.0), (4.0, 40.0)):
+        buffer.append(latitude, 73.0, timestamp)
+    assert buffer.arrays()[2].tolist() == [20.0, 25.0, 30.0, 40.0], buffer.arrays()
+    assert buffer.arrays()[0].tolist() == [2.0, 2.5, 3.0, 4.0]
+    # Older than everything a full buffer keeps: dropped like an overwritten fix
+    buffer.append(9.0, 73.0, 1.0)
+    assert buffer.arrays()[2].tolist() == [20.0, 25.0, 30.0, 40.0]
+    buffer.drop_before(26.0)
+    assert buffer.arrays()[2].tolist() == [30.0, 40.0]
+    
+    # An out-of-order batch still expires by age and reads back oldest first
+    store = LocationHistoryStore(max_points=100, max_age_seconds=3600)
+    now = time.time()
+    for offset in (-60, -10, -7200, -30, -5000, -1):
+        store.record(LocationPoint(18.52, 73.85, datetime.fromtimestamp(now + offset), "u1"))
+    timestamps = store.history("u1")[2]
+    assert (timestamps - now).round().tolist() == [-60, -30, -10, -1], timestamps - now
+    assert (np.diff(timestamps) >= 0).all()
+    print("Location histories stay in timestamp order with late and backdated fixes")
+    
+    # Each create takes one id number, and a failed save leaves the fence as it was
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        fence_store = FenceStore(GeoFenceValidator(), SqliteFenceBackend(os.path.join(directory, 'fences.db')))
+        for name in ('A', 'B', 'C'):
+            fence_store.add(GeoFenceZone(fence_store.next_id(), 's1', name, 18.52, 73.85, 50, 'c1'))
+        assert [f.id.split('_')[1] for f in fence_store] == ['1', '2', '3'], [f.id for f in fence_store]
+        
+        fence = fence_store.query(session_id='s1')[0]
+        def failing_save(*args, **kwargs):
+            raise sqlite3.OperationalError('disk I/O error')
+        fence_store.backend.save = failing_save
+        try:
+            fence_store.update(fence.id, {'radius_meters': 500, 'session_id': 's2'})
+        except sqlite3.OperationalError:
+            pass
+        assert fence_store.get(fence.id) is fence and fence.radius_meters == 50
+        assert len(fence_store.query(session_id='s1')) == 3 and not fence_store.query(session_id='s2')
+        
+        def failing_delete(fence_id):
+            raise sqlite3.OperationalError('disk I/O error')
+        fence_store.backend.delete = failing_delete
+        try:
+            fence_store.remove(fence.id)
+        except sqlite3.OperationalError:
+            pass
+        assert fence_store.get(fence.id) is fence and fence_store.validator.fence_table.row_of(fence.id) is not None
+    print("Fence ids are consecutive and failed updates and deletes change nothing")
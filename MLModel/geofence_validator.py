@@ -1,15 +1,24 @@
+import sys
 import math
 import json
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
-from datetime import datetime
+import time
+import warnings
+from typing import Dict, Iterable, List, Sequence, Tuple, Optional
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
 import logging
 
+import numpy as np
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Slotted dataclasses need Python 3.10+; older interpreters get plain ones with
+# the same fields, so the package keeps running on 3.8
+DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**DATACLASS_SLOTS)
 class GeoFenceZone:
     """Data class for geo-fence zone"""
     id: str
@@ -22,8 +31,11 @@ class GeoFenceZone:
     batch_id: Optional[str] = None
     is_active: bool = True
     created_date: Optional[str] = None
+    # (latitude, longitude) vertices for polygon fences; latitude, longitude
+    # and radius_meters then describe the polygon's bounding circle
+    polygon: Optional[List[Tuple[float, float]]] = None
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class LocationPoint:
     """Data class for location point"""
     latitude: float
@@ -31,15 +43,798 @@ class LocationPoint:
     timestamp: Optional[datetime] = None
     user_id: Optional[str] = None
 
+@dataclass
+class LocationColumns:
+    """
+    Location fixes as columnar arrays (see location_columns_from_dicts)
+    
+    Only rows that parsed are kept; indices maps each kept row back to its
+    position in the input, and errors lists the rejected rows.
+    """
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    timestamps: np.ndarray  # Epoch seconds, NaN if the row had no timestamp
+    user_ids: List[Optional[str]]
+    indices: np.ndarray
+    errors: List[Dict]  # {'index': input row, 'error': reason}
+    
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+class PreparedPolygon:
+    """
+    Polygon fence projected once to a local planar frame
+    
+    Vertices are mapped to meters east/north of the polygon's bounding box
+    center with an equirectangular projection, which is accurate to well
+    under a centimeter at building scale. The edge arrays and planar
+    bounding box are kept, so contains() tests many points with NumPy
+    crossing-number arithmetic and no trigonometry.
+    """
+    
+    __slots__ = ('center_lat', 'center_lon', 'radius_meters', 'meters_per_deg_lat',
+                 'meters_per_deg_lon', 'x1', 'y1', 'x2', 'y2', 'min_x', 'max_x', 'min_y', 'max_y')
+    
+    # Points tested per chunk are capped so (points x edges) temporaries stay small
+    MAX_CHUNK_PAIRS = 1 << 20
+    
+    def __init__(self, vertices: Sequence[Sequence[float]], earth_radius_km: float = 6371.0):
+        vertices = np.asarray(vertices, dtype=np.float64)
+        if vertices.ndim != 2 or vertices.shape[1] != 2:
+            raise ValueError("Polygon vertices must be (latitude, longitude) pairs")
+        if len(vertices) > 1 and np.array_equal(vertices[0], vertices[-1]):
+            vertices = vertices[:-1]
+        if len(vertices) < 3:
+            raise ValueError("Polygon needs at least 3 distinct vertices")
+        
+        latitudes = vertices[:, 0]
+        # Unwrap longitudes around the first vertex so polygons may cross the antimeridian
+        longitudes = vertices[0, 1] + (vertices[:, 1] - vertices[0, 1] + 180.0) % 360.0 - 180.0
+        self.center_lat = float((latitudes.min() + latitudes.max()) / 2)
+        center_lon = float((longitudes.min() + longitudes.max()) / 2)
+        self.center_lon = (center_lon + 180.0) % 360.0 - 180.0
+        
+        self.meters_per_deg_lat = math.radians(1) * earth_radius_km * 1000
+        self.meters_per_deg_lon = self.meters_per_deg_lat * math.cos(math.radians(self.center_lat))
+        x, y = self._project(latitudes, longitudes)
+        self.x1, self.y1 = x, y
+        self.x2, self.y2 = np.roll(x, -1), np.roll(y, -1)
+        self.min_x, self.max_x = float(x.min()), float(x.max())
+        self.min_y, self.max_y = float(y.min()), float(y.max())
+        
+        # Bounding circle around the center, padded for the planar
+        # approximation, so circle-based indexing never misses the polygon
+        planar = float(np.sqrt(x ** 2 + y ** 2).max())
+        dlat = np.radians(latitudes - self.center_lat)
+        dlon = np.radians(longitudes - center_lon)
+        a = (np.sin(dlat / 2) ** 2 +
+             math.cos(math.radians(self.center_lat)) * np.cos(np.radians(latitudes)) * np.sin(dlon / 2) ** 2)
+        spherical = float((2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))).max()) * earth_radius_km * 1000
+        self.radius_meters = int(math.ceil(max(planar, spherical) * 1.001)) + 1
+    
+    def _project(self, latitudes, longitudes) -> Tuple[np.ndarray, np.ndarray]:
+        dlon = (np.asarray(longitudes, dtype=np.float64) - self.center_lon + 180.0) % 360.0 - 180.0
+        x = dlon * self.meters_per_deg_lon
+        y = (np.asarray(latitudes, dtype=np.float64) - self.center_lat) * self.meters_per_deg_lat
+        return x, y
+    
+    @property
+    def area_m2(self) -> float:
+        """Planar (shoelace) area in square meters"""
+        return float(abs(np.dot(self.x1, self.y2) - np.dot(self.x2, self.y1)) / 2)
+    
+    def contains(self, latitudes, longitudes) -> np.ndarray:
+        """
+        Vectorized point-in-polygon test
+        
+        Args:
+            latitudes, longitudes: Point coordinates in degrees
+        
+        Returns:
+            Boolean array, True for points inside the polygon
+        """
+        x, y = self._project(np.atleast_1d(latitudes), np.atleast_1d(longitudes))
+        inside = np.zeros(len(x), dtype=bool)
+        candidates = np.flatnonzero((x >= self.min_x) & (x <= self.max_x) &
+                                    (y >= self.min_y) & (y <= self.max_y))
+        
+        chunk = max(1, self.MAX_CHUNK_PAIRS // len(self.x1))
+        for start in range(0, len(candidates), chunk):
+            idx = candidates[start:start + chunk]
+            px, py = x[idx, None], y[idx, None]
+            # Count edges that straddle py and cross the ray running east from the point
+            straddles = (self.y1 > py) != (self.y2 > py)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = self.x1 + (py - self.y1) * (self.x2 - self.x1) / (self.y2 - self.y1)
+            crossings = np.count_nonzero(straddles & (px < x_cross), axis=1)
+            inside[idx] = crossings % 2 == 1
+        return inside
+
+def bounding_extent_deg(latitude: float, radius_meters: float,
+                        earth_radius_km: float = 6371.0) -> Tuple[float, Optional[float]]:
+    """
+    Conservative half-extents (in degrees) of one fence's bounding box
+    
+    Returns:
+        (lat_extent, lon_extent); lon_extent is None if the circle
+        reaches a pole and therefore spans every longitude
+    """
+    angular = max(radius_meters, 0) / (earth_radius_km * 1000)
+    lat_extent = math.degrees(angular)
+    cos_lat = math.cos(math.radians(latitude))
+    if math.sin(angular) >= cos_lat or abs(latitude) + lat_extent >= 90:
+        return lat_extent, None
+    # Widest longitude span of a spherical cap
+    lon_extent = math.degrees(math.asin(math.sin(angular) / cos_lat))
+    return lat_extent, lon_extent
+
+def bounding_extents_deg(latitudes, radii, earth_radius_km: float = 6371.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized conservative half-extents (in degrees) of fence bounding boxes
+    
+    Args:
+        latitudes: Fence center latitudes in degrees
+        radii: Fence radii in meters
+        earth_radius_km: Earth's radius in kilometers
+    
+    Returns:
+        (lat_extents, lon_extents); lon_extent is inf where the circle
+        reaches a pole and therefore spans every longitude
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    angular = np.maximum(np.asarray(radii, dtype=np.float64), 0) / (earth_radius_km * 1000)
+    lat_extents = np.degrees(angular)
+    cos_lat = np.cos(np.radians(latitudes))
+    polar = (np.sin(angular) >= cos_lat) | (np.abs(latitudes) + lat_extents >= 90)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Widest longitude span of a spherical cap
+        lon_extents = np.degrees(np.arcsin(np.where(polar, 0, np.sin(angular) / cos_lat)))
+    lon_extents[polar] = np.inf
+    return lat_extents, lon_extents
+
+class FenceGridIndex:
+    """
+    Grid-bucket spatial index over geo-fence bounding circles
+    
+    Each fence is registered under a key (its FenceTable row) in every
+    lat/lon grid cell its bounding box touches, so a point lookup only
+    returns fences whose circles could contain the point. Fences too large
+    for the grid are kept in a small list that is returned for every lookup.
+    """
+    
+    def __init__(self, cell_size_deg: float = 0.01, max_cells_per_fence: int = 4096,
+                 earth_radius_km: float = 6371.0):
+        self.cell_size_deg = cell_size_deg
+        self.max_cells_per_fence = max_cells_per_fence
+        self.earth_radius_km = earth_radius_km
+        self.lon_cells = int(math.ceil(360.0 / cell_size_deg))
+        self._cells: Dict[Tuple[int, int], Dict[int, None]] = {}
+        # Cell range (i_min, i_max, j_min, j_span) per key; None for large fences
+        self._fence_ranges: Dict[int, Optional[Tuple[int, int, int, int]]] = {}
+        self._large_fences: Dict[int, None] = {}
+    
+    def __len__(self) -> int:
+        return len(self._fence_ranges)
+    
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        i = int(math.floor(latitude / self.cell_size_deg))
+        j = int(math.floor((longitude + 180.0) / self.cell_size_deg)) % self.lon_cells
+        return i, j
+    
+    def bounding_extent_deg(self, fence: GeoFenceZone) -> Tuple[float, float]:
+        """
+        Conservative half-extents (in degrees) of a fence's bounding box
+        
+        Returns:
+            (lat_extent, lon_extent); lon_extent is None if the circle
+            reaches a pole and therefore spans every longitude
+        """
+        return bounding_extent_deg(fence.latitude, fence.radius_meters, self.earth_radius_km)
+    
+    def _cell_range(self, latitude: float, longitude: float,
+                    radius_meters: float) -> Optional[Tuple[int, int, int, int]]:
+        lat_extent, lon_extent = bounding_extent_deg(latitude, radius_meters, self.earth_radius_km)
+        if lon_extent is None:
+            return None
+        
+        # Pad by a hair so floating point rounding never drops a boundary cell
+        pad = 1e-9
+        i_min, j_min = self._cell(latitude - lat_extent - pad, longitude - lon_extent - pad)
+        i_max, j_max = self._cell(latitude + lat_extent + pad, longitude + lon_extent + pad)
+        j_span = (j_max - j_min) % self.lon_cells + 1
+        
+        if (i_max - i_min + 1) * j_span > self.max_cells_per_fence:
+            return None
+        return i_min, i_max, j_min, j_span
+    
+    def _range_cells(self, cell_range: Tuple[int, int, int, int]) -> List[Tuple[int, int]]:
+        i_min, i_max, j_min, j_span = cell_range
+        return [(i, (j_min + dj) % self.lon_cells)
+                for i in range(i_min, i_max + 1)
+                for dj in range(j_span)]
+    
+    def add(self, key: int, latitude: float, longitude: float, radius_meters: float):
+        """Register a fence's bounding circle under key, replacing any previous entry for that key"""
+        if key in self._fence_ranges:
+            self.remove(key)
+        
+        cell_range = self._cell_range(latitude, longitude, radius_meters)
+        self._fence_ranges[key] = cell_range
+        if cell_range is None:
+            self._large_fences[key] = None
+            return
+        
+        for cell in self._range_cells(cell_range):
+            self._cells.setdefault(cell, {})[key] = None
+    
+    def bulk_add(self, keys: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray,
+                 radii: np.ndarray):
+        """
+        Register many new keys at once with vectorized cell computation
+        
+        Gives the same cells as add() for each fence; keys must not be
+        indexed yet.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        if len(keys) == 0:
+            return
+        
+        lat_extent, lon_extent = bounding_extents_deg(latitudes, radii, self.earth_radius_km)
+        large = np.isinf(lon_extent)
+        lon_extent[large] = 0
+        
+        pad = 1e-9
+        i_min = np.floor((latitudes - lat_extent - pad) / self.cell_size_deg).astype(np.int64)
+        i_max = np.floor((latitudes + lat_extent + pad) / self.cell_size_deg).astype(np.int64)
+        j_min = np.floor((longitudes - lon_extent - pad + 180.0) / self.cell_size_deg).astype(np.int64) % self.lon_cells
+        j_max = np.floor((longitudes + lon_extent + pad + 180.0) / self.cell_size_deg).astype(np.int64) % self.lon_cells
+        j_span = (j_max - j_min) % self.lon_cells + 1
+        cell_counts = (i_max - i_min + 1) * j_span
+        large |= cell_counts > self.max_cells_per_fence
+        
+        for key in keys[large].tolist():
+            self._fence_ranges[key] = None
+            self._large_fences[key] = None
+        
+        small = ~large
+        keys, i_min, i_max, j_min, j_span, cell_counts = (
+            keys[small], i_min[small], i_max[small], j_min[small], j_span[small], cell_counts[small])
+        self._fence_ranges.update(zip(keys.tolist(), zip(i_min.tolist(), i_max.tolist(),
+                                                         j_min.tolist(), j_span.tolist())))
+        
+        # Expand every fence into its (cell, key) pairs and group them by cell
+        owner = np.repeat(np.arange(len(keys)), cell_counts)
+        offsets = np.arange(len(owner)) - np.repeat(np.cumsum(cell_counts) - cell_counts, cell_counts)
+        cell_i = i_min[owner] + offsets // j_span[owner]
+        cell_j = (j_min[owner] + offsets % j_span[owner]) % self.lon_cells
+        order = np.lexsort((keys[owner], cell_j, cell_i))
+        cell_i, cell_j, pair_keys = cell_i[order], cell_j[order], keys[owner][order]
+        boundaries = np.flatnonzero((np.diff(cell_i) != 0) | (np.diff(cell_j) != 0)) + 1
+        starts = np.concatenate(([0], boundaries)).tolist()
+        ends = boundaries.tolist() + [len(pair_keys)]
+        pair_keys = pair_keys.tolist()
+        cell_i = cell_i.tolist()
+        cell_j = cell_j.tolist()
+        for start, end in zip(starts, ends):
+            bucket = self._cells.setdefault((cell_i[start], cell_j[start]), {})
+            bucket.update(dict.fromkeys(pair_keys[start:end]))
+    
+    def remove(self, key: int) -> bool:
+        """Unregister a key; returns False if it was not indexed"""
+        if key not in self._fence_ranges:
+            return False
+        
+        cell_range = self._fence_ranges.pop(key)
+        if cell_range is None:
+            self._large_fences.pop(key, None)
+            return True
+        
+        for cell in self._range_cells(cell_range):
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._cells[cell]
+        return True
+    
+    def query(self, latitude: float, longitude: float) -> List[int]:
+        """Return keys of fences whose bounding boxes contain the point"""
+        candidates = list(self._cells.get(self._cell(latitude, longitude), ()))
+        candidates.extend(self._large_fences)
+        return candidates
+
+class FenceTable:
+    """
+    Struct-of-arrays storage for geo-fences
+    
+    Every fence occupies one row of contiguous arrays: id, latitude and
+    longitude in radians and degrees, cos(latitude), radius, bounding box
+    half-extents in degrees, active flag and integer session and college
+    codes.
+    The radian and cosine columns are the per-fence trigonometric cache:
+    add recomputes them whenever a fence is refreshed (update_fence, which
+    FenceStore.update calls), so they never go stale.
+    Validation gathers candidate rows with NumPy indexing
+    instead of reading attributes off per-fence objects; the GeoFenceZone
+    records are kept only for the API surface. Rows of removed fences are
+    reused.
+    
+    Polygon fences are stored by their bounding circle, flagged in
+    is_polygon, and keep a PreparedPolygon in polygons for the exact test.
+    """
+    
+    def __init__(self, initial_capacity: int = 64, earth_radius_km: float = 6371.0):
+        self.earth_radius_km = earth_radius_km
+        self.fences: List[Optional[GeoFenceZone]] = [None] * initial_capacity
+        self.ids = np.empty(initial_capacity, dtype=object)
+        self.latitudes_rad = np.zeros(initial_capacity, dtype=np.float64)
+        self.longitudes_rad = np.zeros(initial_capacity, dtype=np.float64)
+        self.cos_latitudes = np.zeros(initial_capacity, dtype=np.float64)
+        self.latitudes_deg = np.zeros(initial_capacity, dtype=np.float64)
+        self.longitudes_deg = np.zeros(initial_capacity, dtype=np.float64)
+        self.radii = np.zeros(initial_capacity, dtype=np.float64)
+        self.lat_extents_deg = np.zeros(initial_capacity, dtype=np.float64)
+        self.lon_extents_deg = np.zeros(initial_capacity, dtype=np.float64)
+        self.active = np.zeros(initial_capacity, dtype=bool)
+        self.is_polygon = np.zeros(initial_capacity, dtype=bool)
+        self.session_codes = np.full(initial_capacity, -1, dtype=np.int64)
+        self.college_codes = np.full(initial_capacity, -1, dtype=np.int64)
+        self.polygons: Dict[int, PreparedPolygon] = {}
+        self._encoded: Dict[int, bytes] = {}
+        self._rows: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        self._used_rows = 0
+        self._session_code_map: Dict[str, int] = {}
+        self._college_code_map: Dict[str, int] = {}
+    
+    _ARRAYS = ('ids', 'latitudes_rad', 'longitudes_rad', 'cos_latitudes', 'latitudes_deg', 'longitudes_deg',
+               'radii', 'lat_extents_deg', 'lon_extents_deg', 'active', 'is_polygon', 'session_codes',
+               'college_codes')
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    @property
+    def capacity(self) -> int:
+        return len(self.fences)
+    
+    def row_of(self, fence_id: str) -> Optional[int]:
+        """Return the row holding a fence id, or None"""
+        return self._rows.get(fence_id)
+    
+    def fence_json(self, row: int) -> bytes:
+        """
+        JSON encoding of a row's fence, built on first use and cached
+        
+        API responses embed these bytes instead of converting the fence
+        dataclass field by field; the cache entry is dropped whenever the
+        row is refreshed or freed.
+        """
+        encoded = self._encoded.get(row)
+        if encoded is None:
+            encoded = self._encoded[row] = json.dumps(
+                asdict(self.fences[row]), sort_keys=True, separators=(',', ':')).encode()
+        return encoded
+    
+    def session_code(self, session_id: str) -> int:
+        """Integer code of a session id, or -1 if no fence ever used it"""
+        return self._session_code_map.get(session_id, -1)
+    
+    def college_code(self, college_name: str) -> int:
+        """Integer code of a college name, or -1 if no fence ever used it"""
+        return self._college_code_map.get(college_name, -1)
+    
+    def _grow(self):
+        capacity = self.capacity * 2
+        self.fences.extend([None] * (capacity - self.capacity))
+        for name in self._ARRAYS:
+            old = getattr(self, name)
+            grown = np.empty(capacity, dtype=old.dtype) if old.dtype == object else np.zeros(capacity, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+        self.session_codes[self._used_rows:] = -1
+        self.college_codes[self._used_rows:] = -1
+    
+    def add(self, fence: GeoFenceZone) -> int:
+        """Store a fence (or refresh it if its id is present); returns its row"""
+        row = self._rows.get(fence.id)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                if self._used_rows == self.capacity:
+                    self._grow()
+                row = self._used_rows
+                self._used_rows += 1
+            self._rows[fence.id] = row
+        
+        session_code = self._session_code_map.setdefault(fence.session_id, len(self._session_code_map))
+        college_code = self._college_code_map.setdefault(fence.college_name, len(self._college_code_map))
+        self._encoded.pop(row, None)
+        latitude, longitude, radius = fence.latitude, fence.longitude, fence.radius_meters
+        if fence.polygon is not None:
+            prepared = self.polygons[row] = PreparedPolygon(fence.polygon, self.earth_radius_km)
+            latitude, longitude, radius = prepared.center_lat, prepared.center_lon, prepared.radius_meters
+        else:
+            self.polygons.pop(row, None)
+        
+        latitude_rad = math.radians(latitude)
+        self.fences[row] = fence
+        self.ids[row] = fence.id
+        self.latitudes_rad[row] = latitude_rad
+        self.longitudes_rad[row] = math.radians(longitude)
+        self.cos_latitudes[row] = math.cos(latitude_rad)
+        self.latitudes_deg[row] = latitude
+        self.longitudes_deg[row] = longitude
+        self.radii[row] = radius
+        self.is_polygon[row] = fence.polygon is not None
+        lat_extent, lon_extent = bounding_extent_deg(latitude, radius, self.earth_radius_km)
+        self.lat_extents_deg[row] = lat_extent
+        self.lon_extents_deg[row] = math.inf if lon_extent is None else lon_extent
+        self.active[row] = bool(fence.is_active)
+        self.session_codes[row] = session_code
+        self.college_codes[row] = college_code
+        return row
+    
+    def bulk_add(self, fences: List[GeoFenceZone], latitudes=None, longitudes=None,
+                 radii=None) -> np.ndarray:
+        """
+        Store many new fences at once; returns their rows
+        
+        Coordinate and radius columns may be passed in (e.g. straight from a
+        snapshot) to avoid reading them off the fence objects.
+        """
+        count = len(fences)
+        if latitudes is None:
+            latitudes = np.fromiter((f.latitude for f in fences), np.float64, count)
+        if longitudes is None:
+            longitudes = np.fromiter((f.longitude for f in fences), np.float64, count)
+        if radii is None:
+            radii = np.fromiter((f.radius_meters for f in fences), np.float64, count)
+        
+        if any(fence.id in self._rows for fence in fences):
+            raise ValueError("bulk_add only accepts fences that are not stored yet")
+        
+        while self._used_rows + count > self.capacity:
+            self._grow()
+        rows = np.arange(self._used_rows, self._used_rows + count)
+        self._used_rows += count
+        
+        code_map = self._session_code_map
+        session_codes = [code_map.setdefault(f.session_id, len(code_map)) for f in fences]
+        code_map = self._college_code_map
+        college_codes = [code_map.setdefault(f.college_name, len(code_map)) for f in fences]
+        latitudes = np.array(latitudes, dtype=np.float64)
+        longitudes = np.array(longitudes, dtype=np.float64)
+        radii = np.array(radii, dtype=np.float64)
+        is_polygon = np.fromiter((f.polygon is not None for f in fences), bool, count)
+        for i in np.flatnonzero(is_polygon).tolist():
+            prepared = self.polygons[int(rows[i])] = PreparedPolygon(fences[i].polygon, self.earth_radius_km)
+            latitudes[i], longitudes[i], radii[i] = prepared.center_lat, prepared.center_lon, prepared.radius_meters
+        latitudes_rad = np.radians(latitudes)
+        
+        self.fences[rows[0]:rows[0] + count] = fences
+        self.ids[rows] = [fence.id for fence in fences]
+        self.latitudes_rad[rows] = latitudes_rad
+        self.longitudes_rad[rows] = np.radians(longitudes)
+        self.cos_latitudes[rows] = np.cos(latitudes_rad)
+        self.latitudes_deg[rows] = latitudes
+        self.longitudes_deg[rows] = longitudes
+        self.radii[rows] = radii
+        self.lat_extents_deg[rows], self.lon_extents_deg[rows] = bounding_extents_deg(
+            latitudes, radii, self.earth_radius_km)
+        self.active[rows] = np.fromiter((bool(f.is_active) for f in fences), bool, count)
+        self.is_polygon[rows] = is_polygon
+        self.session_codes[rows] = session_codes
+        self.college_codes[rows] = college_codes
+        self._rows.update(zip((fence.id for fence in fences), rows.tolist()))
+        return rows
+    
+    def remove(self, fence_id: str) -> Optional[GeoFenceZone]:
+        """Free a fence's row; returns the fence, or None if it is not stored"""
+        row = self._rows.pop(fence_id, None)
+        if row is None:
+            return None
+        
+        fence = self.fences[row]
+        self.fences[row] = None
+        self.ids[row] = None
+        self.active[row] = False
+        self.is_polygon[row] = False
+        self.polygons.pop(row, None)
+        self._encoded.pop(row, None)
+        self.session_codes[row] = -1
+        self.college_codes[row] = -1
+        self._free_rows.append(row)
+        return fence
+
+class DistanceHistogramSketch:
+    """
+    Mergeable streaming sketch of distances from a fence center
+    
+    Distances are counted in fixed-width bins from 0 to max_distance plus one
+    overflow bin, so memory is constant no matter how many points are added,
+    and sketches built on separate shards merge by adding counts. A quantile
+    read from the sketch is the lower edge of the bin holding it: the true
+    value lies in [quantile, quantile + bin_width). With 1 m bins aligned at
+    whole meters this is exact for integer radius results.
+    """
+    
+    def __init__(self, center_lat: float, center_lon: float,
+                 bin_width: float = 1.0, max_distance: float = 500.0):
+        self.center_lat = float(center_lat)
+        self.center_lon = float(center_lon)
+        self.bin_width = float(bin_width)
+        self.max_distance = float(max_distance)
+        self.bin_count = int(math.ceil(self.max_distance / self.bin_width))
+        # Last slot counts distances at or beyond max_distance
+        self.counts = np.zeros(self.bin_count + 1, dtype=np.int64)
+    
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+    
+    def add_distances(self, distances):
+        """Count a batch of distances (meters)"""
+        distances = np.asarray(distances, dtype=np.float64)
+        bins = np.minimum(np.floor(np.maximum(distances, 0) / self.bin_width), self.bin_count)
+        self.counts += np.bincount(bins.astype(np.int64), minlength=self.bin_count + 1)
+    
+    def merge(self, other: 'DistanceHistogramSketch') -> 'DistanceHistogramSketch':
+        """Add another sketch's counts into this one; returns self"""
+        if ((other.center_lat, other.center_lon, other.bin_width, other.bin_count) !=
+                (self.center_lat, self.center_lon, self.bin_width, self.bin_count)):
+            raise ValueError("Sketches must share center, bin width and max distance")
+        self.counts += other.counts
+        return self
+    
+    def order_statistic(self, index: int) -> float:
+        """Lower bin edge of the index-th smallest distance (0-based)"""
+        cumulative = np.cumsum(self.counts)
+        bin_index = int(np.searchsorted(cumulative, index, side='right'))
+        return min(bin_index, self.bin_count) * self.bin_width
+    
+    def to_dict(self) -> Dict:
+        """Serialize to a JSON-friendly dict with only non-empty bins"""
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            'center_lat': self.center_lat,
+            'center_lon': self.center_lon,
+            'bin_width': self.bin_width,
+            'max_distance': self.max_distance,
+            'bins': {str(int(i)): int(self.counts[i]) for i in nonzero}
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'DistanceHistogramSketch':
+        """Rebuild a sketch serialized with to_dict"""
+        sketch = cls(data['center_lat'], data['center_lon'],
+                     data.get('bin_width', 1.0), data.get('max_distance', 500.0))
+        for bin_index, bin_count in data.get('bins', {}).items():
+            bin_index = int(bin_index)
+            if not 0 <= bin_index <= sketch.bin_count:
+                raise ValueError(f"Sketch bin out of range: {bin_index}")
+            sketch.counts[bin_index] += int(bin_count)
+        return sketch
+
 class GeoFenceValidator:
     """
     ML-powered Geo-fencing validator for attendance systems
     """
     
+    # Maximum difference (meters) between haversine_distance_batch and the
+    # scalar haversine_distance for the same pair of points
+    BATCH_DISTANCE_TOLERANCE_METERS = 1e-6
+    
+    # Padding (degrees) of the bounding box prefilter, far above float
+    # rounding so no point inside a fence is ever rejected
+    BOUNDING_BOX_PAD_DEG = 1e-9
+    
     def __init__(self):
         self.earth_radius_km = 6371.0  # Earth's radius in kilometers
         self.accuracy_threshold_meters = 10  # GPS accuracy threshold
+        self.speed_anomaly_threshold_mps = 30  # Faster movement is flagged as anomalous
+        self.default_fence_radius_meters = 50
+        self.min_fence_radius_meters = 30
+        self.max_fence_radius_meters = 500
+        self.fence_table = FenceTable(earth_radius_km=self.earth_radius_km)
+        self.fence_index = FenceGridIndex(earth_radius_km=self.earth_radius_km)
+    
+    def add_fence(self, fence: GeoFenceZone):
+        """Store a fence in the fence table and spatial index"""
+        table = self.fence_table
+        row = table.add(fence)
+        self.fence_index.add(row, table.latitudes_deg[row], table.longitudes_deg[row], table.radii[row])
+    
+    def load_fences(self, fences: List[GeoFenceZone], latitudes=None, longitudes=None, radii=None):
+        """
+        Bulk-load new fences into the fence table and spatial index
+        
+        Much faster than calling add_fence per fence when restoring a store;
+        optional columns are passed through to FenceTable.bulk_add.
+        """
+        if not fences:
+            return
+        count = len(fences)
+        if latitudes is None:
+            latitudes = np.fromiter((f.latitude for f in fences), np.float64, count)
+        if longitudes is None:
+            longitudes = np.fromiter((f.longitude for f in fences), np.float64, count)
+        if radii is None:
+            radii = np.fromiter((f.radius_meters for f in fences), np.float64, count)
+        
+        table = self.fence_table
+        rows = table.bulk_add(fences, latitudes, longitudes, radii)
+        # Index the table's columns, which hold bounding circles for polygon fences
+        self.fence_index.bulk_add(rows, table.latitudes_deg[rows], table.longitudes_deg[rows], table.radii[rows])
+    
+    def update_fence(self, fence: GeoFenceZone):
+        """Refresh a fence's table row and index cells after it changed"""
+        self.add_fence(fence)
+    
+    def remove_fence(self, fence_id: str) -> Optional[GeoFenceZone]:
+        """Remove a fence from the fence table and spatial index"""
+        row = self.fence_table.row_of(fence_id)
+        if row is None:
+            return None
+        self.fence_index.remove(row)
+        return self.fence_table.remove(fence_id)
+    
+    def fence_row(self, fence: GeoFenceZone) -> Optional[Tuple[FenceTable, int]]:
+        """
+        Fence table and row holding this very fence object
         
+        Returns:
+            (fence_table, row), or None if the fence is not stored or the
+            table holds a different object with its id
+        """
+        table = self.fence_table
+        row = table.row_of(fence.id)
+        if row is None or table.fences[row] is not fence:
+            return None
+        return table, row
+    
+    def candidate_rows(self, point: LocationPoint, session_id: Optional[str] = None,
+                       college_name: Optional[str] = None) -> np.ndarray:
+        """
+        Fence table rows whose bounding circles could contain the point
+        
+        Args:
+            point: Location point to look up
+            session_id: Only return fences of this session (optional)
+            college_name: Only return fences of this college (optional)
+        
+        Returns:
+            Array of row numbers into fence_table
+        """
+        rows = np.asarray(self.fence_index.query(point.latitude, point.longitude), dtype=np.int64)
+        if session_id is not None:
+            rows = rows[self.fence_table.session_codes[rows] == self.fence_table.session_code(session_id)]
+        if college_name is not None:
+            rows = rows[self.fence_table.college_codes[rows] == self.fence_table.college_code(college_name)]
+        return rows
+    
+    def candidate_fences(self, point: LocationPoint, session_id: Optional[str] = None,
+                         college_name: Optional[str] = None) -> List[GeoFenceZone]:
+        """
+        Indexed fences whose bounding circles could contain the point
+        
+        Args:
+            point: Location point to look up
+            session_id: Only return fences of this session (optional)
+            college_name: Only return fences of this college (optional)
+        
+        Returns:
+            List of candidate geo-fence zones
+        """
+        fences = self.fence_table.fences
+        return [fences[row] for row in self.candidate_rows(point, session_id, college_name)]
+    
+    def fences_containing(self, points: List[LocationPoint],
+                          college_names: Optional[List[Optional[str]]] = None) -> List[List[GeoFenceZone]]:
+        """
+        Active indexed fences that contain each point, in any session
+        
+        Candidate pairs of all points go through the bounding box prefilter
+        and one vectorized haversine call, as in validate_points_batch.
+        
+        Args:
+            points: Location points to look up
+            college_names: Per-point college filter, aligned with points (optional)
+        
+        Returns:
+            One list of geo-fence zones per point, in input order
+            (zero-radius fences never match)
+        """
+        table = self.fence_table
+        candidate_rows = []
+        for idx, point in enumerate(points):
+            rows = self.candidate_rows(point, college_name=college_names[idx] if college_names else None)
+            candidate_rows.append(rows[table.active[rows]])
+        containing: List[List[GeoFenceZone]] = [[] for _ in points]
+        pair_rows = np.concatenate(candidate_rows) if candidate_rows else np.empty(0, dtype=np.int64)
+        if not len(pair_rows):
+            return containing
+        
+        pair_idx = np.repeat(np.arange(len(points)), [len(rows) for rows in candidate_rows])
+        latitudes = np.fromiter((p.latitude for p in points), np.float64, len(points))[pair_idx]
+        longitudes = np.fromiter((p.longitude for p in points), np.float64, len(points))[pair_idx]
+        survivors = self.within_bounding_boxes(latitudes, longitudes, pair_rows)
+        pair_idx, pair_rows = pair_idx[survivors], pair_rows[survivors]
+        latitudes, longitudes = latitudes[survivors], longitudes[survivors]
+        latitudes_rad = np.radians(latitudes)
+        distances = self._haversine_radians(
+            latitudes_rad, np.radians(longitudes), np.cos(latitudes_rad),
+            table.latitudes_rad[pair_rows], table.longitudes_rad[pair_rows], table.cos_latitudes[pair_rows]
+        )
+        within = self._pairs_within(latitudes, longitudes, pair_rows, distances) & (table.radii[pair_rows] != 0)
+        for idx, row in zip(pair_idx[within].tolist(), pair_rows[within].tolist()):
+            containing[idx].append(table.fences[row])
+        return containing
+    
+    def validate_point(self, point: LocationPoint, session_id: Optional[str] = None,
+                       compact: bool = False, college_name: Optional[str] = None) -> Dict:
+        """
+        Validate a location point against the indexed geo-fences
+        
+        Only fences returned by the spatial index are checked, so
+        total_fences_checked counts candidates rather than every fence.
+        Distances are computed straight from the fence table's arrays.
+        
+        Args:
+            point: Location point to check
+            session_id: Only consider fences of this session (optional)
+            compact: Return only the yes/no answer and the best match's id,
+                distance and score (see compact_result); fences outside their
+                bounding boxes are then skipped without computing distances
+            college_name: Only consider fences of this college (optional)
+        
+        Returns:
+            Dictionary with comprehensive validation results
+        """
+        table = self.fence_table
+        rows = self.candidate_rows(point, session_id, college_name)
+        rows = rows[table.active[rows]]
+        if compact:
+            rows = rows[self.within_bounding_boxes(point.latitude, point.longitude, rows)]
+        
+        latitude_rad = math.radians(point.latitude)
+        distances = self._haversine_radians(
+            latitude_rad, math.radians(point.longitude), math.cos(latitude_rad),
+            table.latitudes_rad[rows], table.longitudes_rad[rows], table.cos_latitudes[rows]
+        )
+        within = self._pairs_within(point.latitude, point.longitude, rows, distances)
+        if compact:
+            radii = table.radii[rows]
+            # Zero-radius fences are validation errors and never match
+            within &= radii != 0
+            if not within.any():
+                return self.compact_result(None)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = np.where(within, np.maximum(0, 1 - distances / radii), -1.0)
+            # First candidate wins ties, as in the full result
+            best = int(np.argmax(scores))
+            return self.compact_result(table.ids[rows[best]], distances[best], scores[best])
+        
+        fences = [table.fences[row] for row in rows]
+        return self._build_validation_result(point, fences, distances, table.radii[rows], within)
+    
+    @staticmethod
+    def compact_result(fence_id: Optional[str], distance_meters: Optional[float] = None,
+                       accuracy_score: Optional[float] = None) -> Dict:
+        """
+        Compact validation result: whether the point is inside any fence,
+        plus the best match's fence id, distance and accuracy score
+        """
+        return {
+            'is_within_any_fence': fence_id is not None,
+            'fence_id': fence_id,
+            'distance_meters': None if distance_meters is None else float(distance_meters),
+            'accuracy_score': None if accuracy_score is None else float(accuracy_score)
+        }
+    
     def haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """
         Calculate the great circle distance between two points on earth using Haversine formula
@@ -47,7 +842,7 @@ class GeoFenceValidator:
         Args:
             lat1, lon1: Latitude and longitude of first point
             lat2, lon2: Latitude and longitude of second point
-            
+        
         Returns:
             Distance in meters
         """
@@ -72,6 +867,60 @@ class GeoFenceValidator:
         
         return distance_meters
     
+    def haversine_distance_batch(self, lat1, lon1, lat2, lon2) -> np.ndarray:
+        """
+        Vectorized Haversine distance; arguments broadcast like NumPy arrays
+        
+        Uses the same formula as haversine_distance, so results agree with the
+        scalar path to within BATCH_DISTANCE_TOLERANCE_METERS.
+        
+        Args:
+            lat1, lon1: Latitude and longitude of first point(s) in degrees
+            lat2, lon2: Latitude and longitude of second point(s) in degrees
+        
+        Returns:
+            Array of distances in meters
+        """
+        lat1_rad = np.radians(np.asarray(lat1, dtype=np.float64))
+        lon1_rad = np.radians(np.asarray(lon1, dtype=np.float64))
+        lat2_rad = np.radians(np.asarray(lat2, dtype=np.float64))
+        lon2_rad = np.radians(np.asarray(lon2, dtype=np.float64))
+        
+        return self._haversine_radians(lat1_rad, lon1_rad, np.cos(lat1_rad),
+                                       lat2_rad, lon2_rad, np.cos(lat2_rad))
+    
+    def _haversine_radians(self, lat1_rad, lon1_rad, cos_lat1, lat2_rad, lon2_rad, cos_lat2) -> np.ndarray:
+        """Vectorized Haversine distance (meters) from radians and precomputed cosines"""
+        dlat = lat2_rad - lat1_rad
+        dlon = lon2_rad - lon1_rad
+        
+        a = (np.sin(dlat / 2) ** 2 +
+             cos_lat1 * cos_lat2 * np.sin(dlon / 2) ** 2)
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        
+        return self.earth_radius_km * c * 1000
+    
+    def _pairs_within(self, latitudes, longitudes, rows: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        """
+        In-fence flags for (point, fence table row) pairs
+        
+        Circles compare the haversine distance with the radius; polygon rows
+        run the prepared point-in-polygon test, one vectorized call per
+        polygon over all of its points.
+        """
+        table = self.fence_table
+        within = distances <= table.radii[rows]
+        polygon_pairs = np.flatnonzero(table.is_polygon[rows])
+        if len(polygon_pairs):
+            latitudes = np.broadcast_to(np.asarray(latitudes, dtype=np.float64), rows.shape)
+            longitudes = np.broadcast_to(np.asarray(longitudes, dtype=np.float64), rows.shape)
+            polygon_pairs = polygon_pairs[np.argsort(rows[polygon_pairs], kind='stable')]
+            boundaries = np.flatnonzero(np.diff(rows[polygon_pairs])) + 1
+            for group in np.split(polygon_pairs, boundaries):
+                polygon = table.polygons[int(rows[group[0]])]
+                within[group] = polygon.contains(latitudes[group], longitudes[group])
+        return within
+    
     def is_point_in_fence(self, point: LocationPoint, fence: GeoFenceZone) -> Dict:
         """
         Check if a location point is within a geo-fence zone
@@ -79,17 +928,26 @@ class GeoFenceValidator:
         Args:
             point: Location point to check
             fence: Geo-fence zone
-            
+        
         Returns:
             Dictionary with validation results
         """
         try:
+            center_lat, center_lon, radius = fence.latitude, fence.longitude, fence.radius_meters
+            polygon = None
+            if fence.polygon is not None:
+                polygon = PreparedPolygon(fence.polygon, self.earth_radius_km)
+                center_lat, center_lon, radius = polygon.center_lat, polygon.center_lon, polygon.radius_meters
+            
             distance = self.haversine_distance(
                 point.latitude, point.longitude,
-                fence.latitude, fence.longitude
+                center_lat, center_lon
             )
             
-            is_within = distance <= fence.radius_meters
+            if polygon is not None:
+                is_within = bool(polygon.contains(point.latitude, point.longitude)[0])
+            else:
+                is_within = distance <= radius
             
             return {
                 'is_within_fence': is_within,
@@ -97,10 +955,10 @@ class GeoFenceValidator:
                 'fence_radius': fence.radius_meters,
                 'fence_id': fence.id,
                 'location_name': fence.location_name,
-                'accuracy_score': max(0, 1 - (distance / fence.radius_meters)),
+                'accuracy_score': max(0, 1 - (distance / radius)),
                 'validation_timestamp': datetime.now().isoformat()
             }
-            
+        
         except Exception as e:
             logger.error(f"Error validating geo-fence: {str(e)}")
             return {
@@ -116,18 +974,59 @@ class GeoFenceValidator:
         Args:
             point: Location point to check
             fences: List of geo-fence zones
-            
+        
         Returns:
             Dictionary with comprehensive validation results
         """
+        active_fences = [fence for fence in fences if fence.is_active]
+        
+        # One vectorized haversine call for all fence centers
+        fence_lats = np.fromiter((f.latitude for f in active_fences), np.float64, len(active_fences))
+        fence_lons = np.fromiter((f.longitude for f in active_fences), np.float64, len(active_fences))
+        radii = np.fromiter((f.radius_meters for f in active_fences), np.float64, len(active_fences))
+        polygons = {i: PreparedPolygon(fence.polygon, self.earth_radius_km)
+                    for i, fence in enumerate(active_fences) if fence.polygon is not None}
+        for i, polygon in polygons.items():
+            fence_lats[i], fence_lons[i], radii[i] = polygon.center_lat, polygon.center_lon, polygon.radius_meters
+        # Point terms once per request, broadcast against every fence
+        point_lat_rad = math.radians(point.latitude)
+        fence_lats_rad = np.radians(fence_lats)
+        distances = self._haversine_radians(point_lat_rad, math.radians(point.longitude), math.cos(point_lat_rad),
+                                            fence_lats_rad, np.radians(fence_lons), np.cos(fence_lats_rad))
+        
+        within = distances <= radii
+        for i, polygon in polygons.items():
+            within[i] = polygon.contains(point.latitude, point.longitude)[0]
+        
+        return self._build_validation_result(point, active_fences, distances, radii, within)
+    
+    def _build_validation_result(self, point: LocationPoint, fences: List[GeoFenceZone],
+                                 distances: np.ndarray, radii: np.ndarray,
+                                 within: Optional[np.ndarray] = None) -> Dict:
+        """Assemble the validate_multiple_fences result from precomputed distances"""
+        validation_timestamp = datetime.now().isoformat()
         results = []
         valid_fences = []
         
-        for fence in fences:
-            if not fence.is_active:
-                continue
-                
-            result = self.is_point_in_fence(point, fence)
+        if within is None:
+            within = distances <= radii
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.maximum(0, 1 - distances / radii)
+        
+        for i, fence in enumerate(fences):
+            if radii[i] == 0:
+                # Zero radius is an error case; keep the scalar path's error result
+                result = self.is_point_in_fence(point, fence)
+            else:
+                result = {
+                    'is_within_fence': bool(within[i]),
+                    'distance_meters': float(distances[i]),
+                    'fence_radius': fence.radius_meters,
+                    'fence_id': fence.id,
+                    'location_name': fence.location_name,
+                    'accuracy_score': float(scores[i]),
+                    'validation_timestamp': validation_timestamp
+                }
             result['fence'] = fence
             results.append(result)
             
@@ -148,55 +1047,263 @@ class GeoFenceValidator:
             'is_within_any_fence': len(valid_fences) > 0,
             'best_match': valid_fences[0] if valid_fences else None,
             'all_results': results,
-            'validation_timestamp': datetime.now().isoformat()
+            'validation_timestamp': validation_timestamp
         }
     
-    def get_fence_coverage_area(self, fence: GeoFenceZone) -> float:
+    def validate_points_batch(self, points: List[LocationPoint],
+                              session_ids: Optional[List[Optional[str]]] = None,
+                              compact: bool = False,
+                              college_names: Optional[List[Optional[str]]] = None) -> List[Dict]:
         """
-        Calculate the approximate coverage area of a circular geo-fence
+        Validate many location points against the indexed geo-fences
+        
+        Candidate (point, fence) pairs for the whole batch are gathered from
+        the spatial index and measured with a single vectorized haversine
+        call over the fence table's arrays. Pairs that fail the bounding box
+        prefilter (within_bounding_boxes) are rejected before the haversine
+        runs. Per-fence details are omitted; each result carries the summary
+        fields of validate_multiple_fences and the best match.
         
         Args:
-            fence: Geo-fence zone
+            points: Location points to check
+            session_ids: Per-point session filter, aligned with points (optional)
+            compact: Return compact_result dicts instead of summaries
+            college_names: Per-point college filter, aligned with points (optional)
+        
+        Returns:
+            List of validation summaries, one per point, in input order
+        """
+        table = self.fence_table
+        candidate_rows = []
+        for idx, point in enumerate(points):
+            rows = self.candidate_rows(point, session_ids[idx] if session_ids else None,
+                                       college_names[idx] if college_names else None)
+            candidate_rows.append(rows[table.active[rows]])
+        
+        validation_timestamp = datetime.now().isoformat()
+        checked = np.zeros(len(points), dtype=np.int64)
+        valid_counts = np.zeros(len(points), dtype=np.int64)
+        best_matches: List[Optional[Dict]] = [None] * len(points)
+        
+        pair_rows = np.concatenate(candidate_rows) if candidate_rows else np.empty(0, dtype=np.int64)
+        if len(pair_rows):
+            pair_idx = np.repeat(np.arange(len(points)), [len(rows) for rows in candidate_rows])
+            point_lats_deg = np.fromiter((p.latitude for p in points), np.float64, len(points))
+            point_lons_deg = np.fromiter((p.longitude for p in points), np.float64, len(points))
+            checked = np.bincount(pair_idx, minlength=len(points))
+            
+            # Exact haversine only for pairs inside the fence bounding box
+            survivors = self.within_bounding_boxes(point_lats_deg[pair_idx], point_lons_deg[pair_idx], pair_rows)
+            pair_idx, pair_rows = pair_idx[survivors], pair_rows[survivors]
+            point_lats = np.radians(point_lats_deg)
+            point_lons = np.radians(point_lons_deg)
+            radii = table.radii[pair_rows]
             
+            distances = self._haversine_radians(
+                point_lats[pair_idx], point_lons[pair_idx], np.cos(point_lats)[pair_idx],
+                table.latitudes_rad[pair_rows], table.longitudes_rad[pair_rows],
+                table.cos_latitudes[pair_rows]
+            )
+            # Zero-radius fences are validation errors and never match
+            within = self._pairs_within(point_lats_deg[pair_idx], point_lons_deg[pair_idx],
+                                        pair_rows, distances) & (radii != 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = np.maximum(0, 1 - distances / radii)
+            
+            valid_counts = np.bincount(pair_idx[within], minlength=len(points))
+            
+            # Best match per point: highest score, first candidate on ties
+            for k in np.flatnonzero(within):
+                idx = pair_idx[k]
+                best = best_matches[idx]
+                if best is None or scores[k] > best['accuracy_score']:
+                    fence = table.fences[pair_rows[k]]
+                    best_matches[idx] = {
+                        'is_within_fence': True,
+                        'distance_meters': float(distances[k]),
+                        'fence_radius': fence.radius_meters,
+                        'fence_id': fence.id,
+                        'location_name': fence.location_name,
+                        'accuracy_score': float(scores[k]),
+                        'validation_timestamp': validation_timestamp
+                    }
+        
+        if compact:
+            return [
+                self.compact_result(best['fence_id'], best['distance_meters'], best['accuracy_score'])
+                if best is not None else self.compact_result(None)
+                for best in best_matches
+            ]
+        
+        return [
+            {
+                'point': {
+                    'latitude': point.latitude,
+                    'longitude': point.longitude,
+                    'timestamp': point.timestamp.isoformat() if point.timestamp else None
+                },
+                'total_fences_checked': int(checked[idx]),
+                'valid_fences_count': int(valid_counts[idx]),
+                'is_within_any_fence': best_matches[idx] is not None,
+                'best_match': best_matches[idx],
+                'validation_timestamp': validation_timestamp
+            }
+            for idx, point in enumerate(points)
+        ]
+    
+    def within_bounding_boxes(self, latitudes, longitudes, rows: np.ndarray) -> np.ndarray:
+        """
+        Cheap first stage of the fence check over fence table rows
+        
+        Compares coordinate differences against each fence's precomputed
+        bounding box half-extents, with no trigonometry. A point inside a
+        fence always passes; points that fail are certainly outside, so the
+        exact haversine only has to run on the survivors.
+        
+        Args:
+            latitudes, longitudes: Point coordinates in degrees (scalars, or
+                arrays aligned with rows)
+            rows: Fence table rows to test
+        
+        Returns:
+            Boolean mask aligned with rows
+        """
+        table = self.fence_table
+        pad = self.BOUNDING_BOX_PAD_DEG
+        dlat = np.abs(np.asarray(latitudes, dtype=np.float64) - table.latitudes_deg[rows])
+        dlon = np.abs((np.asarray(longitudes, dtype=np.float64) - table.longitudes_deg[rows] + 180.0) % 360.0 - 180.0)
+        return (dlat <= table.lat_extents_deg[rows] + pad) & (dlon <= table.lon_extents_deg[rows] + pad)
+    
+    def get_fence_coverage_area(self, fence: GeoFenceZone) -> float:
+        """
+        Calculate the approximate coverage area of a geo-fence
+        
+        Args:
+            fence: Geo-fence zone (circle or polygon)
+        
         Returns:
             Area in square meters
         """
+        if fence.polygon is not None:
+            return PreparedPolygon(fence.polygon, self.earth_radius_km).area_m2
         return math.pi * (fence.radius_meters ** 2)
     
     def optimize_fence_radius(self, center_lat: float, center_lon: float, 
-                            test_points: List[LocationPoint], 
+                            test_points: Iterable[LocationPoint], 
                             desired_coverage: float = 0.95) -> int:
         """
         ML-based optimization to find optimal fence radius
         
+        Lists and other sequences are measured exactly; any other iterable
+        (e.g. a generator over months of GPS fixes) is streamed through a
+        DistanceHistogramSketch in chunks with constant memory.
+        
         Args:
             center_lat, center_lon: Center coordinates of the fence
-            test_points: List of test location points
+            test_points: Test location points
             desired_coverage: Desired coverage percentage (0.0 to 1.0)
-            
+        
         Returns:
             Optimal radius in meters
         """
-        if not test_points:
-            return 50  # Default radius
+        if not isinstance(test_points, Sequence):
+            sketch = self.build_radius_sketch(center_lat, center_lon, test_points)
+            return self.optimize_fence_radius_from_sketch(sketch, desired_coverage)
         
-        distances = []
+        latitudes = np.fromiter((p.latitude for p in test_points), np.float64, len(test_points))
+        longitudes = np.fromiter((p.longitude for p in test_points), np.float64, len(test_points))
+        return self.optimize_fence_radius_arrays(center_lat, center_lon, latitudes, longitudes,
+                                                 desired_coverage)
+    
+    def _coverage_index(self, count: int, desired_coverage: float) -> int:
+        return min(max(int(count * desired_coverage), 0), count - 1)
+    
+    def _clamp_radius(self, coverage_distance: float) -> int:
+        # Add buffer for GPS accuracy
+        optimal_radius = coverage_distance + self.accuracy_threshold_meters
+        return max(self.min_fence_radius_meters, min(self.max_fence_radius_meters, int(optimal_radius)))
+    
+    def optimize_fence_radius_arrays(self, center_lat: float, center_lon: float,
+                                     latitudes, longitudes, desired_coverage: float = 0.95) -> int:
+        """
+        Exact radius optimization over coordinate arrays
+        
+        Selects the coverage percentile with np.partition (linear time)
+        instead of fully sorting the distances.
+        
+        Args:
+            center_lat, center_lon: Center coordinates of the fence
+            latitudes, longitudes: Test point coordinates in degrees
+            desired_coverage: Desired coverage percentage (0.0 to 1.0)
+        
+        Returns:
+            Optimal radius in meters
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        if latitudes.size == 0:
+            return self.default_fence_radius_meters
+        
+        distances = self.haversine_distance_batch(center_lat, center_lon, latitudes, longitudes)
+        index = self._coverage_index(len(distances), desired_coverage)
+        return self._clamp_radius(float(np.partition(distances, index)[index]))
+    
+    def build_radius_sketch(self, center_lat: float, center_lon: float,
+                            test_points: Iterable[LocationPoint],
+                            sketch: Optional[DistanceHistogramSketch] = None,
+                            chunk_size: int = 65536) -> DistanceHistogramSketch:
+        """
+        Stream test points into a distance sketch for radius optimization
+        
+        Args:
+            center_lat, center_lon: Center coordinates of the fence
+            test_points: Iterable of test location points
+            sketch: Existing sketch to add to (optional)
+            chunk_size: Points measured per vectorized haversine call
+        
+        Returns:
+            The updated sketch
+        """
+        if sketch is None:
+            sketch = DistanceHistogramSketch(center_lat, center_lon,
+                                             max_distance=self.max_fence_radius_meters)
+        
+        latitudes = np.empty(chunk_size, dtype=np.float64)
+        longitudes = np.empty(chunk_size, dtype=np.float64)
+        filled = 0
         for point in test_points:
-            distance = self.haversine_distance(
-                center_lat, center_lon,
-                point.latitude, point.longitude
-            )
-            distances.append(distance)
+            latitudes[filled] = point.latitude
+            longitudes[filled] = point.longitude
+            filled += 1
+            if filled == chunk_size:
+                sketch.add_distances(self.haversine_distance_batch(
+                    sketch.center_lat, sketch.center_lon, latitudes, longitudes))
+                filled = 0
+        if filled:
+            sketch.add_distances(self.haversine_distance_batch(
+                sketch.center_lat, sketch.center_lon, latitudes[:filled], longitudes[:filled]))
+        return sketch
+    
+    def optimize_fence_radius_from_sketch(self, sketch: DistanceHistogramSketch,
+                                          desired_coverage: float = 0.95) -> int:
+        """
+        Radius optimization from a (possibly merged) distance sketch
         
-        # Sort distances and find the radius that covers desired percentage
-        distances.sort()
-        index = int(len(distances) * desired_coverage)
-        optimal_radius = distances[min(index, len(distances) - 1)]
+        Gives the same result as optimize_fence_radius when the sketch uses
+        1 m bins and accuracy_threshold_meters is a whole number.
         
-        # Add buffer for GPS accuracy
-        optimal_radius += self.accuracy_threshold_meters
+        Args:
+            sketch: Distance sketch built with build_radius_sketch
+            desired_coverage: Desired coverage percentage (0.0 to 1.0)
+        
+        Returns:
+            Optimal radius in meters
+        """
+        count = sketch.count
+        if count == 0:
+            return self.default_fence_radius_meters
         
-        return max(30, min(500, int(optimal_radius)))  # Min 30m, Max 500m
+        index = self._coverage_index(count, desired_coverage)
+        return self._clamp_radius(sketch.order_statistic(index))
     
     def detect_location_anomalies(self, user_id: str, location_history: List[LocationPoint]) -> Dict:
         """
@@ -205,7 +1312,7 @@ class GeoFenceValidator:
         Args:
             user_id: User identifier
             location_history: List of historical location points
-            
+        
         Returns:
             Dictionary with anomaly detection results
         """
@@ -216,38 +1323,280 @@ class GeoFenceValidator:
                 'sample_size': len(location_history)
             }
         
-        # Calculate average speed between consecutive points
-        speeds = []
-        for i in range(1, len(location_history)):
-            if location_history[i].timestamp and location_history[i-1].timestamp:
-                distance = self.haversine_distance(
-                    location_history[i-1].latitude, location_history[i-1].longitude,
-                    location_history[i].latitude, location_history[i].longitude
-                )
-                
-                time_diff = (location_history[i].timestamp - location_history[i-1].timestamp).total_seconds()
-                
-                if time_diff > 0:
-                    speed_mps = distance / time_diff  # meters per second
-                    speeds.append(speed_mps)
+        latitudes = np.fromiter((p.latitude for p in location_history), np.float64, len(location_history))
+        longitudes = np.fromiter((p.longitude for p in location_history), np.float64, len(location_history))
+        # Missing timestamps become NaN, which drops the pairs around them
+        timestamps = np.fromiter(
+            (p.timestamp.timestamp() if p.timestamp else np.nan for p in location_history),
+            np.float64, len(location_history)
+        )
+        
+        return self.detect_location_anomalies_arrays(user_id, latitudes, longitudes, timestamps)
+    
+    def detect_location_anomalies_arrays(self, user_id: str, latitudes: np.ndarray,
+                                         longitudes: np.ndarray, timestamps: np.ndarray) -> Dict:
+        """
+        Columnar variant of detect_location_anomalies
+        
+        Args:
+            user_id: User identifier
+            latitudes, longitudes: Location history coordinates in degrees, oldest first
+            timestamps: Epoch seconds for each point (NaN if unknown)
+        
+        Returns:
+            Dictionary with anomaly detection results
+        """
+        if len(latitudes) < 3:
+            return {
+                'has_anomalies': False,
+                'reason': 'Insufficient data for analysis',
+                'sample_size': len(latitudes)
+            }
+        
+        # Speed between consecutive points with a positive time difference
+        time_diffs = np.diff(timestamps)
+        valid = time_diffs > 0
+        distances = self.haversine_distance_batch(
+            latitudes[:-1][valid], longitudes[:-1][valid],
+            latitudes[1:][valid], longitudes[1:][valid]
+        )
+        speeds = distances / time_diffs[valid]  # meters per second
         
         # Detect anomalies (speed > 30 m/s = ~108 km/h)
-        anomaly_threshold = 30  # m/s
-        anomalies = [speed for speed in speeds if speed > anomaly_threshold]
+        anomaly_threshold = self.speed_anomaly_threshold_mps
+        anomaly_count = int(np.count_nonzero(speeds > anomaly_threshold))
+        sample_count = len(speeds)
         
         return {
-            'has_anomalies': len(anomalies) > 0,
-            'anomaly_count': len(anomalies),
-            'total_samples': len(speeds),
-            'max_speed': max(speeds) if speeds else 0,
-            'avg_speed': sum(speeds) / len(speeds) if speeds else 0,
+            'has_anomalies': anomaly_count > 0,
+            'anomaly_count': anomaly_count,
+            'total_samples': sample_count,
+            'max_speed': float(speeds.max()) if sample_count else 0,
+            'avg_speed': float(speeds.mean()) if sample_count else 0,
             'anomaly_threshold': anomaly_threshold,
-            'anomaly_percentage': (len(anomalies) / len(speeds) * 100) if speeds else 0
+            'anomaly_percentage': (anomaly_count / sample_count * 100) if sample_count else 0
         }
+    
+    @staticmethod
+    def _factorize_user_ids(user_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Map user ids to dense int64 codes; returns (unique_ids, codes)"""
+        if user_ids.dtype.kind in 'iu' and len(user_ids):
+            offset = int(user_ids.min())
+            span = int(user_ids.max()) - offset + 1
+            if span <= 4 * len(user_ids):
+                shifted = (user_ids - offset).astype(np.int64)
+                present = np.bincount(shifted, minlength=span) > 0
+                remap = np.cumsum(present) - 1
+                return np.flatnonzero(present) + offset, remap[shifted]
+        
+        users, codes = np.unique(user_ids, return_inverse=True)
+        return users, codes.ravel().astype(np.int64)
+    
+    def detect_anomalies_batch(self, user_ids, latitudes, longitudes, timestamps) -> Dict[str, Dict]:
+        """
+        Vectorized anomaly scan over many users' location histories
+        
+        Takes a columnar table of fixes in any order, sorts it by user and
+        timestamp, and computes every user's speed statistics in one pass of
+        NumPy diffs and grouped reductions.
+        
+        Args:
+            user_ids: User id per fix; integer ids are factorized in linear
+                time, other ids need a sort (slow for tens of millions of rows)
+            latitudes, longitudes: Coordinates in degrees per fix
+            timestamps: Epoch seconds per fix (NaN if unknown)
+        
+        Returns:
+            Dictionary mapping user id to the same result dictionary that
+            detect_location_anomalies returns for that user
+        """
+        user_ids = np.asarray(user_ids)
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        
+        users, codes = self._factorize_user_ids(user_ids)
+        n_users = len(users)
+        if n_users == 0:
+            return {}
+        
+        # Group fixes by user, oldest first within each user (NaN timestamps last).
+        # A single argsort on (user code, time rank) is much faster than lexsort.
+        # Fixes with identical timestamps may come out in any order; the pair
+        # between them is skipped either way.
+        time_rank = np.empty(len(timestamps), dtype=np.int64)
+        time_rank[np.argsort(timestamps)] = np.arange(len(timestamps))
+        order = np.argsort(codes * len(timestamps) + time_rank)
+        codes = codes[order]
+        latitudes = latitudes[order]
+        longitudes = longitudes[order]
+        timestamps = timestamps[order]
+        
+        # Consecutive pairs that belong to the same user and move forward in time
+        time_diffs = np.diff(timestamps)
+        valid = (codes[1:] == codes[:-1]) & (time_diffs > 0)
+        pair_codes = codes[1:][valid]
+        speeds = self.haversine_distance_batch(
+            latitudes[:-1][valid], longitudes[:-1][valid],
+            latitudes[1:][valid], longitudes[1:][valid]
+        ) / time_diffs[valid]
+        
+        anomaly_threshold = self.speed_anomaly_threshold_mps
+        point_counts = np.bincount(codes, minlength=n_users)
+        sample_counts = np.bincount(pair_codes, minlength=n_users)
+        speed_sums = np.bincount(pair_codes, weights=speeds, minlength=n_users)
+        anomaly_counts = np.bincount(pair_codes[speeds > anomaly_threshold], minlength=n_users)
+        
+        # Pairs are sorted by user, so per-user maxima are segment reductions
+        max_speeds = np.zeros(n_users)
+        has_samples = sample_counts > 0
+        if has_samples.any():
+            segment_starts = np.concatenate(([0], np.cumsum(sample_counts)[:-1]))[has_samples]
+            max_speeds[has_samples] = np.maximum.reduceat(speeds, segment_starts)
+        
+        results = {}
+        for code, user_id in enumerate(users.tolist()):
+            if point_counts[code] < 3:
+                results[user_id] = {
+                    'has_anomalies': False,
+                    'reason': 'Insufficient data for analysis',
+                    'sample_size': int(point_counts[code])
+                }
+                continue
+            
+            samples = int(sample_counts[code])
+            anomalies = int(anomaly_counts[code])
+            results[user_id] = {
+                'has_anomalies': anomalies > 0,
+                'anomaly_count': anomalies,
+                'total_samples': samples,
+                'max_speed': float(max_speeds[code]),
+                'avg_speed': float(speed_sums[code] / samples) if samples else 0,
+                'anomaly_threshold': anomaly_threshold,
+                'anomaly_percentage': (anomalies / samples * 100) if samples else 0
+            }
+        
+        return results
+
+class SpeedAnomalyState:
+    """Running speed statistics for one user"""
+    
+    __slots__ = ('latitude', 'longitude', 'timestamp', 'sample_count', 'mean_speed',
+                 'max_speed', 'anomaly_count', 'last_seen')
+    
+    def __init__(self):
+        self.latitude = None
+        self.longitude = None
+        self.timestamp = None
+        self.sample_count = 0
+        self.mean_speed = 0.0
+        self.max_speed = 0.0
+        self.anomaly_count = 0
+        self.last_seen = 0.0
+
+class OnlineSpeedAnomalyDetector:
+    """
+    Streaming per-user speed anomaly detector
+    
+    Keeps only the last fix and running speed statistics per user, so each
+    new fix is judged in O(1) instead of replaying the user's history. Speeds
+    are counted exactly like detect_location_anomalies: consecutive fixes with
+    a positive time difference, where a fix without timestamp breaks the chain.
+    """
+    
+    def __init__(self, validator: 'GeoFenceValidator', max_idle_seconds: float = 24 * 3600,
+                 sweep_interval: int = 10000):
+        self.validator = validator
+        self.max_idle_seconds = max_idle_seconds
+        self.sweep_interval = sweep_interval
+        self._states: Dict[str, SpeedAnomalyState] = {}
+        self._updates_since_sweep = 0
+    
+    def __len__(self) -> int:
+        return len(self._states)
+    
+    def update(self, point: LocationPoint) -> Optional[Dict]:
+        """
+        Feed a new fix and return the verdict for it
+        
+        Args:
+            point: Location point with user_id (points without one are ignored)
+        
+        Returns:
+            Dictionary with the fix's speed, anomaly flag and running
+            statistics, or None if the point has no user_id
+        """
+        if point.user_id is None:
+            return None
+        
+        state = self._states.get(point.user_id)
+        if state is None:
+            state = self._states[point.user_id] = SpeedAnomalyState()
+        
+        timestamp = point.timestamp.timestamp() if point.timestamp else None
+        speed = None
+        if timestamp is not None and state.timestamp is not None:
+            time_diff = timestamp - state.timestamp
+            if time_diff > 0:
+                distance = self.validator.haversine_distance(
+                    state.latitude, state.longitude, point.latitude, point.longitude
+                )
+                speed = distance / time_diff
+                state.sample_count += 1
+                state.mean_speed += (speed - state.mean_speed) / state.sample_count
+                state.max_speed = max(state.max_speed, speed)
+                if speed > self.validator.speed_anomaly_threshold_mps:
+                    state.anomaly_count += 1
+        
+        state.latitude = point.latitude
+        state.longitude = point.longitude
+        state.timestamp = timestamp
+        state.last_seen = time.time()
+        
+        self._updates_since_sweep += 1
+        if self._updates_since_sweep >= self.sweep_interval:
+            self.sweep()
+        
+        result = self._summarize(state)
+        result['speed_mps'] = speed
+        result['is_anomalous'] = speed is not None and speed > self.validator.speed_anomaly_threshold_mps
+        return result
+    
+    def summary(self, user_id: str) -> Optional[Dict]:
+        """Return the running statistics for a user, or None if unknown"""
+        state = self._states.get(user_id)
+        return self._summarize(state) if state is not None else None
+    
+    def _summarize(self, state: SpeedAnomalyState) -> Dict:
+        samples = state.sample_count
+        return {
+            'has_anomalies': state.anomaly_count > 0,
+            'anomaly_count': state.anomaly_count,
+            'total_samples': samples,
+            'max_speed': state.max_speed,
+            'avg_speed': state.mean_speed,
+            'anomaly_threshold': self.validator.speed_anomaly_threshold_mps,
+            'anomaly_percentage': (state.anomaly_count / samples * 100) if samples else 0
+        }
+    
+    def sweep(self):
+        """Forget users that have not sent a fix within max_idle_seconds"""
+        cutoff = time.time() - self.max_idle_seconds
+        for user_id in [u for u, state in self._states.items() if state.last_seen < cutoff]:
+            del self._states[user_id]
+        self._updates_since_sweep = 0
 
 # Utility functions for integration
 def create_fence_from_dict(fence_data: Dict) -> GeoFenceZone:
     """Create GeoFenceZone from dictionary"""
+    polygon = fence_data.get('polygon')
+    if polygon is not None:
+        # Polygon fences carry their bounding circle as center and radius
+        polygon = [(float(lat), float(lon)) for lat, lon in polygon]
+        bounds = PreparedPolygon(polygon)
+        fence_data = {**fence_data, 'latitude': bounds.center_lat, 'longitude': bounds.center_lon,
+                      'radius_meters': bounds.radius_meters}
+    
     return GeoFenceZone(
         id=str(fence_data.get('_id', fence_data.get('id'))),
         session_id=str(fence_data.get('session_id')),
@@ -258,16 +1607,17 @@ def create_fence_from_dict(fence_data: Dict) -> GeoFenceZone:
         college_name=fence_data.get('college_name', ''),
         batch_id=fence_data.get('batch_id'),
         is_active=fence_data.get('is_active', True),
-        created_date=fence_data.get('created_date')
+        created_date=fence_data.get('created_date'),
+        polygon=polygon
     )
 
 def create_location_from_dict(location_data: Dict) -> LocationPoint:
-    """Create LocationPoint from dictionary"""
+    """Create LocationPoint from dictionary (an unparseable timestamp is dropped)"""
     timestamp = None
     if location_data.get('timestamp'):
         try:
             timestamp = datetime.fromisoformat(location_data['timestamp'])
-        except:
+        except (TypeError, ValueError):
             pass
     
     return LocationPoint(
@@ -277,6 +1627,156 @@ def create_location_from_dict(location_data: Dict) -> LocationPoint:
         user_id=location_data.get('user_id')
     )
 
+def _float_column(values: List) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert values to float64 in one call; per-value float() only if that fails"""
+    try:
+        column = np.array(values, dtype=np.float64)
+        return column, np.isfinite(column)
+    except (TypeError, ValueError):
+        pass
+    column = np.full(len(values), np.nan)
+    for i, value in enumerate(values):
+        try:
+            column[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return column, np.isfinite(column)
+
+def _naive_epoch_to_local(naive_seconds: np.ndarray) -> np.ndarray:
+    """
+    Epoch seconds of naive local times given as seconds since 1970-01-01 00:00
+    
+    Matches datetime.timestamp() on naive datetimes. The local UTC offset is
+    looked up once per distinct hour (DST changes fall on hour boundaries);
+    times datetime cannot represent become NaN.
+    """
+    hours = np.floor(naive_seconds / 3600)
+    unique_hours, inverse = np.unique(hours, return_inverse=True)
+    offsets = np.full(len(unique_hours), np.nan)
+    for i, hour in enumerate(unique_hours.tolist()):
+        try:
+            offsets[i] = (datetime(1970, 1, 1) + timedelta(hours=hour)).timestamp() - hour * 3600
+        except (OverflowError, OSError, ValueError):
+            pass
+    return naive_seconds + offsets[inverse.reshape(-1)]
+
+def _parse_iso_timestamps(strings: np.ndarray) -> np.ndarray:
+    """
+    Epoch seconds of ISO 8601 strings, NaN where a string does not parse
+    
+    Naive date-times are parsed in one vectorized NumPy datetime64 call and
+    read as local time, like datetime.fromisoformat(...).timestamp(). If
+    that call fails (a malformed string or a UTC offset anywhere in the
+    column), the strings are parsed one by one with datetime.fromisoformat.
+    """
+    if not len(strings):
+        return np.empty(0, dtype=np.float64)
+    # np.datetime64 also accepts "now", "today" and bare years; leave those to fromisoformat
+    if np.all((np.char.str_len(strings) >= 10) & np.char.isdigit(strings.astype('U4'))):
+        try:
+            with warnings.catch_warnings():
+                # Strings with UTC offsets only warn; handle them exactly below
+                warnings.simplefilter('error')
+                parsed = strings.astype('datetime64[us]')
+            return _naive_epoch_to_local(parsed.astype(np.int64) / 1e6)
+        except (ValueError, UserWarning, DeprecationWarning):
+            pass
+    
+    timestamps = np.full(len(strings), np.nan)
+    for i, text in enumerate(strings.tolist()):
+        try:
+            timestamps[i] = datetime.fromisoformat(text).timestamp()
+        except (ValueError, OverflowError, OSError):
+            pass
+    return timestamps
+
+def _timestamp_column(values: List) -> Tuple[np.ndarray, np.ndarray]:
+    """Epoch seconds of ISO strings or epoch numbers, plus a per-row ok flag (missing is ok)"""
+    timestamps = np.full(len(values), np.nan)
+    kinds = set(map(type, values))
+    if kinds <= {str}:
+        strings = np.array(values, dtype=str)
+        present = np.char.str_len(strings) > 0
+        timestamps[present] = _parse_iso_timestamps(strings[present])
+        return timestamps, ~present | np.isfinite(timestamps)
+    
+    ok = np.ones(len(values), dtype=bool)
+    text_rows, number_rows = [], []
+    for i, value in enumerate(values):
+        if isinstance(value, str):
+            if value:
+                text_rows.append(i)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            number_rows.append(i)
+        elif value is not None:
+            ok[i] = False
+    if text_rows:
+        timestamps[text_rows] = _parse_iso_timestamps(np.array([values[i] for i in text_rows], dtype=str))
+    if number_rows:
+        timestamps[number_rows] = [values[i] for i in number_rows]
+    parsed_rows = text_rows + number_rows
+    ok[parsed_rows] = np.isfinite(timestamps[parsed_rows])
+    return timestamps, ok
+
+def location_columns_from_dicts(location_data: List[Dict]) -> LocationColumns:
+    """
+    Parse many location dictionaries straight into columnar arrays
+    
+    The bulk counterpart of create_location_from_dict for request payloads
+    with thousands of points: coordinates are converted with one NumPy call
+    per column and ISO timestamps are parsed vectorized. Invalid rows are
+    reported in errors instead of raising or defaulting to 0.
+    
+    Args:
+        location_data: Dictionaries with latitude, longitude and optional
+            timestamp (ISO 8601 string or epoch seconds) and user_id
+    
+    Returns:
+        LocationColumns with the rows that parsed, in input order
+    """
+    count = len(location_data)
+    try:
+        raw_latitudes = [p['latitude'] for p in location_data]
+        raw_longitudes = [p['longitude'] for p in location_data]
+        rows = location_data
+    except (KeyError, TypeError):
+        # Some rows are not objects or lack coordinates; they are reported below
+        rows = [p if isinstance(p, dict) else {} for p in location_data]
+        raw_latitudes = [p.get('latitude') for p in rows]
+        raw_longitudes = [p.get('longitude') for p in rows]
+    latitudes, latitude_ok = _float_column(raw_latitudes)
+    longitudes, longitude_ok = _float_column(raw_longitudes)
+    raw_timestamps = [p.get('timestamp') for p in rows]
+    timestamps, timestamp_ok = _timestamp_column(raw_timestamps)
+    user_ids = [p.get('user_id') for p in rows]
+    
+    valid = latitude_ok & longitude_ok & timestamp_ok
+    if valid.all():
+        return LocationColumns(latitudes, longitudes, timestamps, user_ids,
+                               np.arange(count), [])
+    
+    errors = []
+    for i in np.flatnonzero(~valid).tolist():
+        if not isinstance(location_data[i], dict):
+            error = 'Point must be a JSON object'
+        elif 'latitude' not in rows[i] or 'longitude' not in rows[i]:
+            error = 'Missing required fields: latitude, longitude'
+        elif not (latitude_ok[i] and longitude_ok[i]):
+            error = 'latitude and longitude must be finite numbers'
+        else:
+            error = f'Invalid timestamp: {raw_timestamps[i]!r}'
+        errors.append({'index': i, 'error': error})
+    
+    indices = np.flatnonzero(valid)
+    return LocationColumns(
+        latitudes=latitudes[indices],
+        longitudes=longitudes[indices],
+        timestamps=timestamps[indices],
+        user_ids=[user_ids[i] for i in indices.tolist()],
+        indices=indices,
+        errors=errors
+    )
+
 # Example usage and testing
 if __name__ == "__main__":
     # Initialize validator
@@ -308,3 +1808,82 @@ if __name__ == "__main__":
     fences = [test_fence]
     multi_result = validator.validate_multiple_fences(test_point, fences)
     print("\nMultiple Fences Result:", json.dumps(multi_result, indent=2, default=str))
+    
+    # Check the vectorized distances against the scalar path
+    batch_distance = validator.haversine_distance_batch(
+        test_point.latitude, test_point.longitude,
+        [test_fence.latitude], [test_fence.longitude]
+    )[0]
+    scalar_distance = validator.haversine_distance(
+        test_point.latitude, test_point.longitude,
+        test_fence.latitude, test_fence.longitude
+    )
+    assert abs(batch_distance - scalar_distance) <= validator.BATCH_DISTANCE_TOLERANCE_METERS
+    print(f"\nBatch/scalar distance difference: {abs(batch_distance - scalar_distance):.3e} m")
+    
+    # The bounding box prefilter must never reject a point inside a fence:
+    # place points just inside and on the edge of random fences (including
+    # near the poles and the antimeridian) and check every in-fence point
+    # survives the prefilter
+    rng = np.random.default_rng(0)
+    prefilter_validator = GeoFenceValidator()
+    fence_count = 2000
+    fence_lats = np.concatenate([rng.uniform(-89.9, 89.9, fence_count - 200), rng.uniform(89.0, 89.99, 100),
+                                 rng.uniform(-89.99, -89.0, 100)])
+    fence_lons = np.concatenate([rng.uniform(-180, 180, fence_count - 100), rng.choice([-179.9999, 179.9999], 100)])
+    fence_radii = rng.integers(1, 5000, fence_count)
+    prefilter_validator.load_fences([
+        GeoFenceZone(id=f"prefilter_{i}", session_id="prefilter", location_name="", latitude=float(fence_lats[i]),
+                     longitude=float(fence_lons[i]), radius_meters=int(fence_radii[i]), college_name="")
+        for i in range(fence_count)
+    ])
+    
+    samples = 500
+    rows = np.repeat(np.arange(fence_count), samples)
+    angular = fence_radii[rows] * rng.uniform(0.999, 1.0, len(rows)) / (prefilter_validator.earth_radius_km * 1000)
+    bearing = rng.uniform(0, 2 * math.pi, len(rows))
+    lat1, lon1 = np.radians(fence_lats[rows]), np.radians(fence_lons[rows])
+    point_lats = np.arcsin(np.sin(lat1) * np.cos(angular) + np.cos(lat1) * np.sin(angular) * np.cos(bearing))
+    point_lons = lon1 + np.arctan2(np.sin(bearing) * np.sin(angular) * np.cos(lat1),
+                                   np.cos(angular) - np.sin(lat1) * np.sin(point_lats))
+    point_lats = np.degrees(point_lats)
+    point_lons = (np.degrees(point_lons) + 180.0) % 360.0 - 180.0
+    
+    inside = prefilter_validator.haversine_distance_batch(point_lats, point_lons, fence_lats[rows], fence_lons[rows]) <= fence_radii[rows]
+    survives = prefilter_validator.within_bounding_boxes(point_lats, point_lons, rows)
+    assert not np.any(inside & ~survives), "bounding box prefilter rejected an in-fence point"
+    print(f"Prefilter exactness: {int(inside.sum())} in-fence points near fence edges, none rejected")
+    
+    # Polygon fences: an L-shaped building whose bounding circle covers the
+    # empty corner, which the point-in-polygon test must reject
+    building = create_fence_from_dict({
+        'id': 'building_1', 'session_id': 'session_1', 'location_name': 'Main Building',
+        'college_name': 'Test College',
+        'polygon': [(18.5200, 73.8560), (18.5200, 73.8570), (18.5205, 73.8570),
+                    (18.5205, 73.8565), (18.5210, 73.8565), (18.5210, 73.8560)]
+    })
+    validator.add_fence(building)
+    in_wing = LocationPoint(latitude=18.5208, longitude=73.8562)
+    in_corner = LocationPoint(latitude=18.5208, longitude=73.8568)
+    assert validator.is_point_in_fence(in_wing, building)['is_within_fence']
+    assert not validator.is_point_in_fence(in_corner, building)['is_within_fence']
+    assert validator.haversine_distance(in_corner.latitude, in_corner.longitude,
+                                        building.latitude, building.longitude) <= building.radius_meters
+    print(f"Polygon fence: bounding radius {building.radius_meters} m, corner point rejected")
+    
+    # Columnar ingestion agrees with create_location_from_dict and reports bad rows
+    payload = [
+        {'latitude': 18.5204, 'longitude': 73.8567, 'timestamp': '2024-01-15T09:00:00', 'user_id': 'u1'},
+        {'latitude': '18.5210', 'longitude': 73.8567, 'timestamp': '2024-01-15T09:01:00.250000'},
+        {'latitude': 18.5204},
+        {'latitude': 18.5204, 'longitude': 73.8567, 'timestamp': 'yesterday'},
+        {'latitude': 18.5204, 'longitude': 73.8567, 'timestamp': '2024-01-15T09:02:00+05:30'},
+    ]
+    columns = location_columns_from_dicts(payload)
+    assert columns.indices.tolist() == [0, 1, 4]
+    assert [error['index'] for error in columns.errors] == [2, 3]
+    for row, index in enumerate(columns.indices.tolist()):
+        point = create_location_from_dict(payload[index])
+        assert (columns.latitudes[row], columns.longitudes[row]) == (point.latitude, point.longitude)
+        assert columns.timestamps[row] == point.timestamp.timestamp()
+    print(f"Columnar ingestion: {len(columns)} rows parsed, rows {[e['index'] for e in columns.errors]} rejected")
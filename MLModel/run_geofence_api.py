@@ -2,10 +2,18 @@
 """
 GeoFence API Server Runner
 This script starts the Flask API server for geo-fencing functionality.
+
+Usage:
+    python run_geofence_api.py [--install-deps] [--asgi] [--host HOST] [--port PORT] [--debug]
+
+With --asgi the same routes are served by uvicorn through geofence_asgi,
+which holds many concurrent connections on one event loop and runs the
+Flask handlers in a bounded thread pool.
 """
 
 import os
 import sys
+import argparse
 import subprocess
 from pathlib import Path
 
@@ -28,26 +36,38 @@ def install_dependencies():
         print(f"Error installing dependencies: {e}")
         sys.exit(1)
 
-def start_api_server():
-    """Start the Flask API server"""
-    print("Starting GeoFence API Server...")
-    print("API will be available at: http://localhost:5001")
-    print("Health check: http://localhost:5001/health")
+def start_api_server(host: str = '0.0.0.0', port: int = 5001, debug: bool = False, use_asgi: bool = False):
+    """Start the Flask API server (or its ASGI variant)"""
+    print("Starting GeoFence API Server" + (" (ASGI)..." if use_asgi else "..."))
+    print(f"API will be available at: http://localhost:{port}")
+    print(f"Health check: http://localhost:{port}/health")
     print("\nAvailable endpoints:")
     print("  GET  /health")
     print("  POST /api/geofence/validate")
+    print("  POST /api/geofence/validate-batch")
     print("  POST /api/geofence/create")
     print("  GET  /api/geofence/list")
     print("  PUT  /api/geofence/<fence_id>")
     print("  DELETE /api/geofence/<fence_id>")
     print("  POST /api/geofence/optimize-radius")
     print("  POST /api/geofence/detect-anomalies")
+    print("  POST /api/geofence/audit-anomalies")
     print("  GET  /api/geofence/coverage-area")
+    print("  GET  /api/geofence/presence")
+    print("  GET  /api/geofence/events (server-sent events)")
+    print("  GET  /api/geofence/shards")
+    print("  POST /api/geofence/shards/<college_name>/rebuild")
     print("\nPress Ctrl+C to stop the server")
     
     try:
-        from geofence_api import app
-        app.run(host='0.0.0.0', port=5001, debug=True)
+        if use_asgi:
+            import uvicorn
+            from geofence_asgi import asgi_app
+            uvicorn.run(asgi_app, host=host, port=port, backlog=4096,
+                        log_level='debug' if debug else 'info')
+        else:
+            from geofence_api import app
+            app.run(host=host, port=port, debug=debug)
     except ImportError as e:
         print(f"Error importing geofence_api: {e}")
         print("Make sure all dependencies are installed")
@@ -56,8 +76,21 @@ def start_api_server():
         print(f"Error starting server: {e}")
         sys.exit(1)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the GeoFence API server")
+    parser.add_argument('--install-deps', action='store_true',
+                        help="pip install -r requirements.txt before starting")
+    parser.add_argument('--asgi', action='store_true',
+                        help="serve through the ASGI entry point with uvicorn")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--debug', action='store_true', help="enable Flask debug mode")
+    return parser.parse_args()
+
 def main():
     """Main function"""
+    args = parse_args()
+    
     # Change to the MLModel directory
     mlmodel_dir = Path(__file__).parent
     os.chdir(mlmodel_dir)
@@ -72,13 +105,11 @@ def main():
         print("Error: requirements.txt not found")
         sys.exit(1)
     
-    # Ask user if they want to install dependencies
-    install_deps = input("Install dependencies? (y/n): ").lower().strip()
-    if install_deps in ['y', 'yes']:
+    if args.install_deps:
         install_dependencies()
     
     # Start the API server
-    start_api_server()
+    start_api_server(args.host, args.port, args.debug, args.asgi)
 
 if __name__ == "__main__":
     main()
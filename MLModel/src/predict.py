@@ -1,19 +1,106 @@
+import time
+
+# Start of the "imports" stage reported by --timings
+_STARTED = time.perf_counter()
+
 import argparse
+import itertools
 import json
 import os
-import pickle
 import sys
 from pathlib import Path
 
-import numpy as np
-import pandas as pd
+# numpy, pickle (and through it sklearn) and the socket server are imported
+# only by the paths that need them, so a heuristic fallback answers without
+# loading any of them. numpy is bound here by _import_numpy().
+np = None
+
+# Order of the values in a raw feature vector (--input CSV or a request's "input")
+FIELD_NAMES = [
+    "hour_of_day",
+    "day_of_week",
+    "gps_lat",
+    "gps_lng",
+    "gps_accuracy",
+    "ip_octet1",
+    "ip_octet2",
+    "ip_octet3",
+    "ip_octet4",
+    "ua_length",
+    "fp_hash",
+]
+FIELD_INDEX = {name: idx for idx, name in enumerate(FIELD_NAMES)}
+
+# Flat forest export written by train_proxy.py
+FOREST_FILE = "proxy_forest.npz"
+
+# Reference point for dist_from_ref (Delhi campus), as in train_proxy.py
+REF_LAT, REF_LNG = 28.6139, 77.2090
+
+# Invalid CSV rows reported individually on stderr by --input-file
+MAX_REPORTED_ERRORS = 20
+
+# Largest allowed difference between flat forest and sklearn probabilities (--check-parity)
+FOREST_TOLERANCE = 1e-9
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Predict proxy probability")
     parser.add_argument("--model-dir", type=str, default="models", help="Directory with model artifacts")
-    parser.add_argument("--input", type=str, required=True, help="Feature vector as CSV string")
-    return parser.parse_args()
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--input", type=str, help="Feature vector as CSV string")
+    mode.add_argument("--input-file", type=str,
+                      help="Score every row of a CSV or NDJSON file ('-' for stdin), one output line per row")
+    mode.add_argument("--serve", action="store_true",
+                      help="Stay resident and answer JSON-lines requests on stdin/stdout")
+    mode.add_argument("--check-parity", nargs="?", const="", metavar="CSV",
+                      help="Check FeatureSpec against train_proxy.feature_engineering on generated rows "
+                           "(and the rows of CSV, if given), then exit")
+    parser.add_argument("--socket", type=str, default=None,
+                        help="With --serve, listen on this Unix domain socket instead of stdin")
+    parser.add_argument("--format", choices=["auto", "csv", "ndjson"], default="auto",
+                        help="Format of --input-file (auto: NDJSON if the first row starts with '{')")
+    parser.add_argument("--chunk-size", type=int, default=5000,
+                        help="Rows scored per predict_proba call with --input-file")
+    parser.add_argument("--timings", action="store_true",
+                        help="Report the time spent in each startup and scoring stage on stderr")
+    args = parser.parse_args()
+    if args.socket and not args.serve:
+        parser.error("--socket requires --serve")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be positive")
+    return args
+
+
+def _import_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+class StageTimer:
+    """Wall time of consecutive stages, reported on stderr in -X importtime layout."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.stages = []
+        self._last = _STARTED
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        print("stage time: self [us] | cumulative | stage", file=sys.stderr)
+        cumulative = 0.0
+        for stage, seconds in self.stages:
+            cumulative += seconds
+            print(f"stage time: {seconds * 1e6:9.0f} | {cumulative * 1e6:10.0f} | {stage}", file=sys.stderr)
+        sys.stderr.flush()
 
 
 def load_artifacts(model_dir):
@@ -24,6 +111,7 @@ def load_artifacts(model_dir):
     if not model_path.exists() or not scaler_path.exists() or not meta_path.exists():
         raise FileNotFoundError(f"Model artifacts not found in {model_dir}")
 
+    import pickle
     with open(model_path, "rb") as f:
         model = pickle.load(f)
     with open(scaler_path, "rb") as f:
@@ -34,82 +122,574 @@ def load_artifacts(model_dir):
     return model, scaler, meta
 
 
-def feature_engineering_one(row):
-    """Apply the same feature engineering as training."""
-    df = pd.DataFrame([row])
+def _field(raw, name):
+    return raw[..., FIELD_INDEX[name]]
 
+
+def _dist_from_ref(raw):
     # Distance from reference point (Delhi campus)
-    ref_lat, ref_lng = 28.6139, 77.2090
-    df["dist_from_ref"] = np.sqrt((df["gps_lat"] - ref_lat) ** 2 + (df["gps_lng"] - ref_lng) ** 2)
+    return np.sqrt((_field(raw, "gps_lat") - REF_LAT) ** 2 + (_field(raw, "gps_lng") - REF_LNG) ** 2)
 
-    # IP private flag
-    df["is_private_ip"] = (
-        (df["ip_octet1"] == 10) |
-        ((df["ip_octet1"] == 172) & (df["ip_octet2"] >= 16) & (df["ip_octet2"] <= 31)) |
-        ((df["ip_octet1"] == 192) & (df["ip_octet2"] == 168))
-    ).astype(int)
 
-    # Time flags
-    df["is_night"] = ((df["hour_of_day"] >= 22) | (df["hour_of_day"] <= 6)).astype(int)
-    df["is_weekend"] = (df["day_of_week"] >= 5).astype(int)
+def _is_private_ip(raw):
+    ip1, ip2 = _field(raw, "ip_octet1"), _field(raw, "ip_octet2")
+    return (
+        (ip1 == 10) |
+        ((ip1 == 172) & (ip2 >= 16) & (ip2 <= 31)) |
+        ((ip1 == 192) & (ip2 == 168))
+    )
 
-    # GPS accuracy flag
-    df["poor_gps"] = (df["gps_accuracy"] > 100).astype(int)
 
-    return df
+def _is_night(raw):
+    hour = _field(raw, "hour_of_day")
+    return (hour >= 22) | (hour <= 6)
 
 
-def predict():
-    args = parse_args()
+def _is_weekend(raw):
+    return _field(raw, "day_of_week") >= 5
+
+
+def _poor_gps(raw):
+    return _field(raw, "gps_accuracy") > 100
+
+
+# Derived columns of train_proxy.feature_engineering, computed from raw vectors
+DERIVED_FEATURES = {
+    "dist_from_ref": _dist_from_ref,
+    "is_private_ip": _is_private_ip,
+    "is_night": _is_night,
+    "is_weekend": _is_weekend,
+    "poor_gps": _poor_gps,
+}
+
+
+class FlatForest:
+    """
+    Random forest evaluated from the flat arrays train_proxy.py exports.
+
+    Walks all trees for a whole batch at once. Each step gathers the split
+    of the current node of every (row, tree) pair and moves it to a child,
+    max_depth times; leaves point to themselves. Like sklearn, inputs are
+    cast to float32 and compared against the float64 thresholds, and the
+    result is the mean of the per-tree leaf probabilities.
+    """
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"].astype(np.intp)
+        self.threshold = arrays["threshold"]
+        # children[2 * node] is the left child, children[2 * node + 1] the right one
+        self.children = np.column_stack([arrays["left"], arrays["right"]]).astype(np.intp).ravel()
+        self.value = arrays["value"]
+        self.roots = arrays["roots"].astype(np.intp)
+        self.depth = int(arrays["depth"])
+
+    # Rows stepped together; keeps the (rows, trees) node arrays in cache
+    block_rows = 256
+
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        totals = np.empty(X.shape[0])
+        for start in range(0, X.shape[0], self.block_rows):
+            block = X[start:start + self.block_rows]
+            row_start = (np.arange(block.shape[0]) * block.shape[1])[:, None]
+            values = block.ravel()
+            nodes = np.repeat(self.roots[None, :], block.shape[0], axis=0)
+            for _ in range(self.depth):
+                go_right = values[row_start + self.feature[nodes]] > self.threshold[nodes]
+                nodes = self.children[2 * nodes + go_right]
+            totals[start:start + block.shape[0]] = self.value[nodes].sum(axis=1)
+        proba = totals / len(self.roots)
+        return np.column_stack([1.0 - proba, proba])
+
+
+class FeatureSpec:
+    """
+    Raw feature vectors -> model input, compiled once from meta["features"].
+
+    Produces the columns of train_proxy.feature_engineering in training
+    order without building a DataFrame, with the StandardScaler folded in
+    as the same subtract/divide it performs. Works on one raw vector or a
+    2-D array of them; run predict.py --check-parity after changing either
+    side.
+    """
+
+    def __init__(self, features, offset=None, scale=None):
+        self.features = list(features)
+        self._raw_slots, self._raw_columns, self._derived = [], [], []
+        for slot, name in enumerate(self.features):
+            if name in FIELD_INDEX:
+                self._raw_slots.append(slot)
+                self._raw_columns.append(FIELD_INDEX[name])
+            elif name in DERIVED_FEATURES:
+                self._derived.append((slot, DERIVED_FEATURES[name]))
+            else:
+                raise ValueError(f"Unknown feature in model metadata: {name}")
+        self._offset = None if offset is None else np.asarray(offset, dtype=np.float64)
+        self._scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+
+    @classmethod
+    def from_scaler(cls, features, scaler=None):
+        if scaler is None:
+            return cls(features)
+        return cls(
+            features,
+            offset=scaler.mean_ if getattr(scaler, "with_mean", True) else None,
+            scale=scaler.scale_ if getattr(scaler, "with_std", True) else None,
+        )
+
+    def transform(self, raw, scale=True):
+        raw = np.asarray(raw, dtype=np.float64)
+        # One vector goes through the 2-D path too: NumPy scalar arithmetic
+        # can round differently (by an ulp) from the array ops pandas uses
+        rows = np.atleast_2d(raw)
+        out = np.empty((rows.shape[0], len(self.features)))
+        out[:, self._raw_slots] = rows[:, self._raw_columns]
+        for slot, derive in self._derived:
+            out[:, slot] = derive(rows)
+        if scale:
+            if self._offset is not None:
+                out -= self._offset
+            if self._scale is not None:
+                out /= self._scale
+        return out[0] if raw.ndim == 1 else out
+
+
+def parse_values(raw):
+    """Feature vector from a CSV string or a list of numbers."""
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    if not isinstance(raw, list):
+        raise ValueError("input must be a CSV string or a list of numbers")
+    return [float(v) for v in raw]
+
+
+def heuristic_probability(values):
+    """Rule-of-thumb score used when the model artifacts are unavailable."""
+    if len(values) < 11:
+        return 0.25
+    hour, day, lat, lng, acc, ip1, ip2, ip3, ip4, ua_len, fp_hash = values[:11]
+    heuristic = (
+        (acc > 100) * 0.3 +
+        (hour < 6 or hour > 22) * 0.2 +
+        (ip1 not in (10, 172, 192)) * 0.2 +
+        (ua_len < 40) * 0.2
+    )
+    return min(1.0, heuristic)
+
+
+def load_flat_forest(model_dir):
+    """
+    Scorer backed by the exported flat forest, which needs neither sklearn
+    nor the pickles.
+
+    Returns (FlatForest, FeatureSpec, meta), or None if there is no export
+    or it does not belong to the current model (older than the pickle, or
+    with other features), so that the pickled model is used instead.
+    """
+    forest_path = Path(model_dir) / FOREST_FILE
+    model_path = Path(model_dir) / "proxy_model_rf.pkl"
+    if not forest_path.exists():
+        return None
+    _import_numpy()
+    if model_path.exists() and model_path.stat().st_mtime > forest_path.stat().st_mtime:
+        print(f"[WARN] {forest_path} is older than {model_path}; "
+              "re-export it with train_proxy.py --export-forest", file=sys.stderr)
+        return None
+    with open(Path(model_dir) / "proxy_meta.json", "r") as f:
+        meta = json.load(f)
+    with np.load(forest_path, allow_pickle=False) as arrays:
+        if arrays["features"].tolist() != meta["features"]:
+            print(f"[WARN] {forest_path} does not match proxy_meta.json features", file=sys.stderr)
+            return None
+        model = FlatForest(arrays)
+        spec = FeatureSpec(meta["features"], arrays["scaler_mean"], arrays["scaler_scale"])
+    return model, spec, meta
+
+
+def load_pickled_scorer(model_dir, single_row=True):
+    model, scaler, meta = load_artifacts(model_dir)
+    _import_numpy()
+    # Requests score one row; a joblib worker pool costs more than it saves
+    if single_row and hasattr(model, "n_jobs"):
+        model.n_jobs = 1
+    return model, FeatureSpec.from_scaler(meta["features"], scaler), meta
+
+
+def load_scorer(model_dir, single_row=True):
+    """
+    Load the artifacts for repeated scoring.
+
+    Returns (model, FeatureSpec, meta), or None if they could not be loaded, in
+    which case predict_probability falls back to the heuristic. Single rows
+    prefer the flat forest export, which answers in about 0.1 ms without
+    importing sklearn; batches (single_row=False) prefer the pickled model,
+    whose compiled traversal is faster on large chunks. Each falls back to
+    the other.
+    """
+    flat = lambda: load_flat_forest(model_dir)
+    pickled = lambda: load_pickled_scorer(model_dir, single_row)
+    error = None
+    for loader in ((flat, pickled) if single_row else (pickled, flat)):
+        try:
+            scorer = loader()
+        except Exception as e:
+            error = error or e
+            continue
+        if scorer is not None:
+            return scorer
+    print(f"[ERROR] {error}", file=sys.stderr)
+    return None
+
+
+def check_length(values):
+    if len(values) != len(FIELD_NAMES):
+        raise ValueError(f"Expected {len(FIELD_NAMES)} values, got {len(values)}")
+    return values
+
+
+def predict_probabilities(scorer, rows):
+    """Proxy probabilities (a list) of many raw feature vectors in one predict_proba call."""
+    if scorer is None:
+        return [heuristic_probability(values) for values in rows]
+    model, spec, meta = scorer
+    X = spec.transform(np.asarray(rows, dtype=np.float64).reshape(-1, len(FIELD_NAMES)))
+    return model.predict_proba(X)[:, 1].tolist()
+
+
+def predict_probability(scorer, values):
+    """Proxy probability of one raw feature vector."""
+    if scorer is None:
+        return heuristic_probability(values)
+    check_length(values)
+    return predict_probabilities(scorer, [values])[0]
+
+
+def request_values(request):
+    """Raw feature vector of a request: its "input", or one field per FIELD_NAMES key."""
+    if not isinstance(request, dict):
+        raise ValueError("request must be a JSON object")
+    if "input" in request:
+        return parse_values(request["input"])
+    missing = [name for name in FIELD_NAMES if name not in request]
+    if missing:
+        raise ValueError(f'request needs an "input" field or the fields {", ".join(missing)}')
+    return parse_values([request[name] for name in FIELD_NAMES])
+
+
+def make_reply(scorer, request_id, proba):
+    return {
+        "id": request_id,
+        "probability": proba,
+        "source": "heuristic" if scorer is None else "model",
+    }
+
+
+def answer(scorer, line):
+    """
+    Answer one JSON-lines request.
+
+    A request is {"id": ..., "input": [11 numbers] or "csv"} (or carries the
+    FIELD_NAMES as keys instead of "input"); the reply is
+    {"id": ..., "probability": p, "source": "model" | "heuristic"} or
+    {"id": ..., "error": "..."}. Returns the reply line, or None for blank lines.
+    """
+    if not line.strip():
+        return None
+    request_id = None
     try:
-        model, scaler, meta = load_artifacts(args.model_dir)
+        request = json.loads(line)
+        if isinstance(request, dict):
+            request_id = request.get("id")
+        reply = make_reply(scorer, request_id, predict_probability(scorer, request_values(request)))
     except Exception as e:
-        print(f"[ERROR] {e}", file=sys.stderr)
-        # Fallback: simple heuristic
-        values = list(map(float, args.input.split(",")))
-        if len(values) < 11:
-            print("0.25")
-            return
-        hour, day, lat, lng, acc, ip1, ip2, ip3, ip4, ua_len, fp_hash = values[:11]
-        heuristic = (
-            (acc > 100) * 0.3 +
-            (hour < 6 or hour > 22) * 0.2 +
-            (ip1 not in (10, 172, 192)) * 0.2 +
-            (ua_len < 40) * 0.2
-        )
-        print(f"{min(1.0, heuristic):.4f}")
+        # One bad request must not take the worker down
+        reply = {"id": request_id, "error": str(e)}
+    return json.dumps(reply) + "\n"
+
+
+def serve_stdio(scorer):
+    """Answer requests from stdin until it is closed."""
+    for line in sys.stdin:
+        reply = answer(scorer, line)
+        if reply is not None:
+            sys.stdout.write(reply)
+            sys.stdout.flush()
+
+
+def serve_socket(scorer, socket_path):
+    """Answer requests on a Unix domain socket, one thread per connection."""
+    import signal
+    import socketserver
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                reply = answer(scorer, raw.decode("utf-8", errors="replace"))
+                if reply is not None:
+                    self.wfile.write(reply.encode("utf-8"))
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    # Exit through the finally below so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with socketserver.ThreadingUnixStreamServer(socket_path, RequestHandler) as server:
+        server.daemon_threads = True
+        print(f"[INFO] Listening on {socket_path}", file=sys.stderr, flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+
+def read_rows(lines, fmt):
+    """
+    Parse batch input into (line number, id, values, error) per non-blank line.
+
+    CSV lines hold the 11 raw values; a header line naming the FIELD_NAMES
+    columns selects them by name instead, so exports with extra columns
+    (such as the training label) can be scored as they are. NDJSON lines are
+    --serve requests. Rows that cannot be parsed carry the error instead of
+    values.
+    """
+    columns = None
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        row_id = None
+        try:
+            if fmt == "ndjson":
+                request = json.loads(line)
+                if isinstance(request, dict):
+                    row_id = request.get("id")
+                values = request_values(request)
+            else:
+                fields = line.split(",")
+                if number == 1 and columns is None:
+                    names = [field.strip() for field in fields]
+                    if set(FIELD_NAMES) <= set(names):
+                        columns = [names.index(name) for name in FIELD_NAMES]
+                        continue
+                if columns is not None:
+                    fields = [fields[idx] for idx in columns]
+                values = parse_values(fields)
+            yield number, row_id, check_length(values), None
+        except (ValueError, TypeError, IndexError) as e:
+            yield number, row_id, None, str(e)
+
+
+def score_stream(scorer, lines, out, fmt="auto", chunk_size=5000):
+    """
+    Score batch input chunk by chunk, writing one line per row in input order.
+
+    CSV input gives one probability per line ("nan" for invalid rows, the
+    first MAX_REPORTED_ERRORS of which are reported on stderr); NDJSON input
+    gives --serve replies.
+
+    Returns:
+        (rows scored, invalid rows)
+    """
+    lines = iter(lines)
+    if fmt == "auto":
+        leading = []
+        for line in lines:
+            leading.append(line)
+            if line.strip():
+                break
+        fmt = "ndjson" if leading and leading[-1].lstrip().startswith("{") else "csv"
+        lines = itertools.chain(leading, lines)
+
+    rows = invalid = 0
+    parsed = read_rows(lines, fmt)
+    while True:
+        chunk = list(itertools.islice(parsed, chunk_size))
+        if not chunk:
+            break
+        valid = [values for _, _, values, error in chunk if error is None]
+        probabilities = iter(predict_probabilities(scorer, valid) if valid else ())
+        output = []
+        for number, row_id, values, error in chunk:
+            if error is not None:
+                invalid += 1
+                if fmt == "ndjson":
+                    output.append(json.dumps({"id": row_id, "error": error}))
+                else:
+                    if invalid <= MAX_REPORTED_ERRORS:
+                        print(f"[WARN] line {number}: {error}", file=sys.stderr)
+                    output.append("nan")
+                continue
+            proba = next(probabilities)
+            if fmt == "ndjson":
+                output.append(json.dumps(make_reply(scorer, row_id, proba)))
+            else:
+                output.append(f"{proba:.4f}")
+        rows += len(chunk)
+        out.write("\n".join(output) + "\n")
+        out.flush()
+    return rows, invalid
+
+
+def score_file(args, timer):
+    scorer = load_scorer(args.model_dir, single_row=False)
+    timer.mark(f"load ({scorer_kind(scorer)})")
+    start = time.perf_counter()
+    if args.input_file == "-":
+        rows, invalid = score_stream(scorer, sys.stdin, sys.stdout, args.format, args.chunk_size)
+    else:
+        with open(args.input_file, "r", newline="") as f:
+            rows, invalid = score_stream(scorer, f, sys.stdout, args.format, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    timer.mark("score")
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"[INFO] Scored {rows} rows ({invalid} invalid) in {elapsed:.2f}s ({rate:.0f} rows/s)",
+          file=sys.stderr)
+
+
+def parity_rows(count=20000, seed=0):
+    """Raw vectors around every threshold the derived features test."""
+    rng = np.random.default_rng(seed)
+
+    def pick(edges, low, high):
+        return np.where(rng.random(count) < 0.5, rng.choice(edges, count), rng.integers(low, high, count))
+
+    # A third of the points lie near the reference campus, where scalar and
+    # array arithmetic round dist_from_ref differently most often
+    near = rng.random(count) < 0.3
+    return np.column_stack([
+        pick([6, 7, 21, 22], 0, 24),
+        pick([4, 5], 0, 7),
+        np.where(rng.random(count) < 0.05, REF_LAT,
+                 np.where(near, rng.uniform(REF_LAT - 0.1, REF_LAT + 0.1, count), rng.uniform(8.0, 37.0, count))),
+        np.where(rng.random(count) < 0.05, REF_LNG,
+                 np.where(near, rng.uniform(REF_LNG - 0.1, REF_LNG + 0.1, count), rng.uniform(68.0, 97.0, count))),
+        np.where(rng.random(count) < 0.1, 100.0, rng.uniform(0.0, 300.0, count)),
+        pick([10, 172, 192], 0, 256),
+        pick([15, 16, 31, 32, 168], 0, 256),
+        rng.integers(0, 256, count),
+        rng.integers(0, 256, count),
+        rng.integers(0, 300, count),
+        rng.integers(0, 1000, count),
+    ]).astype(np.float64)
+
+
+def check_parity(args):
+    """
+    Compare FeatureSpec with train_proxy.feature_engineering for exact equality.
+
+    Checks the unscaled columns, the scaled columns against the pickled
+    scaler (when present) and the single-row path. With a flat forest
+    export, its probabilities must also match the pickled RF within
+    FOREST_TOLERANCE. Returns the exit code.
+    """
+    import pickle
+
+    import pandas as pd
+    from train_proxy import feature_engineering
+
+    _import_numpy()
+
+    with open(Path(args.model_dir) / "proxy_meta.json", "r") as f:
+        meta = json.load(f)
+    scaler = None
+    scaler_path = Path(args.model_dir) / "proxy_scaler.pkl"
+    if scaler_path.exists():
+        with open(scaler_path, "rb") as f:
+            scaler = pickle.load(f)
+    spec = FeatureSpec.from_scaler(meta["features"], scaler)
+    forest = sklearn_model = None
+    if scaler is not None and (Path(args.model_dir) / FOREST_FILE).exists():
+        with open(Path(args.model_dir) / "proxy_model_rf.pkl", "rb") as f:
+            sklearn_model = pickle.load(f)
+        with np.load(Path(args.model_dir) / FOREST_FILE, allow_pickle=False) as arrays:
+            forest = FlatForest(arrays)
+
+    sources = [("generated", pd.DataFrame(parity_rows(), columns=FIELD_NAMES))]
+    if args.check_parity:
+        sources.append((args.check_parity, pd.read_csv(args.check_parity)[FIELD_NAMES]))
+
+    failures = 0
+    for label, df in sources:
+        expected = feature_engineering(df)[spec.features]
+        raw = df.to_numpy(dtype=np.float64)
+        # Every row also goes through the one-vector path the server uses
+        single = raw
+        checks = [
+            ("features", expected.to_numpy(dtype=np.float64), spec.transform(raw, scale=False)),
+            ("single-row features", expected.to_numpy(dtype=np.float64)[:len(single)],
+             np.array([spec.transform(row, scale=False) for row in single])),
+        ]
+        if scaler is not None:
+            scaled = scaler.transform(expected)
+            checks.append(("scaled", scaled, spec.transform(raw)))
+            checks.append(("single-row scaled", scaled[:len(single)],
+                           np.array([spec.transform(row) for row in single])))
+        if forest is not None:
+            X = spec.transform(raw)
+            want = sklearn_model.predict_proba(X)[:, 1]
+            worst = float(np.abs(forest.predict_proba(X)[:, 1] - want).max())
+            single = max(abs(float(forest.predict_proba(x[None, :])[0, 1]) - w) for x, w in zip(X[:200], want))
+            if max(worst, single) > FOREST_TOLERANCE:
+                failures += 1
+                print(f"[ERROR] {label} flat forest: probabilities differ from sklearn by up to {max(worst, single):.3g}")
+        for check, want, got in checks:
+            mismatch = ~((want == got) | (np.isnan(want) & np.isnan(got)))
+            if mismatch.any():
+                failures += 1
+                row, col = np.argwhere(mismatch)[0]
+                print(f"[ERROR] {label} {check}: {int(mismatch.sum())} mismatches, first at row {row} "
+                      f"{spec.features[col]}: expected {float(want[row, col])!r}, got {float(got[row, col])!r}")
+        print(f"[INFO] {label}: {len(df)} rows x {len(spec.features)} features checked "
+              f"({'with' if scaler is not None else 'without'} scaler"
+              f"{', flat forest' if forest is not None else ''})")
+    print("[INFO] Feature parity " + ("FAILED" if failures else "OK"))
+    return 1 if failures else 0
+
+
+def scorer_kind(scorer):
+    if scorer is None:
+        return "heuristic fallback"
+    return "flat forest" if isinstance(scorer[0], FlatForest) else "pickled model"
+
+
+def serve(args, timer):
+    scorer = load_scorer(args.model_dir)
+    timer.mark(f"load ({scorer_kind(scorer)})")
+    timer.report()
+    print(f"[INFO] Proxy scorer ready ({scorer_kind(scorer)})", file=sys.stderr, flush=True)
+    if args.socket:
+        serve_socket(scorer, args.socket)
+    else:
+        serve_stdio(scorer)
+
+
+def predict():
+    timer = StageTimer(enabled="--timings" in sys.argv)
+    timer.mark("imports")
+    args = parse_args()
+    timer.mark("arguments")
+    if args.serve:
+        serve(args, timer)
+        return
+    if args.input_file:
+        score_file(args, timer)
+        timer.report()
         return
+    if args.check_parity is not None:
+        sys.exit(check_parity(args))
 
-    # Parse input CSV into a dict
-    field_names = [
-        "hour_of_day",
-        "day_of_week",
-        "gps_lat",
-        "gps_lng",
-        "gps_accuracy",
-        "ip_octet1",
-        "ip_octet2",
-        "ip_octet3",
-        "ip_octet4",
-        "ua_length",
-        "fp_hash",
-    ]
-    values = list(map(float, args.input.split(",")))
-    if len(values) != len(field_names):
-        raise ValueError(f"Expected {len(field_names)} values, got {len(values)}")
-    row = dict(zip(field_names, values))
-
-    # Feature engineering
-    df = feature_engineering_one(row)
-
-    # Ensure column order matches training
-    X = df[meta["features"]]
-
-    # Scale and predict
-    X_scaled = scaler.transform(X)
-    proba = model.predict_proba(X_scaled)[:, 1][0]
-
-    print(f"{proba:.4f}")
+    scorer = load_scorer(args.model_dir)
+    timer.mark(f"load ({scorer_kind(scorer)})")
+    values = parse_values(args.input)
+    proba = predict_probability(scorer, values)
+    timer.mark("score")
+    if scorer is None and len(values) < 11:
+        # The fallback has always printed this default unformatted
+        print("0.25")
+    else:
+        print(f"{proba:.4f}")
+    timer.report()
 
 
 if __name__ == "__main__":
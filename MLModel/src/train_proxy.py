@@ -22,9 +22,15 @@ def parse_args():
     parser.add_argument("--test-size", type=float, default=0.2, help="Test split fraction")
     parser.add_argument("--random-state", type=int, default=42, help="Random seed")
     parser.add_argument("--model-type", type=str, default="rf", choices=["rf", "lr"], help="Model type")
+    parser.add_argument("--export-forest", action="store_true",
+                        help="Only re-export the flat forest from the saved RF model in --model-dir")
     return parser.parse_args()
 
 
+# Flat forest arrays for predict.py, written next to proxy_model_rf.pkl
+FOREST_FILE = "proxy_forest.npz"
+
+
 def load_data(path):
     if not Path(path).exists():
         print(f"[ERROR] Training data not found at {path}")
@@ -151,6 +157,67 @@ def feature_engineering(df):
     return df
 
 
+def export_flat_forest(model, scaler, features, path):
+    """
+    Flatten a fitted RandomForestClassifier into contiguous arrays.
+
+    The nodes of all trees are concatenated, and child indices point into
+    the combined arrays. Leaves point to themselves, so predict.py can step
+    every tree a fixed max_depth levels. Each node stores its class-1
+    probability, normalized as DecisionTreeClassifier.predict_proba does.
+    The scaler's mean and scale are stored too, so inference needs neither
+    sklearn nor the pickles.
+    """
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+        counts = tree.value[:, 0, :]
+        totals = counts.sum(axis=1)
+        totals[totals == 0.0] = 1.0
+
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+        left.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+        right.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+        value.append(counts[:, 1] / totals)
+        offset += tree.node_count
+        depth = max(depth, tree.max_depth)
+
+    n_features = len(features)
+    mean = scaler.mean_ if getattr(scaler, "with_mean", True) else np.zeros(n_features)
+    scale = scaler.scale_ if getattr(scaler, "with_std", True) else np.ones(n_features)
+    np.savez(
+        path,
+        feature=np.concatenate(feature).astype(np.int32),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        left=np.concatenate(left).astype(np.int32),
+        right=np.concatenate(right).astype(np.int32),
+        value=np.concatenate(value).astype(np.float64),
+        roots=np.array(roots, dtype=np.int32),
+        depth=np.int32(depth),
+        features=np.array(features),
+        scaler_mean=np.asarray(mean, dtype=np.float64),
+        scaler_scale=np.asarray(scale, dtype=np.float64),
+    )
+
+
+def export_saved_forest(model_dir):
+    """Re-export the flat forest from the artifacts already in model_dir."""
+    with open(Path(model_dir) / "proxy_model_rf.pkl", "rb") as f:
+        model = pickle.load(f)
+    with open(Path(model_dir) / "proxy_scaler.pkl", "rb") as f:
+        scaler = pickle.load(f)
+    with open(Path(model_dir) / "proxy_meta.json", "r") as f:
+        meta = json.load(f)
+    forest_path = Path(model_dir) / FOREST_FILE
+    export_flat_forest(model, scaler, meta["features"], forest_path)
+    print(f"[INFO] Flat forest saved to {forest_path}")
+
+
 def train_model(df, args):
     y = df["label"]
     X = df.drop(columns=["label"])
@@ -221,11 +288,19 @@ def train_model(df, args):
     print(f"[INFO] Scaler saved to {scaler_path}")
     print(f"[INFO] Metadata saved to {meta_path}")
 
+    if args.model_type == "rf":
+        forest_path = Path(args.model_dir) / FOREST_FILE
+        export_flat_forest(model, scaler, list(X.columns), forest_path)
+        print(f"[INFO] Flat forest saved to {forest_path}")
+
     return model, scaler, meta
 
 
 if __name__ == "__main__":
     args = parse_args()
-    df_raw = load_data(args.data)
-    df = feature_engineering(df_raw)
-    train_model(df, args)
+    if args.export_forest:
+        export_saved_forest(args.model_dir)
+    else:
+        df_raw = load_data(args.data)
+        df = feature_engineering(df_raw)
+        train_model(df, args)
@@ -1,57 +1,102 @@
 import { spawn } from "child_process";
 import path from "path";
+import readline from "readline";
 
 const MODEL_PATH = path.resolve(process.cwd(), "../MLModel");
 
-let modelLoaded = false;
-let loadingPromise = null;
+// Per-request budget; the first request also waits for the worker to start
+const REQUEST_TIMEOUT_MS = 5000;
+// After the worker dies or hangs, wait this long before respawning it
+const RESTART_DELAY_MS = 10000;
 
-async function ensureModelLoaded() {
-    if (modelLoaded) return;
-    if (loadingPromise) return loadingPromise;
+const MODEL_UNAVAILABLE = "ML model not available";
 
-    loadingPromise = (async () => {
+// One resident `predict.py --serve` process answers every request
+let worker = null;
+let restartAfter = 0;
+// False once a worker exited without ever answering (no Python or no model
+// environment); predictProxy then throws MODEL_UNAVAILABLE until one answers
+let modelAvailable = true;
+let nextRequestId = 1;
+const pending = new Map();
+
+function failPending(error) {
+    for (const request of pending.values()) {
+        clearTimeout(request.timer);
+        request.reject(error);
+    }
+    pending.clear();
+}
+
+// Drop a dead or hung worker: fail its requests and respawn after RESTART_DELAY_MS
+function stopWorker(proc, error) {
+    if (worker !== proc) return;
+    worker = null;
+    restartAfter = Date.now() + RESTART_DELAY_MS;
+    failPending(error);
+    proc.kill();
+}
+
+function startWorker() {
+    const python = process.platform === "win32" ? "python" : "python3";
+    const proc = spawn(python, ["src/predict.py", "--serve"], {
+        cwd: MODEL_PATH,
+        stdio: ["pipe", "pipe", "pipe"],
+    });
+    let answered = false;
+
+    readline.createInterface({ input: proc.stdout }).on("line", (line) => {
+        let reply;
         try {
-            await runPythonScript(["-c", "import joblib; import sklearn; print('OK')"]);
-            modelLoaded = true;
+            reply = JSON.parse(line);
         } catch (e) {
-            console.error("[ML] Failed to load Python ML environment:", e);
-            modelLoaded = false;
-        } finally {
-            loadingPromise = null;
+            return;
         }
-    })();
+        answered = true;
+        modelAvailable = true;
+        const request = pending.get(reply.id);
+        if (!request) return;
+        pending.delete(reply.id);
+        clearTimeout(request.timer);
+        if (reply.error) request.reject(new Error(reply.error));
+        else request.resolve(reply.probability);
+    });
+    proc.stderr.on("data", (data) => console.error(`[ML] ${data.toString().trim()}`));
 
-    return loadingPromise;
+    const onExit = (error) => {
+        if (worker === proc && !answered) {
+            console.error("[ML] ML worker failed to start:", error);
+            modelAvailable = false;
+            error = new Error(MODEL_UNAVAILABLE);
+        }
+        stopWorker(proc, error);
+    };
+    proc.on("error", (e) => onExit(e));
+    proc.on("exit", (code, signal) => onExit(new Error(`ML worker exited (${signal || code})`)));
+    // A write to a dead worker is reported through "exit"
+    proc.stdin.on("error", () => {});
+    return proc;
 }
 
-function runPythonScript(args) {
+function scoreWithWorker(input) {
+    if (!worker) {
+        if (Date.now() < restartAfter) {
+            return Promise.reject(new Error(modelAvailable ? "ML worker unavailable" : MODEL_UNAVAILABLE));
+        }
+        worker = startWorker();
+    }
+    const proc = worker;
+    const id = nextRequestId++;
     return new Promise((resolve, reject) => {
-        const python = process.platform === "win32" ? "python" : "python3";
-        const proc = spawn(python, args, {
-            cwd: MODEL_PATH,
-            stdio: ["pipe", "pipe", "pipe"],
-        });
-
-        let stdout = "";
-        let stderr = "";
-
-        proc.stdout.on("data", (data) => (stdout += data.toString()));
-        proc.stderr.on("data", (data) => (stderr += data.toString()));
-
-        proc.on("close", (code) => {
-            if (code === 0) resolve(stdout.trim());
-            else reject(new Error(stderr || stdout));
-        });
+        // A worker that misses the budget is treated as hung, so later
+        // requests do not each wait out the timeout on it
+        const timer = setTimeout(() => stopWorker(proc, new Error("ML worker timed out")), REQUEST_TIMEOUT_MS);
+        pending.set(id, { resolve, reject, timer });
+        proc.stdin.write(JSON.stringify({ id, input }) + "\n");
     });
 }
 
 export async function predictProxy(features) {
-    await ensureModelLoaded();
-    if (!modelLoaded) {
-        throw new Error("ML model not available");
-    }
-
     const {
         ip,
         userAgent,
@@ -83,19 +128,14 @@ export async function predictProxy(features) {
     ];
 
     try {
-        const result = await runPythonScript([
-            "src/predict.py",
-            "--input",
-            input.join(","),
-        ]);
-
-        // Result is expected to be a JSON string with probability
-        const prob = parseFloat(result);
-        if (isNaN(prob) || prob < 0 || prob > 1) {
+        const prob = await scoreWithWorker(input);
+        if (typeof prob !== "number" || isNaN(prob) || prob < 0 || prob > 1) {
             throw new Error("Invalid ML output");
         }
         return prob;
     } catch (e) {
+        // Like the old environment check, a missing model is an error rather than a heuristic score
+        if (e.message === MODEL_UNAVAILABLE) throw e;
         console.error("[ML] Prediction failed:", e);
         // Fallback: simple heuristic
         const heuristicScore =